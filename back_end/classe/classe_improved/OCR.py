@@ -12,6 +12,8 @@ import requests
 from io import BytesIO
 import base64
 
+from back_end.utils.monitoring import PerformanceMonitor
+
 # Load environment variables
 load_dotenv()
 
@@ -43,6 +45,7 @@ OCR_SERVICES = {
     }
 }
 
+@PerformanceMonitor.trace("ocr.preprocess")
 def process_image(image_path, scale=2):
     """
     Preprocess an image for OCR to improve text recognition.
@@ -77,6 +80,7 @@ def process_image(image_path, scale=2):
     
     return binary_image
 
+@PerformanceMonitor.trace("ocr.tesseract")
 def extract_text_tesseract(image, config=None):
     """
     Extract text from an image using Tesseract OCR.
@@ -101,6 +105,7 @@ def extract_text_tesseract(image, config=None):
     
     return text, processing_time
 
+@PerformanceMonitor.trace("ocr.azure")
 def extract_text_azure(image_path):
     """
     Extract text from an image using Azure Computer Vision.
@@ -154,6 +159,7 @@ def extract_text_azure(image_path):
     
     return text, processing_time
 
+@PerformanceMonitor.trace("ocr.google")
 def extract_text_google(image_path):
     """
     Extract text from an image using Google Cloud Vision.
@@ -314,6 +320,7 @@ def estimate_confidence(text):
     
     return confidence
 
+@PerformanceMonitor.trace("ocr.qr_decode")
 def extract_qr_data(image_path):
     """
     Extract data from QR codes in an image.
@@ -337,6 +344,7 @@ def extract_qr_data(image_path):
         print(f"Error extracting QR code data: {str(e)}")
         return []
 
+@PerformanceMonitor.trace("ocr.extract_invoice")
 def extract_invoice_data(processed_image, image_path=None, ocr_service="auto"):
     """
     Extract structured invoice data from a processed image.
@@ -392,49 +400,51 @@ def extract_invoice_data(processed_image, image_path=None, ocr_service="auto"):
     # Store OCR service information
     invoice_data["ocr_service"] = service_info
     
-    # Correct common OCR errors
-    raw_text = raw_text.replace("Furo", "Euro").replace("Buro", "Euro")
-    
-    # Extract invoice number
-    invoice_number_match = re.search(r'INVOICE\s+([\w/]+)', raw_text)
-    if invoice_number_match:
-        invoice_data["invoice_number"] = invoice_number_match.group(1)
-    
-    # Extract date
-    date_match = re.search(r'Issue date (\d{4}-\d{2}-\d{2})', raw_text)
-    if date_match:
-        invoice_data["issue_date"] = date_match.group(1)
-    
-    # Extract email
-    email_match = re.search(r'Email\s+([\w\.\-]+@[\w\.\-]+)', raw_text)
-    if email_match:
-        invoice_data["email"] = email_match.group(1)
-    
-    # Extract total
-    total_match = re.search(r'TOTAL\s+([\d\.,]+)\s+Euro', raw_text)
-    if total_match:
-        invoice_data["total"] = float(total_match.group(1).replace(",", "."))
-    
-    # Extract items (quantity x price)
-    item_pattern = re.findall(r'(.+?)\s+(\d+)\s*x\s*([\d\.,]+)\s*Euro', raw_text)
-    for item in item_pattern:
-        name, qty, price = item
-        invoice_data["items"].append({
-            "name": name.strip(),
-            "quantity": int(qty),
-            "unit_price": float(price.replace(",", ".")),
-            "total_price": int(qty) * float(price.replace(",", "."))
-        })
-    
-    # Extract client name
-    client_match = re.search(r'Bill to\s*(.+)', raw_text)
-    if client_match:
-        invoice_data["client"] = client_match.group(1).strip()
-    
-    # Extract address
-    address_match = re.search(r'Address\s*(.+?)(?=\n\n|$)', raw_text, re.DOTALL)
-    if address_match:
-        invoice_data["address"] = address_match.group(1).strip().replace("\n", " ")
+    # Regex extraction of the invoice fields
+    with PerformanceMonitor.span("ocr.regex"):
+        # Correct common OCR errors
+        raw_text = raw_text.replace("Furo", "Euro").replace("Buro", "Euro")
+    
+        # Extract invoice number
+        invoice_number_match = re.search(r'INVOICE\s+([\w/]+)', raw_text)
+        if invoice_number_match:
+            invoice_data["invoice_number"] = invoice_number_match.group(1)
+    
+        # Extract date
+        date_match = re.search(r'Issue date (\d{4}-\d{2}-\d{2})', raw_text)
+        if date_match:
+            invoice_data["issue_date"] = date_match.group(1)
+    
+        # Extract email
+        email_match = re.search(r'Email\s+([\w\.\-]+@[\w\.\-]+)', raw_text)
+        if email_match:
+            invoice_data["email"] = email_match.group(1)
+    
+        # Extract total
+        total_match = re.search(r'TOTAL\s+([\d\.,]+)\s+Euro', raw_text)
+        if total_match:
+            invoice_data["total"] = float(total_match.group(1).replace(",", "."))
+    
+        # Extract items (quantity x price)
+        item_pattern = re.findall(r'(.+?)\s+(\d+)\s*x\s*([\d\.,]+)\s*Euro', raw_text)
+        for item in item_pattern:
+            name, qty, price = item
+            invoice_data["items"].append({
+                "name": name.strip(),
+                "quantity": int(qty),
+                "unit_price": float(price.replace(",", ".")),
+                "total_price": int(qty) * float(price.replace(",", "."))
+            })
+    
+        # Extract client name
+        client_match = re.search(r'Bill to\s*(.+)', raw_text)
+        if client_match:
+            invoice_data["client"] = client_match.group(1).strip()
+    
+        # Extract address
+        address_match = re.search(r'Address\s*(.+?)(?=\n\n|$)', raw_text, re.DOTALL)
+        if address_match:
+            invoice_data["address"] = address_match.group(1).strip().replace("\n", " ")
     
     # Extract QR code data if image_path is provided
     if image_path:
@@ -1,106 +1,38 @@
-import os
 import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans, DBSCAN
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 import json
 from datetime import datetime, timedelta
+from back_end.utils.database import get_db_connection as get_pooled_connection
+from back_end.utils.storage import get_storage
 
 # Load environment variables
 load_dotenv()
 
 def get_db_connection():
-    """Get a connection to the database."""
-    conn = psycopg2.connect(
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT")
-    )
+    """Get a connection from the shared pool (autocommit is reset when it is returned)."""
+    conn = get_pooled_connection()
     conn.autocommit = True
     return conn
 
-def create_clustering_tables():
-    """Create tables for storing clustering results."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # Create schema if it doesn't exist
-    cur.execute("CREATE SCHEMA IF NOT EXISTS sanollea;")
-    
-    # Create customer clusters table
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sanollea.CUSTOMER_CLUSTERS (
-        id SERIAL PRIMARY KEY,
-        customer_id INTEGER,
-        cluster_id INTEGER,
-        cluster_name VARCHAR(255),
-        cluster_description TEXT,
-        features JSONB,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (customer_id) REFERENCES sanollea.CUSTOMER(id) ON DELETE CASCADE
-    );
-    """)
-    
-    # Create product clusters table
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sanollea.PRODUCT_CLUSTERS (
-        id SERIAL PRIMARY KEY,
-        product_name VARCHAR(255),
-        cluster_id INTEGER,
-        cluster_name VARCHAR(255),
-        cluster_description TEXT,
-        features JSONB,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-    
-    conn.commit()
-    cur.close()
-    conn.close()
-
-# Create clustering tables on module import
-create_clustering_tables()
-
-def get_customer_data():
+def get_customer_data(date_from=None, date_to=None):
     """
     Retrieve customer data from the database for clustering.
     
+    Args:
+        date_from, date_to: Optional invoice date window (inclusive); only the
+            matching yearly partitions are read
+    
     Returns:
         Pandas DataFrame with customer data
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    # Get customer purchase data
-    cur.execute("""
-    SELECT 
-        c.id as customer_id,
-        c.name as customer_name,
-        c.email,
-        COUNT(i.id) as total_invoices,
-        SUM(i.total) as total_spent,
-        AVG(i.total) as average_invoice_amount,
-        MAX(i.date) as last_purchase_date,
-        COUNT(DISTINCT ii.product) as unique_products_bought
-    FROM 
-        sanollea.CUSTOMER c
-    LEFT JOIN 
-        sanollea.INVOICE i ON c.id = i.customer_id
-    LEFT JOIN 
-        sanollea.INVOICE_ITEM ii ON i.id = ii.invoice_id
-    GROUP BY 
-        c.id, c.name, c.email
-    """)
-    
-    customers = cur.fetchall()
-    cur.close()
-    conn.close()
+    # Per-customer features from the configured storage; on Postgres they come from the
+    # aggregates maintained by triggers (see structures/migrations/0005_agregats_clustering.sql)
+    customers = get_storage().get_customer_features(date_from, date_to)
     
     if not customers:
         return pd.DataFrame()
@@ -117,35 +49,18 @@ def get_customer_data():
     
     return df
 
-def get_product_data():
+def get_product_data(date_from=None, date_to=None):
     """
     Retrieve product data from the database for clustering.
     
+    Args:
+        date_from, date_to: Optional invoice date window (inclusive)
+    
     Returns:
         Pandas DataFrame with product data
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    # Get product purchase data
-    cur.execute("""
-    SELECT 
-        ii.product as product_name,
-        COUNT(ii.id) as times_purchased,
-        AVG(ii.pricePerUnit) as average_price,
-        SUM(ii.quantity) as total_quantity_sold,
-        COUNT(DISTINCT i.customer_id) as unique_customers
-    FROM 
-        sanollea.INVOICE_ITEM ii
-    JOIN 
-        sanollea.INVOICE i ON ii.invoice_id = i.id
-    GROUP BY 
-        ii.product
-    """)
-    
-    products = cur.fetchall()
-    cur.close()
-    conn.close()
+    # Per-product statistics from the configured storage
+    products = get_storage().get_product_features(date_from, date_to)
     
     if not products:
         return pd.DataFrame()
@@ -155,15 +70,18 @@ def get_product_data():
     
     return df
 
-def cluster_customers():
+def cluster_customers(date_from=None, date_to=None):
     """
     Cluster customers based on their purchasing behavior.
     
+    Args:
+        date_from, date_to: Optional invoice date window (inclusive)
+    
     Returns:
         List of dictionaries with cluster information
     """
     # Get customer data
-    df = get_customer_data()
+    df = get_customer_data(date_from, date_to)
     
     if df.empty:
         return []
@@ -239,7 +157,7 @@ def cluster_customers():
     cur = conn.cursor()
     
     # Clear previous clustering results
-    cur.execute("DELETE FROM sanollea.CUSTOMER_CLUSTERS")
+    cur.execute("DELETE FROM dylan.customer_clusters")
     
     # Insert new clustering results
     for _, row in df.iterrows():
@@ -253,7 +171,7 @@ def cluster_customers():
         }
         
         cur.execute("""
-        INSERT INTO sanollea.CUSTOMER_CLUSTERS (
+        INSERT INTO dylan.customer_clusters (
             customer_id, cluster_id, cluster_name, cluster_description, features
         )
         VALUES (%s, %s, %s, %s, %s)
@@ -286,15 +204,18 @@ def cluster_customers():
     
     return clusters
 
-def cluster_products():
+def cluster_products(date_from=None, date_to=None):
     """
     Cluster products based on their characteristics and purchase patterns.
     
+    Args:
+        date_from, date_to: Optional invoice date window (inclusive)
+    
     Returns:
         List of dictionaries with cluster information
     """
     # Get product data
-    df = get_product_data()
+    df = get_product_data(date_from, date_to)
     
     if df.empty:
         return []
@@ -365,7 +286,7 @@ def cluster_products():
     cur = conn.cursor()
     
     # Clear previous clustering results
-    cur.execute("DELETE FROM sanollea.PRODUCT_CLUSTERS")
+    cur.execute("DELETE FROM dylan.product_clusters")
     
     # Insert new clustering results
     for _, row in df.iterrows():
@@ -378,7 +299,7 @@ def cluster_products():
         }
         
         cur.execute("""
-        INSERT INTO sanollea.PRODUCT_CLUSTERS (
+        INSERT INTO dylan.product_clusters (
             product_name, cluster_id, cluster_name, cluster_description, features
         )
         VALUES (%s, %s, %s, %s, %s)
@@ -416,7 +337,7 @@ def get_customer_cluster(customer_id):
     Get the cluster information for a specific customer.
     
     Args:
-        customer_id: ID of the customer
+        customer_id: Email of the customer (dylan.utilisateur.email_personne)
         
     Returns:
         Dictionary with cluster information
@@ -431,7 +352,7 @@ def get_customer_cluster(customer_id):
         cc.cluster_description,
         cc.features
     FROM 
-        sanollea.CUSTOMER_CLUSTERS cc
+        dylan.customer_clusters cc
     WHERE 
         cc.customer_id = %s
     """, (customer_id,))
@@ -470,7 +391,7 @@ def get_product_cluster(product_name):
         pc.cluster_description,
         pc.features
     FROM 
-        sanollea.PRODUCT_CLUSTERS pc
+        dylan.product_clusters pc
     WHERE 
         pc.product_name = %s
     """, (product_name,))
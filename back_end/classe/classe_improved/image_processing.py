@@ -8,10 +8,13 @@ import os
 from PIL import Image
 import logging
 
+from back_end.utils.monitoring import PerformanceMonitor
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@PerformanceMonitor.trace("image.load")
 def load_image(image_path):
     """
     Load an image from a file path.
@@ -58,6 +61,7 @@ def save_image(image, output_path):
         logger.error(f"Error saving image to {output_path}: {str(e)}")
         return False
 
+@PerformanceMonitor.trace("image.resize")
 def resize_image(image, max_width=1000, max_height=1000):
     """
     Resize an image while maintaining aspect ratio.
@@ -85,6 +89,7 @@ def resize_image(image, max_width=1000, max_height=1000):
     
     return image
 
+@PerformanceMonitor.trace("image.grayscale")
 def convert_to_grayscale(image):
     """
     Convert an image to grayscale.
@@ -99,6 +104,7 @@ def convert_to_grayscale(image):
         return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     return image
 
+@PerformanceMonitor.trace("image.threshold")
 def apply_threshold(image, method='adaptive'):
     """
     Apply thresholding to an image.
@@ -124,6 +130,7 @@ def apply_threshold(image, method='adaptive'):
     
     return thresh
 
+@PerformanceMonitor.trace("image.denoise")
 def denoise_image(image, method='gaussian'):
     """
     Apply denoising to an image.
@@ -144,6 +151,7 @@ def denoise_image(image, method='gaussian'):
     else:
         raise ValueError(f"Unknown denoising method: {method}")
 
+@PerformanceMonitor.trace("image.sharpen")
 def sharpen_image(image):
     """
     Apply sharpening to an image.
@@ -157,6 +165,7 @@ def sharpen_image(image):
     kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
     return cv2.filter2D(image, -1, kernel)
 
+@PerformanceMonitor.trace("image.deskew")
 def deskew_image(image):
     """
     Deskew an image to correct rotation.
@@ -193,6 +202,7 @@ def deskew_image(image):
         logger.warning(f"Error deskewing image: {str(e)}")
         return image
 
+@PerformanceMonitor.trace("image.remove_borders")
 def remove_borders(image):
     """
     Remove black borders from an image.
@@ -230,6 +240,7 @@ def remove_borders(image):
     else:
         return image[y:y+h, x:x+w]
 
+@PerformanceMonitor.trace("image.preprocess_for_ocr")
 def preprocess_image_for_ocr(image_path, output_path=None):
     """
     Preprocess an image for OCR.
@@ -290,6 +301,7 @@ def extract_regions_of_interest(image, regions):
         extracted.append(roi)
     return extracted
 
+@PerformanceMonitor.trace("image.detect_text_regions")
 def detect_text_regions(image):
     """
     Detect regions containing text in an image.
@@ -3,10 +3,12 @@ from tkinter import Image
 from PIL import Image
 from pyzbar.pyzbar import decode
 from back_end.classe.save_data_bdd import update_customer_from_qr
+from back_end.utils.monitoring import PerformanceMonitor
 
 
-def extract_data_qrcode(image_path):
-    """Extrait les données d'un QR code et les enregistre dans la base de données."""
+@PerformanceMonitor.trace("qr.decode")
+def decode_qr_data(image_path):
+    """Lit le QR code d'une facture sans rien enregistrer ; None si aucune facture n'y est trouvée."""
     img = Image.open(image_path)
     result = decode(img)
     
@@ -41,11 +43,18 @@ def extract_data_qrcode(image_path):
                         qr_data["genre"] = genre
                         qr_data["birthdate"] = birth_date
     
-    # Si on a trouvé un numéro de facture, mettre à jour les infos client
     if "invoice_number" in qr_data:
+        return qr_data
+    print("❌ Aucune information de facture trouvée dans le QR code.")
+    return None
+
+@PerformanceMonitor.trace("qr.extract")
+def extract_data_qrcode(image_path):
+    """Extrait les données d'un QR code et les enregistre dans la base de données."""
+    qr_data = decode_qr_data(image_path)
+    
+    # Si on a trouvé un numéro de facture, mettre à jour les infos client
+    if qr_data:
         update_customer_from_qr(qr_data)
         print("✅ Informations extraites du QR code:", qr_data)
-        return qr_data
-    else:
-        print("❌ Aucune information de facture trouvée dans le QR code.")
-        return None
\ No newline at end of file
+    return qr_data
\ No newline at end of file
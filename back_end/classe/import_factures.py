@@ -0,0 +1,285 @@
+"""
+Import en masse des factures scannées d'un dossier (par exemple facture_2018 ... facture_2024).
+
+Utilisé par les boucles test_allfichier_db / test_allfichier_db_qr de
+back_end/classe/main.py :
+- l'OCR des images est réparti sur un pool de processus ;
+- les factures sont enregistrées par lots (save_invoices_batch) ;
+- chaque fichier traité est noté dans un manifeste : une reprise après
+  interruption repart là où l'import s'était arrêté ;
+- les factures déjà présentes en base (numéro tiré du nom de fichier) ne
+  sont pas repassées à l'OCR ;
+- le débit et le temps restant estimé sont affichés pendant l'import ;
+- avec --profile, chaque processus OCR est profilé par échantillonnage et
+  les piles de tous les processus sont réunies dans un fichier de piles
+  repliées (flamegraph.pl, speedscope).
+
+Les factures sont écrites dans le stockage choisi par STORAGE_BACKEND
+(back_end/utils/storage.py).
+
+Usage (depuis la racine du projet) :
+    python -m back_end.classe.import_factures C:/chemin/vers/OCR/data --workers 8
+    python -m back_end.classe.import_factures data/facture_2019 --qr --retry-failed
+    python -m back_end.classe.import_factures data/facture_2019 --profile profil_ocr
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import glob
+import datetime
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from back_end.utils.storage import get_storage, close_storage
+from back_end.utils.invoice_extraction import extract_invoice_data, extract_invoice_number_from_filename
+from back_end.utils.log_sink import close_log_sink
+from back_end.utils.profiler import start_process_profiler, merge_collapsed, format_collapsed, top_functions
+
+MANIFEST_NAME = "import_manifest.jsonl"
+
+# États finaux : le fichier n'est plus retraité lors d'une reprise
+STATUTS_TERMINES = {"importee", "deja_presente"}
+
+
+def find_images(root, extension=".png"):
+    """Lister les images sous root, triées, en chemins relatifs"""
+    images = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.lower().endswith(extension):
+                images.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    images.sort()
+    return images
+
+def load_manifest(path):
+    """Dernier état connu de chaque fichier déjà traité"""
+    statuts = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    statuts[record["fichier"]] = record["statut"]
+                except (ValueError, KeyError):
+                    # Ligne tronquée par une interruption : le fichier sera retraité
+                    continue
+    return statuts
+
+def append_manifest(manifest, records):
+    """Ajouter des états au manifeste, écrits sur disque avant de continuer"""
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    for record in records:
+        manifest.write(json.dumps({**record, "date": now}, ensure_ascii=False) + "\n")
+    manifest.flush()
+    os.fsync(manifest.fileno())
+
+def _init_worker(verbose, profile_dir=None):
+    # Les fonctions d'extraction affichent beaucoup de traces : les masquer par défaut
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    if profile_dir:
+        start_process_profiler(profile_dir)
+
+def report_profiles(profile_dir, limit=15):
+    """Réunir les piles des processus OCR dans ocr_workers.collapsed et afficher les fonctions les plus coûteuses"""
+    paths = glob.glob(os.path.join(profile_dir, "profile-*.collapsed"))
+    stacks = merge_collapsed(paths)
+    output = os.path.join(profile_dir, "ocr_workers.collapsed")
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(format_collapsed(stacks))
+    for path in paths:
+        os.remove(path)
+
+    print(f"Profil de {len(paths)} processus OCR ({sum(stacks.values())} échantillons) : {output}")
+    for function in top_functions(stacks, limit):
+        print(f"  {function['self_percent']:>5.1f}% propre  {function['total_percent']:>5.1f}% total  {function['function']}")
+
+def _process_image(root, relpath, with_qr):
+    """OCR d'une image dans un processus du pool (aucun accès à la base)"""
+    image_path = os.path.join(root, relpath)
+    try:
+        invoice_data = extract_invoice_data(image_path)
+        if invoice_data is None:
+            return {"fichier": relpath, "erreur": "OCR impossible"}
+
+        qr_data = None
+        if with_qr:
+            # pyzbar n'est nécessaire qu'avec --qr
+            from back_end.classe.extract_qr_code import decode_qr_data
+            qr_data = decode_qr_data(image_path)
+        return {"fichier": relpath, "data": invoice_data, "qr": qr_data}
+    except Exception as e:
+        return {"fichier": relpath, "erreur": str(e)}
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+class ImportProgress:
+    """Compteurs de l'import et affichage du débit et du temps restant"""
+
+    def __init__(self, total, interval):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.imported = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self._last_print = 0.0
+
+    def update(self, imported=0, failed=0):
+        self.done += imported + failed
+        self.imported += imported
+        self.failed += failed
+        now = time.monotonic()
+        if now - self._last_print >= self.interval or self.done == self.total:
+            self._last_print = now
+            self.print()
+
+    def print(self):
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0
+        eta = (self.total - self.done) / rate if rate > 0 else 0
+        print(
+            f"[{self.done}/{self.total}] {rate:.1f} fichiers/s, "
+            f"{self.imported} importée(s), {self.failed} en échec, "
+            f"temps restant estimé {_format_duration(eta)}",
+            flush=True
+        )
+
+def write_batch(pending, manifest, progress):
+    """Enregistrer un lot de résultats OCR et noter leur état dans le manifeste"""
+    invoices = [{"filename": os.path.basename(r["fichier"]), "data": r["data"]} for r in pending]
+    results = get_storage().save_invoices_batch(invoices)
+
+    records = []
+    for item, result in zip(pending, results):
+        records.append({
+            "fichier": item["fichier"],
+            "statut": "importee" if result["success"] else "rejetee",
+            "nom_facture": result["invoice_number"],
+            "erreur": result["error"],
+        })
+
+    # Les QR codes complètent les clients des factures qui viennent d'être enregistrées
+    qr_items = [item["qr"] for item, result in zip(pending, results) if result["success"] and item.get("qr")]
+    get_storage().update_customers_from_qr(qr_items)
+
+    append_manifest(manifest, records)
+    imported = sum(1 for r in records if r["statut"] == "importee")
+    progress.update(imported=imported, failed=len(records) - imported)
+
+def run_import(root, workers=None, batch_size=100, manifest_path=None, with_qr=False,
+               retry_failed=False, skip_existing=True, progress_interval=5.0, verbose=False,
+               profile_dir=None):
+    """
+    Importer toutes les images de root.
+
+    Returns:
+        ImportProgress avec les compteurs finaux
+    """
+    manifest_path = manifest_path or os.path.join(root, MANIFEST_NAME)
+    statuts = load_manifest(manifest_path)
+
+    images = find_images(root)
+    todo = [
+        relpath for relpath in images
+        if statuts.get(relpath) not in STATUTS_TERMINES
+        and (retry_failed or relpath not in statuts)
+    ]
+    print(f"{len(images)} image(s) trouvée(s), {len(images) - len(todo)} déjà traitée(s) d'après {manifest_path}")
+
+    with open(manifest_path, "a", encoding="utf-8") as manifest:
+        # Ne pas repasser à l'OCR les factures déjà en base
+        if skip_existing and todo:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                numbers = {relpath: extract_invoice_number_from_filename(relpath) for relpath in todo}
+            present = get_storage().get_existing_invoice_numbers({n for n in numbers.values() if n})
+            if present:
+                append_manifest(manifest, [
+                    {"fichier": relpath, "statut": "deja_presente", "nom_facture": numbers[relpath], "erreur": None}
+                    for relpath in todo if numbers[relpath] in present
+                ])
+                todo = [relpath for relpath in todo if numbers[relpath] not in present]
+                print(f"{len(present)} facture(s) déjà présente(s) en base ignorée(s)")
+
+        progress = ImportProgress(len(todo), progress_interval)
+        if not todo:
+            print("Rien à importer.")
+            return progress
+
+        workers = workers or os.cpu_count() or 1
+        print(f"Import de {len(todo)} fichier(s) avec {workers} processus, lots de {batch_size}")
+
+        pending = []
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(verbose, profile_dir)) as executor:
+                futures = {executor.submit(_process_image, root, relpath, with_qr): relpath for relpath in todo}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # Processus OCR tué (mémoire épuisée...) : le fichier sera repris avec --retry-failed
+                        result = {"fichier": futures[future], "erreur": f"Processus OCR interrompu: {e!r}"}
+                    if "erreur" in result:
+                        append_manifest(manifest, [{
+                            "fichier": result["fichier"], "statut": "erreur_ocr",
+                            "nom_facture": None, "erreur": result["erreur"]
+                        }])
+                        progress.update(failed=1)
+                        continue
+
+                    pending.append(result)
+                    if len(pending) >= batch_size:
+                        batch, pending = pending, []
+                        write_batch(batch, manifest, progress)
+        finally:
+            # Fin normale ou interruption : enregistrer les résultats OCR déjà obtenus
+            if pending:
+                write_batch(pending, manifest, progress)
+
+    # Les processus du pool ont écrit leurs piles en s'arrêtant
+    if profile_dir:
+        report_profiles(profile_dir)
+
+    elapsed = time.monotonic() - progress.start
+    print(f"✅ Import terminé en {_format_duration(elapsed)}: {progress.imported} importée(s), "
+          f"{progress.failed} en échec (détails dans {manifest_path})")
+    return progress
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="Dossier contenant les images de factures (parcouru récursivement)")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus OCR (par défaut : nombre de CPU)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Nombre de factures par transaction")
+    parser.add_argument("--manifest", default=None, help=f"Fichier manifeste (par défaut : <root>/{MANIFEST_NAME})")
+    parser.add_argument("--qr", action="store_true", help="Lire aussi les QR codes (genre, date de naissance)")
+    parser.add_argument("--retry-failed", action="store_true", help="Retraiter les fichiers en échec lors d'un import précédent")
+    parser.add_argument("--no-skip-existing", action="store_true", help="Repasser aussi à l'OCR les factures déjà en base")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Secondes entre deux affichages de progression")
+    parser.add_argument("--verbose", action="store_true", help="Afficher les traces de l'OCR")
+    parser.add_argument("--profile", default=None, metavar="DOSSIER",
+                        help="Profiler les processus OCR et écrire leurs piles repliées dans ce dossier")
+    args = parser.parse_args()
+
+    try:
+        run_import(
+            args.root,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            manifest_path=args.manifest,
+            with_qr=args.qr,
+            retry_failed=args.retry_failed,
+            skip_existing=not args.no_skip_existing,
+            progress_interval=args.progress_interval,
+            verbose=args.verbose,
+            profile_dir=args.profile,
+        )
+    finally:
+        close_log_sink()
+        close_storage()
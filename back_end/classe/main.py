@@ -1,7 +1,7 @@
-import os
-from extract_qr_code import extract_data_qrcode
 from ocr_tesseract import extract_invoice_data_improved
+from import_factures import run_import
 from save_data_bdd import create_tables
+from write_queue_bdd import close_write_queue
 import time
 
 if __name__ == "__main__":
@@ -17,17 +17,8 @@ if __name__ == "__main__":
         for annee in annee:
             dossier_factures = fr"c:\Users\dd758\Formation_IA_Greta\OCR_Projet\OCR\data\facture_{annee}"
             print(f"Traitement des factures de l'année {annee}...")
-            for fichier in os.listdir(dossier_factures):
-                if fichier.endswith('.png'):
-                    image_path = os.path.join(dossier_factures, fichier)
-                    print(f"\nTraitement de {fichier}...")
-                    try:
-                        extract_invoice_data_improved(image_path)
-                    except Exception as e:
-                        print(f"❌ Erreur lors du traitement de {fichier}: {e}")
-                        # Ajoutez ici un rollback si nécessaire
-                        # connection.rollback()  # Décommentez cette ligne après avoir ajouté la connexion
-                        continue
+            # OCR en parallèle, enregistrement par lots, reprise après interruption
+            run_import(dossier_factures)
             print(f"✅ Traitement terminé pour l'année {annee}")
     # Extraction des données de la facture
     def test_allfichier_db_qr():
@@ -35,20 +26,13 @@ if __name__ == "__main__":
         for annee in annee:
             dossier_factures = fr"c:\Users\dd758\Formation_IA_Greta\OCR_Projet\OCR\data\facture_{annee}"
             print(f"Traitement des factures de l'année {annee}...")
-            for fichier in os.listdir(dossier_factures):
-                if fichier.endswith('.png'):
-                    image_path = os.path.join(dossier_factures, fichier)
-                    print(f"\nTraitement de {fichier}...")
-                    try:
-                        extract_data_qrcode(image_path)
-                    except Exception as e:
-                        print(f"❌ Erreur lors du traitement de {fichier}: {e}")
-                        # Ajoutez ici un rollback si nécessaire
-                        # connection.rollback()  # Décommentez cette ligne après avoir ajouté la connexion
-                        continue
+            # Les QR codes complètent les clients des factures importées
+            run_import(dossier_factures, with_qr=True)
             print(f"✅ Traitement terminé pour l'année {annee}")
     
     test1_fichier_db()
+    # Attendre l'enregistrement des factures encore dans la file d'écriture
+    close_write_queue()
 
 
 
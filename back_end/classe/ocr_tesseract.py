@@ -1,7 +1,7 @@
 import pytesseract
 from preprocess_image import preprocessing_image
 import re
-from save_data_bdd import save_invoice_data_to_db_improved
+from write_queue_bdd import submit_invoice
 import os
 
 def extract_invoice_data_improved(image_path):
@@ -153,11 +153,11 @@ def extract_invoice_data_improved(image_path):
     if invoice_data["total"] and abs(calculated_total - invoice_data["total"]) > 0.01:
         print(f"⚠️ Incohérence dans le total: {invoice_data['total']} vs {calculated_total} calculé")
 
-    # Ajouter une gestion d'erreur lors de l'enregistrement
+    # L'enregistrement est confié à la file d'écriture : l'OCR continue pendant les écritures
     try:
-        save_invoice_data_to_db_improved(invoice_data)
-        print("✅ Données de la facture extraites et enregistrées avec succès.")
+        submit_invoice(invoice_data, filename=os.path.basename(image_path))
+        print("✅ Données de la facture extraites et transmises pour enregistrement.")
     except Exception as e:
-        print(f"❌ Erreur lors de l'enregistrement des données: {str(e)}")
+        print(f"❌ Erreur lors de la transmission des données: {str(e)}")
         
     return invoice_data
\ No newline at end of file
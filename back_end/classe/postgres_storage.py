@@ -0,0 +1,50 @@
+"""Stockage Postgres (schéma dylan) : délègue aux fonctions de save_data_bdd et read_data_bdd."""
+from back_end.classe import save_data_bdd, read_data_bdd
+from back_end.utils.database import close_pool
+from back_end.utils.storage import InvoiceStorage
+
+
+class PostgresStorage(InvoiceStorage):
+    """Stockage dans la base Postgres, à travers le pool de connexions partagé"""
+
+    def save_invoices_batch(self, invoices):
+        return save_data_bdd.save_invoices_batch(invoices)
+
+    def get_existing_invoice_numbers(self, numbers):
+        return read_data_bdd.get_existing_invoice_numbers(numbers)
+
+    def get_factures_page(self, email, limit=50, cursor=None, include_total=False, **filters):
+        return read_data_bdd.get_factures_page(email, limit=limit, cursor=cursor, include_total=include_total, **filters)
+
+    def get_facture_details(self, facture_id):
+        return read_data_bdd.get_facture_details_by_id(facture_id)
+
+    def search_factures(self, terme, email=None, limit=20, offset=0):
+        return read_data_bdd.search_factures(terme, email=email, limit=limit, offset=offset)
+
+    def save_invoice_rejects(self, rows):
+        save_data_bdd.save_invoice_rejects(rows)
+
+    def register_user_account(self, email, nom, prenom, date_naissance, password_hash, salt):
+        return save_data_bdd.register_user_account(email, nom, prenom, date_naissance, password_hash, salt)
+
+    def get_login_user(self, email):
+        return read_data_bdd.get_login_user(email)
+
+    def update_password_hash(self, email, password_hash, salt=""):
+        save_data_bdd.update_password_hash(email, password_hash, salt)
+
+    def update_customers_from_qr(self, qr_items):
+        save_data_bdd.update_customers_from_qr_batch(qr_items)
+
+    def get_customer_features(self, date_from=None, date_to=None):
+        return read_data_bdd.get_customer_features(date_from, date_to)
+
+    def get_product_features(self, date_from=None, date_to=None):
+        return read_data_bdd.get_product_features(date_from, date_to)
+
+    def write_logs(self, entries, timeout=None):
+        save_data_bdd.save_log_entries(entries, timeout=timeout)
+
+    def close(self):
+        close_pool()
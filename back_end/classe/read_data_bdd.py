@@ -0,0 +1,456 @@
+import json
+import base64
+import datetime
+from psycopg2.extras import RealDictCursor
+from back_end.utils.database import get_db_connection, execute_prepared
+from back_end.utils.cache import cached_factures_page, cached_facture_details
+
+# Requêtes fréquentes, vérifiées par EXPLAIN dans back_end.utils.migrations
+# L'historique est trié du plus récent au plus ancien ; les factures sans date
+# passent en dernier grâce à COALESCE(date_facture, '-infinity'), qui est aussi
+# la clé de l'index facture_email_date_id_idx.
+FACTURES_PAR_EMAIL_QUERY = """
+    SELECT f.id, f.nom_facture, f.date_facture, f.total_facture, u.nom_personne,
+           COALESCE(f.date_facture, '-infinity'::date) AS cle_date
+    FROM dylan.facture f
+    JOIN dylan.utilisateur u ON f.email_personne = u.email_personne
+    WHERE {conditions}
+    ORDER BY COALESCE(f.date_facture, '-infinity'::date) DESC, f.id DESC
+    LIMIT %s
+"""
+
+NOMBRE_FACTURES_QUERY = """
+    SELECT COUNT(*) AS total
+    FROM dylan.facture f
+    WHERE {conditions}
+"""
+
+DETAILS_FACTURE_QUERY = """
+    SELECT f.nom_facture, f.date_facture, f.total_facture, f.email_personne, u.nom_personne,
+           a.nom_article, a.quantite, a.prix
+    FROM dylan.facture f
+    JOIN dylan.utilisateur u ON f.email_personne = u.email_personne
+    LEFT JOIN dylan.article a ON f.id = a.facture_id
+    WHERE f.id = %s
+"""
+
+CONNEXION_UTILISATEUR_QUERY = """
+    SELECT a.email, a.mot_de_passe_hash, a.salt, a.est_actif,
+           u.nom_personne, u.genre, u.adresse, u.date_anniversaire
+    FROM dylan.authentification a
+    JOIN dylan.utilisateur u ON a.email = u.email_personne
+    WHERE a.email = %s
+"""
+
+# Recherche par numéro de facture, nom d'article ou nom de client
+# (index de structures/migrations/0007_recherche_factures.sql). Chaque branche
+# retient au plus RECHERCHE_CANDIDATS correspondances d'un champ, les plus
+# récentes ; une facture trouvée par plusieurs champs garde son meilleur score.
+# Le score cumule la ressemblance (pg_trgm), un bonus pour une sous-chaîne
+# exacte et, pour le numéro, un bonus pour le numéro complet. Il n'est calculé
+# que pour les candidats retenus : un terme très courant ("lait") reste rapide.
+RECHERCHE_FACTURES_QUERY = """
+    WITH correspondances AS (
+        (SELECT f.id AS facture_id, 'nom_facture' AS champ,
+                word_similarity(%(terme)s, f.nom_facture)
+                + CASE WHEN f.nom_facture ILIKE %(motif)s THEN 1 ELSE 0 END
+                + CASE WHEN lower(f.nom_facture) = lower(%(terme)s) THEN 1 ELSE 0 END AS score
+         FROM dylan.facture f
+         WHERE (f.nom_facture ILIKE %(motif)s OR %(terme)s <%% f.nom_facture)
+           AND {filtre}
+         ORDER BY f.id DESC
+         LIMIT %(candidats)s)
+        UNION ALL
+        (SELECT a.facture_id, 'nom_article',
+                word_similarity(%(terme)s, a.nom_article)
+                + ts_rank(to_tsvector('simple', a.nom_article), plainto_tsquery('simple', %(terme)s))
+                + CASE WHEN a.nom_article ILIKE %(motif)s THEN 1 ELSE 0 END
+         FROM dylan.article a
+         JOIN dylan.facture f ON f.id = a.facture_id
+         WHERE (a.nom_article ILIKE %(motif)s
+                OR %(terme)s <%% a.nom_article
+                OR to_tsvector('simple', a.nom_article) @@ plainto_tsquery('simple', %(terme)s))
+           AND {filtre}
+         ORDER BY a.facture_id DESC
+         LIMIT %(candidats)s)
+        UNION ALL
+        (SELECT f.id, 'nom_personne',
+                word_similarity(%(terme)s, u.nom_personne)
+                + CASE WHEN u.nom_personne ILIKE %(motif)s THEN 1 ELSE 0 END
+         FROM dylan.utilisateur u
+         JOIN dylan.facture f ON f.email_personne = u.email_personne
+         WHERE (u.nom_personne ILIKE %(motif)s OR %(terme)s <%% u.nom_personne)
+           AND {filtre}
+         ORDER BY f.id DESC
+         LIMIT %(candidats)s)
+    )
+    SELECT f.id, f.nom_facture, f.date_facture, f.total_facture, u.nom_personne, m.score, m.champs
+    FROM (
+        SELECT facture_id, MAX(score) AS score, array_agg(DISTINCT champ) AS champs
+        FROM correspondances
+        GROUP BY facture_id
+    ) m
+    JOIN dylan.facture f ON f.id = m.facture_id
+    JOIN dylan.utilisateur u ON u.email_personne = f.email_personne
+    ORDER BY m.score DESC, f.id DESC
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+# Nombre maximal de correspondances retenues par champ recherché
+RECHERCHE_CANDIDATS = 1000
+# En dessous de 3 caractères, les index trigrammes ne peuvent pas servir
+RECHERCHE_LONGUEUR_MIN = 3
+
+
+def encode_cursor(cle_date, facture_id):
+    """Encode la position (date, id) de la dernière facture d'une page."""
+    # psycopg2 renvoie '-infinity' (factures sans date) sous la forme date.min
+    if cle_date is None or cle_date == datetime.date.min:
+        cle_date = "-infinity"
+    cle = cle_date.isoformat() if isinstance(cle_date, datetime.date) else str(cle_date)
+    return base64.urlsafe_b64encode(json.dumps([cle, facture_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    """Décode un curseur de pagination ; lève ValueError s'il est invalide."""
+    try:
+        cle_date, facture_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if cle_date != "-infinity":
+            datetime.date.fromisoformat(cle_date)
+        return cle_date, int(facture_id)
+    except Exception:
+        raise ValueError("Curseur de pagination invalide")
+
+def build_factures_conditions(email, date_from=None, date_to=None, min_total=None, max_total=None):
+    """Construit la clause WHERE commune à la page et au comptage."""
+    conditions = ["f.email_personne = %s"]
+    params = [email]
+
+    if date_from is not None:
+        conditions.append("f.date_facture >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("f.date_facture <= %s")
+        params.append(date_to)
+    if min_total is not None:
+        conditions.append("f.total_facture >= %s")
+        params.append(min_total)
+    if max_total is not None:
+        conditions.append("f.total_facture <= %s")
+        params.append(max_total)
+
+    return conditions, params
+
+def build_factures_page_query(email, limit, cursor=None, **filters):
+    """Construit la requête d'une page d'historique (pagination par clé sur (date, id))."""
+    conditions, params = build_factures_conditions(email, **filters)
+
+    if cursor:
+        cle_date, facture_id = decode_cursor(cursor)
+        conditions.append("(COALESCE(f.date_facture, '-infinity'::date), f.id) < (%s::date, %s)")
+        params.extend([cle_date, facture_id])
+        # Même borne écrite sur date_facture seule : les partitions des années
+        # plus récentes que le curseur ne sont pas lues
+        if cle_date == "-infinity":
+            conditions.append("f.date_facture IS NULL")
+        else:
+            conditions.append("(f.date_facture <= %s OR f.date_facture IS NULL)")
+            params.append(cle_date)
+
+    # Une ligne de plus pour savoir s'il existe une page suivante
+    params.append(limit + 1)
+    return FACTURES_PAR_EMAIL_QUERY.format(conditions=" AND ".join(conditions)), params
+
+def get_factures_page(email, limit=50, cursor=None, include_total=False, **filters):
+    """
+    Récupère une page de l'historique des factures d'un utilisateur.
+
+    Args:
+        email: Email de l'utilisateur
+        limit: Nombre maximal de factures dans la page
+        cursor: Curseur renvoyé par la page précédente (None pour la première page)
+        include_total: Compter aussi le nombre total de factures correspondant aux filtres
+        **filters: date_from, date_to, min_total, max_total
+
+    Returns:
+        {"factures": [...], "next_cursor": str ou None, "total": int (si demandé)}
+    """
+    # Valider le curseur avant de consulter le cache
+    query, params = build_factures_page_query(email, limit, cursor, **filters)
+    cache_params = {"limit": limit, "cursor": cursor, "include_total": include_total, **filters}
+
+    return cached_factures_page(
+        lambda: _load_factures_page(query, params, email, limit, include_total, filters),
+        email,
+        cache_params
+    )
+
+def _load_factures_page(query, params, email, limit, include_total, filters):
+    """Lit une page d'historique en base (appelé en cas d'absence du cache)."""
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        execute_prepared(cur, query, params)
+        factures = cur.fetchall()
+
+        total = None
+        if include_total:
+            conditions, count_params = build_factures_conditions(email, **filters)
+            execute_prepared(cur, NOMBRE_FACTURES_QUERY.format(conditions=" AND ".join(conditions)), count_params)
+            total = cur.fetchone()['total']
+    finally:
+        cur.close()
+        conn.close()
+
+    next_cursor = None
+    if len(factures) > limit:
+        factures = factures[:limit]
+        next_cursor = encode_cursor(factures[-1]['cle_date'], factures[-1]['id'])
+
+    for facture in factures:
+        del facture['cle_date']
+        if isinstance(facture['date_facture'], datetime.date):
+            facture['date_facture'] = facture['date_facture'].strftime('%Y-%m-%d')
+
+    page = {"factures": factures, "next_cursor": next_cursor}
+    if include_total:
+        page["total"] = total
+    return page
+
+def get_facture_details_by_id(facture_id):
+    """Récupère une facture et ses articles, ou None si elle n'existe pas."""
+    return cached_facture_details(lambda: _load_facture_details(facture_id), facture_id)
+
+def _load_facture_details(facture_id):
+    """Lit une facture en base ; renvoie (email du client, détails) ou None."""
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        execute_prepared(cursor, DETAILS_FACTURE_QUERY, (facture_id,))
+        facture_details = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not facture_details:
+        return None
+
+    for detail in facture_details:
+        if isinstance(detail['date_facture'], datetime.date):
+            detail['date_facture'] = detail['date_facture'].isoformat()
+
+    return facture_details[0]['email_personne'], {
+        "nom_facture": facture_details[0]['nom_facture'],
+        "date_facture": facture_details[0]['date_facture'],
+        "total_facture": facture_details[0]['total_facture'],
+        "nom_personne": facture_details[0]['nom_personne'],
+        "articles": [
+            {
+                "nom_article": detail['nom_article'],
+                "quantite": detail['quantite'],
+                "prix": detail['prix']
+            } for detail in facture_details if detail['nom_article'] is not None
+        ]
+    }
+
+def get_login_user(email):
+    """Récupère les informations d'authentification et le profil d'un utilisateur."""
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        execute_prepared(cursor, CONNEXION_UTILISATEUR_QUERY, (email,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_existing_invoice_numbers(numbers):
+    """Numéros de facture déjà enregistrés parmi ceux donnés."""
+    if not numbers:
+        return set()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        execute_prepared(cursor, "SELECT nom_facture FROM dylan.facture WHERE nom_facture = ANY(%s)", (list(numbers),))
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+CUSTOMER_FEATURES_QUERY = """
+    SELECT
+        u.email_personne AS customer_id,
+        u.nom_personne AS customer_name,
+        u.email_personne AS email,
+        COALESCE(a.nombre_factures, 0) AS total_invoices,
+        a.total_depense AS total_spent,
+        a.total_depense / NULLIF(a.nombre_factures, 0) AS average_invoice_amount,
+        a.derniere_facture AS last_purchase_date,
+        COALESCE(a.nombre_articles_distincts, 0) AS unique_products_bought
+    FROM dylan.utilisateur u
+    LEFT JOIN ({agregats}) a ON a.email_personne = u.email_personne
+"""
+
+# Agrégats clients recalculés sur une période. {periode} borne date_facture sur
+# chaque table lue : le planificateur ne lit que les partitions des années concernées
+AGREGAT_CLIENT_PERIODE_QUERY = """
+    SELECT f.email_personne, f.nombre_factures, f.total_depense, f.derniere_facture,
+           COALESCE(p.nombre_articles_distincts, 0) AS nombre_articles_distincts
+    FROM (
+        SELECT f.email_personne, COUNT(*) AS nombre_factures,
+               COALESCE(SUM(f.total_facture), 0) AS total_depense, MAX(f.date_facture) AS derniere_facture
+        FROM dylan.facture f
+        WHERE f.email_personne IS NOT NULL AND {periode_f}
+        GROUP BY f.email_personne
+    ) f
+    LEFT JOIN (
+        SELECT f.email_personne, COUNT(DISTINCT a.nom_article) AS nombre_articles_distincts
+        FROM dylan.article a
+        JOIN dylan.facture f ON f.id = a.facture_id
+        WHERE {periode_af}
+        GROUP BY f.email_personne
+    ) p ON p.email_personne = f.email_personne
+"""
+
+PRODUCT_FEATURES_PERIODE_QUERY = """
+    SELECT
+        a.nom_article AS product_name,
+        COUNT(*) AS times_purchased,
+        AVG(a.prix) AS average_price,
+        COALESCE(SUM(a.quantite), 0) AS total_quantity_sold,
+        COUNT(DISTINCT f.email_personne) AS unique_customers
+    FROM dylan.article a
+    JOIN dylan.facture f ON f.id = a.facture_id
+    WHERE {periode_af}
+    GROUP BY a.nom_article
+"""
+
+def _periode(date_from, date_to, *aliases):
+    """Bornes de date_facture (incluses) sur chacune des tables données, avec leurs paramètres."""
+    conditions, params = [], []
+    for alias in aliases:
+        if date_from is not None:
+            conditions.append(f"{alias}.date_facture >= %s")
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append(f"{alias}.date_facture <= %s")
+            params.append(date_to)
+    return " AND ".join(conditions), params
+
+def get_customer_features(date_from=None, date_to=None):
+    """
+    Caractéristiques d'achat de chaque client pour le clustering.
+
+    Sans période, elles sont lues dans dylan.agregat_client, tenu à jour par
+    triggers (structures/migrations/0005_agregats_clustering.sql) : aucun
+    parcours de l'historique des factures. Avec une période (bornes incluses),
+    elles sont recalculées sur les seules partitions annuelles concernées.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        if date_from is None and date_to is None:
+            cursor.execute(CUSTOMER_FEATURES_QUERY.format(agregats="SELECT * FROM dylan.agregat_client"))
+        else:
+            periode_f, params_f = _periode(date_from, date_to, "f")
+            periode_af, params_af = _periode(date_from, date_to, "a", "f")
+            agregats = AGREGAT_CLIENT_PERIODE_QUERY.format(periode_f=periode_f, periode_af=periode_af)
+            cursor.execute(CUSTOMER_FEATURES_QUERY.format(agregats=agregats), params_f + params_af)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_product_features(date_from=None, date_to=None):
+    """
+    Statistiques d'achat de chaque article pour le clustering.
+
+    Lues dans dylan.agregat_article, ou recalculées sur une période (bornes
+    incluses) à partir des seules partitions annuelles concernées.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        if date_from is None and date_to is None:
+            cursor.execute("""
+                SELECT
+                    nom_article AS product_name,
+                    nombre_achats AS times_purchased,
+                    somme_prix / NULLIF(nombre_prix, 0) AS average_price,
+                    quantite_totale AS total_quantity_sold,
+                    nombre_clients AS unique_customers
+                FROM dylan.agregat_article
+                WHERE nombre_achats > 0
+            """)
+        else:
+            periode_af, params_af = _periode(date_from, date_to, "a", "f")
+            cursor.execute(PRODUCT_FEATURES_PERIODE_QUERY.format(periode_af=periode_af), params_af)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+def build_recherche_query(terme, email=None, limit=20, offset=0):
+    """Construit la requête de recherche ; lève ValueError si le terme est trop court."""
+    terme = (terme or "").strip()
+    if len(terme) < RECHERCHE_LONGUEUR_MIN:
+        raise ValueError(f"La recherche doit contenir au moins {RECHERCHE_LONGUEUR_MIN} caractères")
+
+    # Les caractères spéciaux de LIKE sont recherchés tels quels
+    echappe = terme.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    params = {
+        "terme": terme,
+        "motif": f"%{echappe}%",
+        "email": email,
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        "limit": limit + 1,
+        "offset": offset,
+        "candidats": RECHERCHE_CANDIDATS,
+    }
+    filtre = "f.email_personne = %(email)s" if email else "TRUE"
+    return RECHERCHE_FACTURES_QUERY.format(filtre=filtre), params
+
+def search_factures(terme, email=None, limit=20, offset=0):
+    """
+    Recherche des factures par numéro (même partiel), nom d'article ou nom de client.
+
+    Args:
+        terme: Texte recherché (au moins RECHERCHE_LONGUEUR_MIN caractères)
+        email: Limiter la recherche aux factures de cet utilisateur
+        limit: Nombre maximal de factures dans la page
+        offset: Nombre de factures des pages précédentes
+
+    Returns:
+        {"factures": [... avec "score" et "champs" trouvés], "next_offset": int ou None}
+    """
+    query, params = build_recherche_query(terme, email, limit, offset)
+
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        # Pas d'instruction préparée : le meilleur plan dépend de la sélectivité du terme
+        cursor.execute(query, params)
+        factures = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    next_offset = None
+    if len(factures) > limit:
+        factures = factures[:limit]
+        next_offset = offset + limit
+
+    for facture in factures:
+        facture['score'] = round(float(facture['score']), 4)
+        if isinstance(facture['date_facture'], datetime.date):
+            facture['date_facture'] = facture['date_facture'].strftime('%Y-%m-%d')
+
+    return {"factures": factures, "next_offset": next_offset}
@@ -1,81 +1,35 @@
-import os
 import psycopg2
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 import time
+import datetime
 from back_end.classe.validate_date import validate_date
+from back_end.utils.database import get_db_connection, execute_prepared
+from back_end.utils.migrations import apply_migrations
+from back_end.utils.cache import invalidate_customers, invalidate_factures
+from back_end.utils.log_sink import log_error
+from back_end.utils.monitoring import PerformanceMonitor
 
 
 load_dotenv()
 
-def create_tables():
-    # Connexion à la base de données
-    conn = psycopg2.connect(
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT")
-    )
-    cur = conn.cursor()
+# Verrou consultatif par numéro de facture (voir _lock_invoice_numbers)
+FACTURE_LOCK_ID = 727_003
 
-    # Script SQL pour créer les tables dans un schéma spécifique
-    create_table_query = """
-    CREATE SCHEMA IF NOT EXISTS dylan;
-
-    -- Table utilisateur
-    CREATE TABLE IF NOT EXISTS dylan.utilisateur (
-        email_personne VARCHAR(255) PRIMARY KEY,
-        nom_personne VARCHAR(255),
-        genre VARCHAR(50),
-        adresse VARCHAR(500),
-        date_anniversaire DATE
-        );
-
-    -- Table Facture
-    CREATE TABLE IF NOT EXISTS dylan.facture (
-        nom_facture VARCHAR(255) PRIMARY KEY,
-        date_facture DATE,
-        total_facture float,
-        email_personne VARCHAR(255),
-        FOREIGN KEY (email_personne) REFERENCES dylan.utilisateur(email_personne)
-    );
-
-    -- Table Article
-    CREATE TABLE IF NOT EXISTS dylan.article (
-        nom_facture VARCHAR(255),
-        nom_article VARCHAR(255),
-        quantite float,
-        prix float,
-        PRIMARY KEY (nom_facture, nom_article),
-        FOREIGN KEY (nom_facture) REFERENCES dylan.facture(nom_facture)
-        );
-
-    -- Table log
-    CREATE TABLE IF NOT EXISTS dylan.log (
-        id SERIAL PRIMARY KEY,
-        time TIMESTAMP,
-        fichier VARCHAR(255),
-        erreur TEXT
-    );"""
-    
-    # Exécution du script SQL
-    cur.execute(create_table_query)
-    conn.commit()
+# Années dont les partitions existent (vues par ce processus)
+_partition_years = set()
 
-    # Fermeture de la connexion
-    cur.close()
-    conn.close()
+def create_tables():
+    """Crée ou met à jour le schéma en appliquant les migrations en attente."""
+    applied = apply_migrations()
+    if applied:
+        print(f"Migrations appliquées: {', '.join(applied)}")
     
+@PerformanceMonitor.trace("db.save_invoice")
 def save_invoice_data_to_db_improved(invoice_data):
     """Enregistre les données de la facture dans la base de données."""
     # Connexion à la base de données
-    conn = psycopg2.connect(
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT")
-    )
+    conn = get_db_connection()
     cur = conn.cursor()
 
     try:
@@ -84,6 +38,7 @@ def save_invoice_data_to_db_improved(invoice_data):
         if not valid_date:
             print(f"⚠️ Date invalide détectée: {invoice_data.get('issue_date')}. Utilisation de la date du jour.")
             valid_date = time.strftime("%Y-%m-%d")
+        ensure_year_partitions(conn, [int(valid_date[:4])])
             
         # Vérification et insertion/mise à jour des données du client
         customer_id = None
@@ -126,11 +81,9 @@ def save_invoice_data_to_db_improved(invoice_data):
                 # Gérer les erreurs potentielles lors de l'insertion
                 print(f"Erreur lors de la création du client: {e}")
                 # Créer une entrée de journal pour l'erreur
-                cur.execute("""
-                    INSERT INTO dylan.log (time, fichier, erreur)
-                    VALUES (NOW(), 'save_invoice_data_to_db', %s)
-                """, (f"Erreur création client: {e}",))
-                conn.commit()
+                log_error('save_invoice_data_to_db', f"Erreur création client: {e}")
+                # La transaction est en échec : l'annuler avant de continuer
+                conn.rollback()
                 # Créer un client générique pour pouvoir continuer
                 cur.execute("""
                     INSERT INTO dylan.utilisateur (nom_personne, email_personne, adresse)
@@ -141,38 +94,47 @@ def save_invoice_data_to_db_improved(invoice_data):
                 print(f"Client temporaire créé avec l'ID: {customer_id}")
         
         # Vérification et insertion/mise à jour des données de la facture
+        _lock_invoice_numbers(cur, [invoice_data["invoice_number"]])
         cur.execute("""
-            SELECT nom_facture FROM dylan.facture WHERE nom_facture = %s
+            SELECT nom_facture, email_personne, id FROM dylan.facture WHERE nom_facture = %s
         """, (invoice_data["invoice_number"],))
         invoice = cur.fetchone()
+        previous_owner = None
         
         if invoice:
-            invoice_id = invoice[0]
+            invoice_id, previous_owner, facture_id = invoice
             cur.execute("""
                 UPDATE dylan.facture 
                 SET date_facture = %s, total_facture = %s, email_personne = %s 
                 WHERE nom_facture = %s
             """, (valid_date, invoice_data["total"], customer_id, invoice_id))
+            # Les articles suivent leur facture si elle change d'année
+            cur.execute("""
+                UPDATE dylan.article SET date_facture = %s
+                WHERE nom_facture = %s AND date_facture IS DISTINCT FROM %s
+            """, (valid_date, invoice_id, valid_date))
         else:
             cur.execute("""
                 INSERT INTO dylan.facture (nom_facture, date_facture, total_facture, email_personne)
                 VALUES (%s, %s, %s, %s)
-                RETURNING nom_facture
+                RETURNING nom_facture, id
             """, (invoice_data["invoice_number"], valid_date, invoice_data["total"], customer_id))
-            invoice_id = cur.fetchone()[0]
+            invoice_id, facture_id = cur.fetchone()
 
         # Insertion des articles
         for item in invoice_data["items"]:
             cur.execute("""
-                INSERT INTO dylan.article (nom_facture, nom_article, quantite, prix)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (nom_facture, nom_article) DO UPDATE 
+                INSERT INTO dylan.article (nom_facture, nom_article, quantite, prix, facture_id, date_facture)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (nom_facture, nom_article, date_facture) DO UPDATE 
                 SET quantite = %s, prix = %s
             """, (
                 invoice_data["invoice_number"], 
                 item["name"], 
                 item["quantity"], 
                 item["unit_price"],
+                facture_id,
+                valid_date,
                 item["quantity"],
                 item["unit_price"]
             ))
@@ -180,34 +142,368 @@ def save_invoice_data_to_db_improved(invoice_data):
         # Validation des transactions
         conn.commit()
         print("Données de la facture enregistrées dans la base de données.")
+
+        # Le client (et l'ancien propriétaire de la facture) voient leurs données en cache invalidées
+        invalidate_customers([customer_id, previous_owner])
+        invalidate_factures([facture_id])
         
     except Exception as e:
         conn.rollback()
         print(f"❌ Erreur lors de l'enregistrement de la facture {invoice_data.get('invoice_number')}: {e}")
         # Journalisation de l'erreur
-        try:
-            cur.execute("""
-                INSERT INTO dylan.log (time, fichier, erreur)
-                VALUES (NOW(), 'save_invoice_data_to_db', %s)
-            """, (f"Erreur facture {invoice_data.get('invoice_number')}: {e}",))
-            conn.commit()
-        except:
-            pass
+        log_error('save_invoice_data_to_db', f"Erreur facture {invoice_data.get('invoice_number')}: {e}")
     finally:
         # Fermeture de la connexion
         cur.close()
         conn.close()
         
+def _prepare_invoice(invoice_data):
+    """
+    Valide une facture reçue par l'API et la transforme en lignes prêtes à insérer.
+
+    Args:
+        invoice_data: {"filename": ..., "data": {...}} comme envoyé par le scanner
+
+    Returns:
+        Dictionnaire avec la ligne utilisateur, la ligne facture et les lignes article
+
+    Raises:
+        ValueError: si la facture ne peut pas être enregistrée telle quelle
+    """
+    filename = invoice_data.get('filename')
+    invoice = invoice_data.get('data') or {}
+
+    nom_facture = invoice.get('invoice_number') or filename
+    if not nom_facture:
+        raise ValueError("Numéro de facture et nom de fichier manquants")
+
+    email = invoice.get('email') or None
+    user = (email, invoice.get('client'), invoice.get('address')) if email else None
+
+    # Convertir la date si elle est fournie
+    # Mois ou jour hors limites corrigés par validate_date, comme save_invoice_data_to_db_improved
+    issue_date = None
+    issue_date_str = validate_date(invoice.get('issue_date'))
+    if issue_date_str:
+        try:
+            issue_date = datetime.datetime.strptime(issue_date_str, '%Y-%m-%d').date()
+        except ValueError:
+            # Date inexistante (31 février...) : la facture est enregistrée sans date
+            pass
+
+    try:
+        total = float(invoice.get('total') or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"Total invalide: {invoice.get('total')!r}")
+
+    # Un article par nom : la dernière ligne l'emporte, comme l'ON CONFLICT de save_invoice_data_to_db_improved
+    articles = {}
+    for item in invoice.get('items') or []:
+        item_name = item.get('name')
+        if not item_name:
+            continue
+        try:
+            quantity = float(item.get('quantity') or 0)
+            unit_price = float(item.get('unit_price') or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Article invalide '{item_name}': quantité ou prix non numérique")
+        articles[item_name] = (nom_facture, item_name, quantity, unit_price)
+
+    return {
+        "nom_facture": nom_facture,
+        "user": user,
+        "facture": (nom_facture, issue_date, total, email),
+        "articles": list(articles.values()),
+    }
+
+@PerformanceMonitor.trace("db.ensure_year_partitions")
+def ensure_year_partitions(conn, years):
+    """
+    Crée les partitions annuelles de facture et d'article qui manquent pour ces années.
+
+    Appelée avant d'ouvrir la transaction d'écriture d'un lot : la création
+    d'une partition verrouille brièvement la partition par défaut, elle est
+    donc validée à part. Les années dont ce processus a déjà vu les
+    partitions ne coûtent plus d'aller-retour vers la base ; une année
+    improbable reste dans la partition par défaut.
+    """
+    missing = sorted({year for year in years if year is not None} - _partition_years)
+    if not missing:
+        return
+
+    cur = conn.cursor()
+    created = []
+    try:
+        for year in missing:
+            cur.execute("SELECT dylan.creer_partitions_annee(%s)", (year,))
+            if cur.fetchone()[0]:
+                created.append(year)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    _partition_years.update(created)
+
+def _lock_invoice_numbers(cur, numbers):
+    """
+    Verrouille les numéros de facture jusqu'à la fin de la transaction.
+
+    La contrainte d'unicité de la table partitionnée porte sur (numéro, date) :
+    c'est ce verrou qui empêche deux écritures simultanées de créer le même
+    numéro dans deux années différentes. Les numéros sont verrouillés dans un
+    ordre fixe pour que deux lots qui se recouvrent ne s'interbloquent pas.
+    """
+    cur.execute(
+        "SELECT pg_advisory_xact_lock(%s, hashtext(nom)) FROM unnest(%s::text[]) AS nom",
+        (FACTURE_LOCK_ID, sorted(numbers))
+    )
+
+@PerformanceMonitor.trace("db.write_invoices")
+def _write_invoices(cur, prepared):
+    """
+    Écrit des factures validées avec une requête multi-lignes par table.
+
+    L'écriture est idempotente par numéro de facture : la facture est mise à
+    jour si elle existe déjà et ses articles sont remplacés, si bien qu'un
+    nouvel envoi de la même facture réécrit les mêmes lignes. Une facture dont
+    la date change passe dans la partition de sa nouvelle année, ses articles
+    réécrits avec elle.
+    """
+    users = {p["user"][0]: p["user"] for p in prepared if p["user"]}
+    factures = [p["facture"] for p in prepared]
+    numbers = [f[0] for f in factures]
+
+    # 1. Créer les utilisateurs, ou mettre à jour le nom et l'adresse de ceux qui existent
+    if users:
+        execute_values(cur, """
+            INSERT INTO dylan.utilisateur (email_personne, nom_personne, adresse)
+            VALUES %s
+            ON CONFLICT (email_personne) DO UPDATE
+            SET nom_personne = EXCLUDED.nom_personne, adresse = EXCLUDED.adresse
+        """, list(users.values()), page_size=len(users))
+
+    # 2. Mettre à jour les factures existantes, insérer les autres, en récupérant leur clé technique
+    _lock_invoice_numbers(cur, numbers)
+    cur.execute("SELECT nom_facture, id FROM dylan.facture WHERE nom_facture = ANY(%s)", (numbers,))
+    facture_ids = dict(cur.fetchall())
+
+    updates = [f for f in factures if f[0] in facture_ids]
+    if updates:
+        execute_values(cur, """
+            UPDATE dylan.facture f
+            SET date_facture = v.date_facture,
+                total_facture = v.total_facture,
+                email_personne = v.email_personne
+            FROM (VALUES %s) AS v(nom_facture, date_facture, total_facture, email_personne)
+            WHERE f.nom_facture = v.nom_facture
+        """, updates, template="(%s, %s::date, %s::float, %s)", page_size=len(updates))
+
+    inserts = [f for f in factures if f[0] not in facture_ids]
+    if inserts:
+        facture_ids.update(execute_values(cur, """
+            INSERT INTO dylan.facture (nom_facture, date_facture, total_facture, email_personne)
+            VALUES %s
+            RETURNING nom_facture, id
+        """, inserts, page_size=len(inserts), fetch=True))
+
+    # 3. Remplacer les articles des factures du lot, rangés dans l'année de leur facture
+    cur.execute("DELETE FROM dylan.article WHERE nom_facture = ANY(%s)", (numbers,))
+    articles = [
+        article + (facture_ids[p["nom_facture"]], p["facture"][1])
+        for p in prepared
+        for article in p["articles"]
+    ]
+    if articles:
+        execute_values(cur, """
+            INSERT INTO dylan.article (nom_facture, nom_article, quantite, prix, facture_id, date_facture)
+            VALUES %s
+        """, articles, page_size=len(articles))
+
+def prepare_invoices_batch(invoices):
+    """
+    Valide un lot de factures avant écriture (commun à tous les stockages).
+
+    Returns:
+        (résultats initiaux dans l'ordre du lot, {numéro de facture: facture validée});
+        un second envoi de la même facture dans le lot remplace le premier
+    """
+    results = []
+    batch = {}
+
+    for invoice_data in invoices:
+        result = {
+            "invoice_number": (invoice_data.get('data') or {}).get('invoice_number') or invoice_data.get('filename'),
+            "filename": invoice_data.get('filename'),
+            "success": False,
+            "error": None
+        }
+        try:
+            prepared = _prepare_invoice(invoice_data)
+            batch[prepared["nom_facture"]] = prepared
+        except ValueError as e:
+            result["error"] = str(e)
+        results.append(result)
+
+    return results, batch
+
+def finish_batch_results(results, failures):
+    """Reporte les erreurs d'écriture ({numéro de facture: erreur}) dans les résultats du lot"""
+    for result in results:
+        if result["error"] is None:
+            result["error"] = failures.get(result["invoice_number"])
+            result["success"] = result["error"] is None
+
+    return results
+
+@PerformanceMonitor.trace("db.save_invoices_batch")
+def save_invoices_batch(invoices):
+    """
+    Enregistre un lot de factures en isolant chaque facture.
+
+    Le lot est d'abord écrit d'un bloc (une requête par table). Si la base
+    refuse ce bloc, chaque facture est rejouée dans son propre SAVEPOINT :
+    une facture en erreur n'annule plus les autres. L'écriture étant
+    idempotente par numéro de facture, le client peut renvoyer uniquement
+    les factures en échec.
+
+    Args:
+        invoices: Liste de {"filename": ..., "data": {...}} comme envoyée par le scanner
+
+    Returns:
+        Liste de résultats dans l'ordre du lot :
+        {"invoice_number", "filename", "success", "error"}
+    """
+    results, batch = prepare_invoices_batch(invoices)
+
+    failures = {}
+    if batch:
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        try:
+            ensure_year_partitions(
+                conn, [p["facture"][1].year for p in batch.values() if p["facture"][1]]
+            )
+
+            # Propriétaires actuels des factures du lot, pour invalider aussi leur cache
+            execute_prepared(
+                cur,
+                "SELECT nom_facture, email_personne, id FROM dylan.facture WHERE nom_facture = ANY(%s)",
+                (list(batch),)
+            )
+            existing = {nom: (email, facture_id) for nom, email, facture_id in cur.fetchall()}
+
+            try:
+                cur.execute("SAVEPOINT lot_factures")
+                _write_invoices(cur, list(batch.values()))
+                cur.execute("RELEASE SAVEPOINT lot_factures")
+            except psycopg2.Error as e:
+                print(f"⚠️ Échec de l'écriture groupée, reprise facture par facture: {e}")
+                cur.execute("ROLLBACK TO SAVEPOINT lot_factures")
+
+                for nom_facture, prepared in batch.items():
+                    cur.execute("SAVEPOINT facture")
+                    try:
+                        _write_invoices(cur, [prepared])
+                        cur.execute("RELEASE SAVEPOINT facture")
+                    except psycopg2.Error as invoice_error:
+                        cur.execute("ROLLBACK TO SAVEPOINT facture")
+                        failures[nom_facture] = str(invoice_error).strip()
+
+                # Journaliser les factures rejetées
+                for nom, error in failures.items():
+                    log_error('save_invoices_batch', f"Erreur facture {nom}: {error}")
+
+            # Valider les factures réussies
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+        saved = [nom for nom in batch if nom not in failures]
+        invalidate_customers(
+            [batch[nom]["facture"][3] for nom in saved]
+            + [existing[nom][0] for nom in saved if nom in existing]
+        )
+        invalidate_factures([existing[nom][1] for nom in saved if nom in existing])
+
+    return finish_batch_results(results, failures)
+
+@PerformanceMonitor.trace("db.register_user")
+def register_user_account(email, nom, prenom, date_naissance, password_hash, salt):
+    """
+    Crée un utilisateur et ses informations d'authentification.
+
+    Returns:
+        False si l'email est déjà utilisé, True si le compte a été créé
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        # Vérifier si l'email existe déjà
+        execute_prepared(
+            cur,
+            "SELECT email_personne FROM dylan.utilisateur WHERE email_personne = %s",
+            (email,)
+        )
+        if cur.fetchone():
+            return False
+
+        # Insérer l'utilisateur
+        cur.execute("""
+            INSERT INTO dylan.utilisateur
+            (email_personne, nom_personne, prenom_personne, date_anniversaire)
+            VALUES (%s, %s, %s, %s)
+        """, (email, nom, prenom, date_naissance))
+
+        # Insérer les informations d'authentification
+        cur.execute("""
+            INSERT INTO dylan.authentification
+            (email, mot_de_passe_hash, salt, date_creation)
+            VALUES (%s, %s, %s, %s)
+        """, (email, password_hash, salt, datetime.datetime.now()))
+
+        # Valider les changements
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+@PerformanceMonitor.trace("db.update_password_hash")
+def update_password_hash(email, password_hash, salt=""):
+    """Remplace le hash du mot de passe d'un utilisateur (coût bcrypt modifié, ancien hash SHA-256)."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute("""
+            UPDATE dylan.authentification
+            SET mot_de_passe_hash = %s, salt = %s
+            WHERE email = %s
+        """, (password_hash, salt, email))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+@PerformanceMonitor.trace("db.update_customer_from_qr")
 def update_customer_from_qr(qr_data):
     """Met à jour les informations client à partir des données du QR code."""
     # Connexion à la base de données
-    conn = psycopg2.connect(
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT")
-    )
+    conn = get_db_connection()
     cur = conn.cursor()
     
     try:
@@ -238,12 +534,92 @@ def update_customer_from_qr(qr_data):
     except Exception as e:
         conn.rollback()
         print(f"❌ Erreur lors de la mise à jour: {e}")
-        cur.execute("""
-            INSERT INTO dylan.log (time, fichier, erreur)
-            VALUES (NOW(), 'update_customer_from_qr', %s)
-        """, (str(e),))
-        conn.commit()
+        log_error('update_customer_from_qr', e)
     
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+@PerformanceMonitor.trace("db.update_customers_from_qr_batch")
+def update_customers_from_qr_batch(qr_items):
+    """
+    Met à jour en une requête les informations client lues dans plusieurs QR codes.
+
+    Si la requête groupée est refusée (date de naissance illisible par exemple),
+    chaque QR code est repris avec update_customer_from_qr.
+
+    Args:
+        qr_items: Liste de dictionnaires renvoyés par decode_qr_data
+    """
+    if not qr_items:
+        return
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        execute_values(cur, """
+            UPDATE dylan.utilisateur u
+            SET genre = v.genre, date_anniversaire = v.birthdate::date
+            FROM (VALUES %s) AS v(invoice_number, genre, birthdate)
+            JOIN dylan.facture f ON f.nom_facture = v.invoice_number
+            WHERE u.email_personne = f.email_personne
+        """, [(qr["invoice_number"], qr.get("genre"), qr.get("birthdate")) for qr in qr_items])
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"⚠️ Échec de la mise à jour groupée des QR codes, reprise un par un: {e}")
+        for qr_data in qr_items:
+            update_customer_from_qr(qr_data)
+    finally:
+        cur.close()
+        conn.close()
+
+def save_log_entries(entries, timeout=None):
+    """
+    Écrit des entrées de journal dans dylan.log en une requête.
+
+    Args:
+        entries: Liste de (date, fichier, erreur)
+        timeout: Attente maximale d'une connexion du pool, en secondes
+    """
+    if not entries:
+        return
+
+    conn = get_db_connection(timeout=timeout)
+    cur = conn.cursor()
+
+    try:
+        execute_values(cur, """
+            INSERT INTO dylan.log (time, fichier, erreur) VALUES %s
+        """, entries)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+@PerformanceMonitor.trace("db.save_invoice_rejects")
+def save_invoice_rejects(rows):
+    """
+    Range des factures rejetées dans dylan.facture_rejet.
+
+    Args:
+        rows: Liste de (nom_facture, données JSON, erreur, tentatives)
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        execute_values(cur, """
+            INSERT INTO dylan.facture_rejet (nom_facture, donnees, erreur, tentatives) VALUES %s
+        """, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
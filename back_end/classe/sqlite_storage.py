@@ -0,0 +1,557 @@
+"""
+Stockage SQLite embarqué, avec le même comportement que le stockage Postgres.
+
+Sert à lancer l'application sur un poste sans base distante
+(STORAGE_BACKEND=sqlite) et à mesurer le pipeline OCR + enregistrement sans
+réseau (SQLITE_PATH=:memory:). Les tables reprennent celles du schéma dylan ;
+les dates sont stockées au format ISO (AAAA-MM-JJ), ce qui garde leur ordre.
+"""
+import datetime
+import json
+import sqlite3
+import threading
+
+from back_end.classe.save_data_bdd import prepare_invoices_batch, finish_batch_results
+from back_end.classe.read_data_bdd import encode_cursor, decode_cursor, RECHERCHE_LONGUEUR_MIN, RECHERCHE_CANDIDATS
+from back_end.utils.storage import InvoiceStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS utilisateur (
+    email_personne TEXT PRIMARY KEY,
+    nom_personne TEXT,
+    prenom_personne TEXT,
+    genre TEXT,
+    adresse TEXT,
+    date_anniversaire TEXT
+);
+
+CREATE TABLE IF NOT EXISTS facture (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nom_facture TEXT NOT NULL UNIQUE,
+    date_facture TEXT,
+    total_facture REAL,
+    email_personne TEXT REFERENCES utilisateur(email_personne)
+);
+-- Historique d'un utilisateur, du plus récent au plus ancien (factures sans date en dernier)
+CREATE INDEX IF NOT EXISTS facture_email_date_id_idx
+    ON facture (email_personne, COALESCE(date_facture, ''), id);
+
+CREATE TABLE IF NOT EXISTS article (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nom_facture TEXT NOT NULL,
+    nom_article TEXT NOT NULL,
+    quantite REAL,
+    prix REAL,
+    facture_id INTEGER NOT NULL REFERENCES facture(id),
+    UNIQUE (nom_facture, nom_article)
+);
+CREATE INDEX IF NOT EXISTS article_facture_id_idx ON article (facture_id);
+
+CREATE TABLE IF NOT EXISTS log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time TEXT,
+    fichier TEXT,
+    erreur TEXT
+);
+
+CREATE TABLE IF NOT EXISTS authentification (
+    email TEXT PRIMARY KEY REFERENCES utilisateur(email_personne),
+    mot_de_passe_hash TEXT NOT NULL,
+    salt TEXT NOT NULL,
+    date_creation TEXT DEFAULT CURRENT_TIMESTAMP,
+    derniere_connexion TEXT,
+    est_actif INTEGER DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS facture_rejet (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date_rejet TEXT DEFAULT CURRENT_TIMESTAMP,
+    nom_facture TEXT,
+    donnees TEXT NOT NULL,
+    erreur TEXT,
+    tentatives INTEGER NOT NULL DEFAULT 1
+);
+"""
+
+# Index de recherche (équivalent local des index trigrammes de
+# structures/migrations/0007_recherche_factures.sql) : tables FTS5 avec le
+# tokenizer trigram, qui trouve toute sous-chaîne d'au moins 3 caractères.
+# Les triggers les tiennent à jour ; facture et article y sont repérés par
+# leur id, utilisateur par son email.
+SCHEMA_RECHERCHE = """
+CREATE VIRTUAL TABLE facture_fts USING fts5(nom_facture, content='facture', content_rowid='id', tokenize='trigram');
+CREATE VIRTUAL TABLE article_fts USING fts5(nom_article, content='article', content_rowid='id', tokenize='trigram');
+CREATE VIRTUAL TABLE utilisateur_fts USING fts5(email_personne UNINDEXED, nom_personne, tokenize='trigram');
+
+CREATE TRIGGER facture_fts_ai AFTER INSERT ON facture BEGIN
+    INSERT INTO facture_fts (rowid, nom_facture) VALUES (new.id, new.nom_facture);
+END;
+CREATE TRIGGER facture_fts_ad AFTER DELETE ON facture BEGIN
+    INSERT INTO facture_fts (facture_fts, rowid, nom_facture) VALUES ('delete', old.id, old.nom_facture);
+END;
+CREATE TRIGGER facture_fts_au AFTER UPDATE OF nom_facture ON facture BEGIN
+    INSERT INTO facture_fts (facture_fts, rowid, nom_facture) VALUES ('delete', old.id, old.nom_facture);
+    INSERT INTO facture_fts (rowid, nom_facture) VALUES (new.id, new.nom_facture);
+END;
+
+CREATE TRIGGER article_fts_ai AFTER INSERT ON article BEGIN
+    INSERT INTO article_fts (rowid, nom_article) VALUES (new.id, new.nom_article);
+END;
+CREATE TRIGGER article_fts_ad AFTER DELETE ON article BEGIN
+    INSERT INTO article_fts (article_fts, rowid, nom_article) VALUES ('delete', old.id, old.nom_article);
+END;
+CREATE TRIGGER article_fts_au AFTER UPDATE OF nom_article ON article BEGIN
+    INSERT INTO article_fts (article_fts, rowid, nom_article) VALUES ('delete', old.id, old.nom_article);
+    INSERT INTO article_fts (rowid, nom_article) VALUES (new.id, new.nom_article);
+END;
+
+CREATE TRIGGER utilisateur_fts_ai AFTER INSERT ON utilisateur BEGIN
+    INSERT INTO utilisateur_fts (email_personne, nom_personne) VALUES (new.email_personne, new.nom_personne);
+END;
+CREATE TRIGGER utilisateur_fts_ad AFTER DELETE ON utilisateur BEGIN
+    DELETE FROM utilisateur_fts WHERE email_personne = old.email_personne;
+END;
+CREATE TRIGGER utilisateur_fts_au AFTER UPDATE OF email_personne, nom_personne ON utilisateur BEGIN
+    DELETE FROM utilisateur_fts WHERE email_personne = old.email_personne;
+    INSERT INTO utilisateur_fts (email_personne, nom_personne) VALUES (new.email_personne, new.nom_personne);
+END;
+
+-- Base créée avant la recherche : indexer les lignes existantes
+INSERT INTO facture_fts (facture_fts) VALUES ('rebuild');
+INSERT INTO article_fts (article_fts) VALUES ('rebuild');
+INSERT INTO utilisateur_fts (email_personne, nom_personne) SELECT email_personne, nom_personne FROM utilisateur;
+"""
+
+# Recherche : une branche par champ, chacune limitée aux :candidats
+# correspondances les plus récentes, comme côté Postgres. Le score est la part
+# du champ couverte par les mots recherchés (entre 0 et 1, à la manière de la
+# ressemblance pg_trgm), plus 1 pour le numéro de facture complet.
+# Sans email, les correspondances viennent des tables FTS5 (les mots de moins
+# de 3 caractères, que le tokenizer trigram ignore, filtrent ensuite les
+# candidats) ; pour un seul utilisateur, ses factures sont lues directement
+# (index par email), ce qui évite de parcourir les correspondances de tous
+# les clients.
+RECHERCHE_BRANCHES_FTS = {
+    "nom_facture": """
+        FROM (
+            SELECT rowid FROM facture_fts WHERE facture_fts MATCH :requete AND {mots}
+            ORDER BY rowid DESC LIMIT :candidats
+        ) r
+        JOIN facture f ON f.id = r.rowid
+    """,
+    "nom_article": """
+        FROM (
+            SELECT rowid FROM article_fts WHERE article_fts MATCH :requete AND {mots}
+            ORDER BY rowid DESC LIMIT :candidats
+        ) r
+        JOIN article a ON a.id = r.rowid
+        JOIN facture f ON f.id = a.facture_id
+    """,
+    "nom_personne": """
+        FROM utilisateur_fts u
+        JOIN facture f ON f.email_personne = u.email_personne
+        WHERE utilisateur_fts MATCH :requete AND {mots}
+        ORDER BY f.id DESC LIMIT :candidats
+    """,
+}
+
+RECHERCHE_BRANCHES_EMAIL = {
+    "nom_facture": """
+        FROM facture f
+        WHERE f.email_personne = :email AND {mots}
+        ORDER BY f.id DESC LIMIT :candidats
+    """,
+    "nom_article": """
+        FROM facture f
+        JOIN article a ON a.facture_id = f.id
+        WHERE f.email_personne = :email AND {mots}
+        ORDER BY f.id DESC LIMIT :candidats
+    """,
+    "nom_personne": """
+        FROM utilisateur u
+        JOIN facture f ON f.email_personne = u.email_personne
+        WHERE u.email_personne = :email AND {mots}
+        ORDER BY f.id DESC LIMIT :candidats
+    """,
+}
+
+# Colonne de chaque champ, dans les branches par email puis dans les branches FTS5
+RECHERCHE_COLONNES = {
+    "nom_facture": ("f.nom_facture", "nom_facture"),
+    "nom_article": ("a.nom_article", "nom_article"),
+    "nom_personne": ("u.nom_personne", "u.nom_personne"),
+}
+
+RECHERCHE_FACTURES_QUERY = """
+    WITH correspondances AS (
+        {branches}
+    )
+    SELECT f.id, f.nom_facture, f.date_facture, f.total_facture, u.nom_personne, m.score, m.champs
+    FROM (
+        SELECT facture_id, MAX(score) AS score, group_concat(DISTINCT champ) AS champs
+        FROM correspondances
+        GROUP BY facture_id
+    ) m
+    JOIN facture f ON f.id = m.facture_id
+    JOIN utilisateur u ON u.email_personne = f.email_personne
+    ORDER BY m.score DESC, f.id DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def _recherche_query(mots, email):
+    branches = []
+    for champ, (colonne, colonne_fts) in RECHERCHE_COLONNES.items():
+        score = f"MIN(1.0, :longueur * 1.0 / MAX(length({colonne}), 1))"
+        if champ == "nom_facture":
+            score += f" + CASE WHEN lower({colonne}) = lower(:terme) THEN 1 ELSE 0 END"
+        if email:
+            conditions = [f"instr(lower({colonne}), :mot{i}) > 0" for i in range(len(mots))]
+            source = RECHERCHE_BRANCHES_EMAIL[champ]
+        else:
+            conditions = [
+                f"instr(lower({colonne_fts}), :mot{i}) > 0"
+                for i, mot in enumerate(mots) if len(mot) < RECHERCHE_LONGUEUR_MIN
+            ]
+            source = RECHERCHE_BRANCHES_FTS[champ]
+        source = source.format(mots=" AND ".join(conditions) or "1")
+        branches.append(f"SELECT * FROM (SELECT f.id AS facture_id, '{champ}' AS champ, {score} AS score {source})")
+    return RECHERCHE_FACTURES_QUERY.format(branches="\n        UNION ALL\n        ".join(branches))
+
+
+# Clé de tri des factures sans date : avant toute date ISO, comme '-infinity' côté Postgres
+CLE_SANS_DATE = ""
+
+# Période facultative (bornes incluses) des caractéristiques du clustering
+PERIODE = (
+    "(:date_from IS NULL OR {alias}.date_facture >= :date_from)"
+    " AND (:date_to IS NULL OR {alias}.date_facture <= :date_to)"
+)
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+
+
+class SQLiteStorage(InvoiceStorage):
+    """
+    Stockage dans une base SQLite (fichier ou ":memory:").
+
+    Une seule connexion, partagée entre les threads et protégée par un verrou :
+    SQLite n'accepte qu'un écrivain à la fois, et une base en mémoire n'existe
+    que pour la connexion qui l'a créée.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.RLock()
+        # isolation_level=None : les transactions sont ouvertes explicitement (BEGIN)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(SCHEMA)
+        if not self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'facture_fts'").fetchone():
+            self._conn.executescript("BEGIN;" + SCHEMA_RECHERCHE + "COMMIT;")
+
+    def _transaction(self, work, timeout=None):
+        """Exécuter work(cursor) dans une transaction, sous le verrou de la connexion"""
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise sqlite3.OperationalError("Base SQLite occupée")
+        try:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                result = work(cur)
+                cur.execute("COMMIT")
+                return result
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            finally:
+                cur.close()
+        finally:
+            self._lock.release()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    # Factures
+
+    def _write_invoice(self, cur, prepared):
+        if prepared["user"]:
+            cur.execute("""
+                INSERT INTO utilisateur (email_personne, nom_personne, adresse)
+                VALUES (?, ?, ?)
+                ON CONFLICT (email_personne) DO UPDATE
+                SET nom_personne = excluded.nom_personne, adresse = excluded.adresse
+            """, prepared["user"])
+
+        nom_facture, date_facture, total, email = prepared["facture"]
+        cur.execute("""
+            INSERT INTO facture (nom_facture, date_facture, total_facture, email_personne)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (nom_facture) DO UPDATE
+            SET date_facture = excluded.date_facture,
+                total_facture = excluded.total_facture,
+                email_personne = excluded.email_personne
+        """, (nom_facture, _iso(date_facture), total, email))
+        facture_id = cur.execute("SELECT id FROM facture WHERE nom_facture = ?", (nom_facture,)).fetchone()[0]
+
+        # Les articles de la facture sont remplacés, comme côté Postgres
+        cur.execute("DELETE FROM article WHERE facture_id = ?", (facture_id,))
+        cur.executemany("""
+            INSERT INTO article (nom_facture, nom_article, quantite, prix, facture_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, [article + (facture_id,) for article in prepared["articles"]])
+
+    def save_invoices_batch(self, invoices):
+        results, batch = prepare_invoices_batch(invoices)
+
+        def work(cur):
+            failures = {}
+            for nom_facture, prepared in batch.items():
+                cur.execute("SAVEPOINT facture")
+                try:
+                    self._write_invoice(cur, prepared)
+                    cur.execute("RELEASE SAVEPOINT facture")
+                except sqlite3.Error as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT facture")
+                    cur.execute("RELEASE SAVEPOINT facture")
+                    failures[nom_facture] = str(e)
+
+            if failures:
+                now = datetime.datetime.now().isoformat()
+                cur.executemany("INSERT INTO log (time, fichier, erreur) VALUES (?, ?, ?)", [
+                    (now, 'save_invoices_batch', f"Erreur facture {nom}: {error}")
+                    for nom, error in failures.items()
+                ])
+            return failures
+
+        failures = self._transaction(work) if batch else {}
+        return finish_batch_results(results, failures)
+
+    def get_existing_invoice_numbers(self, numbers):
+        numbers = list(numbers)
+        existing = set()
+        # Rester sous la limite de paramètres de SQLite
+        for start in range(0, len(numbers), 500):
+            chunk = numbers[start:start + 500]
+            rows = self._query(
+                f"SELECT nom_facture FROM facture WHERE nom_facture IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            existing.update(row["nom_facture"] for row in rows)
+        return existing
+
+    def get_factures_page(self, email, limit=50, cursor=None, include_total=False,
+                          date_from=None, date_to=None, min_total=None, max_total=None):
+        conditions = ["f.email_personne = ?"]
+        params = [email]
+        for condition, value in (
+            ("f.date_facture >= ?", _iso(date_from)),
+            ("f.date_facture <= ?", _iso(date_to)),
+            ("f.total_facture >= ?", min_total),
+            ("f.total_facture <= ?", max_total),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        filter_conditions, filter_params = list(conditions), list(params)
+
+        if cursor:
+            cle_date, facture_id = decode_cursor(cursor)
+            conditions.append("(COALESCE(f.date_facture, ''), f.id) < (?, ?)")
+            params.extend([CLE_SANS_DATE if cle_date == "-infinity" else cle_date, facture_id])
+
+        factures = self._query(f"""
+            SELECT f.id, f.nom_facture, f.date_facture, f.total_facture, u.nom_personne,
+                   COALESCE(f.date_facture, '') AS cle_date
+            FROM facture f
+            JOIN utilisateur u ON f.email_personne = u.email_personne
+            WHERE {" AND ".join(conditions)}
+            ORDER BY COALESCE(f.date_facture, '') DESC, f.id DESC
+            LIMIT ?
+        """, params + [limit + 1])
+
+        next_cursor = None
+        if len(factures) > limit:
+            factures = factures[:limit]
+            last = factures[-1]
+            next_cursor = encode_cursor(last["cle_date"] or "-infinity", last["id"])
+        for facture in factures:
+            del facture["cle_date"]
+
+        page = {"factures": factures, "next_cursor": next_cursor}
+        if include_total:
+            page["total"] = self._query(
+                f"SELECT COUNT(*) AS total FROM facture f WHERE {' AND '.join(filter_conditions)}",
+                filter_params
+            )[0]["total"]
+        return page
+
+    def get_facture_details(self, facture_id):
+        rows = self._query("""
+            SELECT f.nom_facture, f.date_facture, f.total_facture, u.nom_personne,
+                   a.nom_article, a.quantite, a.prix
+            FROM facture f
+            JOIN utilisateur u ON f.email_personne = u.email_personne
+            LEFT JOIN article a ON f.id = a.facture_id
+            WHERE f.id = ?
+        """, (facture_id,))
+        if not rows:
+            return None
+
+        return {
+            "nom_facture": rows[0]["nom_facture"],
+            "date_facture": rows[0]["date_facture"],
+            "total_facture": rows[0]["total_facture"],
+            "nom_personne": rows[0]["nom_personne"],
+            "articles": [
+                {"nom_article": row["nom_article"], "quantite": row["quantite"], "prix": row["prix"]}
+                for row in rows if row["nom_article"] is not None
+            ]
+        }
+
+    def search_factures(self, terme, email=None, limit=20, offset=0):
+        terme = (terme or "").strip()
+        # Chaque mot est cherché comme sous-chaîne, dans n'importe quel ordre ; il
+        # faut au moins un mot de 3 caractères pour interroger l'index trigram
+        mots = [mot.lower() for mot in terme.split()]
+        mots_fts = [mot for mot in mots if len(mot) >= RECHERCHE_LONGUEUR_MIN]
+        if len(terme) < RECHERCHE_LONGUEUR_MIN or not mots_fts:
+            raise ValueError(f"La recherche doit contenir au moins {RECHERCHE_LONGUEUR_MIN} caractères")
+
+        params = {
+            "terme": terme,
+            "requete": " ".join('"' + mot.replace('"', '""') + '"' for mot in mots_fts),
+            "longueur": sum(len(mot) for mot in mots),
+            "email": email,
+            "candidats": RECHERCHE_CANDIDATS,
+            # Une ligne de plus pour savoir s'il existe une page suivante
+            "limit": limit + 1,
+            "offset": offset,
+            **{f"mot{i}": mot for i, mot in enumerate(mots)},
+        }
+        factures = self._query(_recherche_query(mots, email), params)
+
+        next_offset = None
+        if len(factures) > limit:
+            factures = factures[:limit]
+            next_offset = offset + limit
+        for facture in factures:
+            facture["score"] = round(facture["score"], 4)
+            facture["champs"] = facture["champs"].split(",")
+        return {"factures": factures, "next_offset": next_offset}
+
+    def save_invoice_rejects(self, rows):
+        def work(cur):
+            cur.executemany("""
+                INSERT INTO facture_rejet (nom_facture, donnees, erreur, tentatives) VALUES (?, ?, ?, ?)
+            """, [
+                (nom, donnees if isinstance(donnees, str) else json.dumps(donnees), erreur, tentatives)
+                for nom, donnees, erreur, tentatives in rows
+            ])
+        self._transaction(work)
+
+    # Utilisateurs
+
+    def register_user_account(self, email, nom, prenom, date_naissance, password_hash, salt):
+        def work(cur):
+            if cur.execute("SELECT 1 FROM utilisateur WHERE email_personne = ?", (email,)).fetchone():
+                return False
+            cur.execute("""
+                INSERT INTO utilisateur (email_personne, nom_personne, prenom_personne, date_anniversaire)
+                VALUES (?, ?, ?, ?)
+            """, (email, nom, prenom, _iso(date_naissance)))
+            cur.execute("""
+                INSERT INTO authentification (email, mot_de_passe_hash, salt, date_creation)
+                VALUES (?, ?, ?, ?)
+            """, (email, password_hash, salt, datetime.datetime.now().isoformat()))
+            return True
+        return self._transaction(work)
+
+    def get_login_user(self, email):
+        rows = self._query("""
+            SELECT a.email, a.mot_de_passe_hash, a.salt, a.est_actif,
+                   u.nom_personne, u.genre, u.adresse, u.date_anniversaire
+            FROM authentification a
+            JOIN utilisateur u ON a.email = u.email_personne
+            WHERE a.email = ?
+        """, (email,))
+        return rows[0] if rows else None
+
+    def update_password_hash(self, email, password_hash, salt=""):
+        def work(cur):
+            cur.execute(
+                "UPDATE authentification SET mot_de_passe_hash = ?, salt = ? WHERE email = ?",
+                (password_hash, salt, email)
+            )
+        self._transaction(work)
+
+    def update_customers_from_qr(self, qr_items):
+        if not qr_items:
+            return
+
+        def work(cur):
+            cur.executemany("""
+                UPDATE utilisateur
+                SET genre = ?, date_anniversaire = ?
+                WHERE email_personne = (SELECT email_personne FROM facture WHERE nom_facture = ?)
+            """, [(qr.get("genre"), qr.get("birthdate"), qr["invoice_number"]) for qr in qr_items])
+        self._transaction(work)
+
+    # Clustering : calculés à la volée, les volumes d'une base locale restent faibles
+
+    def get_customer_features(self, date_from=None, date_to=None):
+        return self._query(f"""
+            SELECT
+                u.email_personne AS customer_id,
+                u.nom_personne AS customer_name,
+                u.email_personne AS email,
+                COUNT(f.id) AS total_invoices,
+                SUM(f.total_facture) AS total_spent,
+                AVG(f.total_facture) AS average_invoice_amount,
+                MAX(f.date_facture) AS last_purchase_date,
+                (
+                    SELECT COUNT(DISTINCT a.nom_article)
+                    FROM article a
+                    JOIN facture fa ON fa.id = a.facture_id
+                    WHERE fa.email_personne = u.email_personne AND {PERIODE.format(alias="fa")}
+                ) AS unique_products_bought
+            FROM utilisateur u
+            LEFT JOIN facture f ON f.email_personne = u.email_personne AND {PERIODE.format(alias="f")}
+            GROUP BY u.email_personne, u.nom_personne
+        """, {"date_from": _iso(date_from), "date_to": _iso(date_to)})
+
+    def get_product_features(self, date_from=None, date_to=None):
+        return self._query(f"""
+            SELECT
+                a.nom_article AS product_name,
+                COUNT(*) AS times_purchased,
+                AVG(a.prix) AS average_price,
+                SUM(a.quantite) AS total_quantity_sold,
+                COUNT(DISTINCT f.email_personne) AS unique_customers
+            FROM article a
+            JOIN facture f ON f.id = a.facture_id
+            WHERE {PERIODE.format(alias="f")}
+            GROUP BY a.nom_article
+        """, {"date_from": _iso(date_from), "date_to": _iso(date_to)})
+
+    # Journal
+
+    def write_logs(self, entries, timeout=None):
+        if not entries:
+            return
+
+        def work(cur):
+            cur.executemany("INSERT INTO log (time, fichier, erreur) VALUES (?, ?, ?)", [
+                (_iso(time_), fichier, erreur) for time_, fichier, erreur in entries
+            ])
+        self._transaction(work, timeout=timeout)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,234 @@
+"""
+File d'écriture différée des factures extraites par l'OCR.
+
+Les workers OCR déposent leurs factures dans une file bornée au lieu de les
+enregistrer eux-mêmes ; un thread d'écriture les regroupe en lots et les
+enregistre avec save_invoices_batch (une transaction par lot).
+
+- File pleine : submit() bloque l'appelant (contre-pression) jusqu'à ce que
+  l'écrivain ait rattrapé son retard, ou lève queue.Full après le délai donné.
+- Erreur transitoire (connexion perdue, pool saturé) : le lot est rejoué avec
+  un délai croissant, jusqu'à WRITE_QUEUE_MAX_RETRIES tentatives.
+- Erreur définitive (facture invalide ou refusée par la base, ou tentatives
+  épuisées) : la facture est rangée dans dylan.facture_rejet, ou dans un
+  fichier local si la base elle-même est injoignable.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import datetime
+import threading
+import sqlite3
+
+import psycopg2
+from dotenv import load_dotenv
+
+from back_end.classe.validate_date import validate_date
+from back_end.utils.storage import get_storage
+from back_end.utils.monitoring import PerformanceMonitor
+
+load_dotenv()
+
+logger = logging.getLogger("write_queue")
+
+WRITE_QUEUE_CONFIG = {
+    # Nombre maximal de factures en attente avant de bloquer les workers OCR
+    "max_size": int(os.getenv("WRITE_QUEUE_MAX_SIZE", "500")),
+    # Nombre maximal de factures par transaction
+    "batch_size": int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "50")),
+    # Délai maximal d'attente pour compléter un lot, en secondes
+    "flush_interval": float(os.getenv("WRITE_QUEUE_FLUSH_INTERVAL", "1.0")),
+    "max_retries": int(os.getenv("WRITE_QUEUE_MAX_RETRIES", "5")),
+    # Délai avant la première nouvelle tentative, doublé à chaque échec
+    "retry_delay": float(os.getenv("WRITE_QUEUE_RETRY_DELAY", "0.5")),
+    # Rejets qui n'ont pas pu être écrits en base
+    "dead_letter_file": os.getenv("WRITE_QUEUE_DEAD_LETTER_FILE", "factures_rejetees.jsonl"),
+}
+
+# Erreurs pour lesquelles un nouvel essai a une chance de réussir
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, sqlite3.OperationalError)
+
+_STOP = object()
+
+
+class InvoiceWriteQueue:
+    """File bornée de factures enregistrées par lots sur un thread dédié"""
+
+    def __init__(self, max_size=None, batch_size=None, flush_interval=None,
+                 max_retries=None, retry_delay=None, writer=None):
+        self.batch_size = batch_size or WRITE_QUEUE_CONFIG["batch_size"]
+        self.flush_interval = flush_interval if flush_interval is not None else WRITE_QUEUE_CONFIG["flush_interval"]
+        self.max_retries = max_retries if max_retries is not None else WRITE_QUEUE_CONFIG["max_retries"]
+        self.retry_delay = retry_delay if retry_delay is not None else WRITE_QUEUE_CONFIG["retry_delay"]
+        # Par défaut, le stockage de l'application (STORAGE_BACKEND)
+        self._writer = writer or (lambda batch: get_storage().save_invoices_batch(batch))
+        self._queue = queue.Queue(maxsize=max_size or WRITE_QUEUE_CONFIG["max_size"])
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "saved": 0, "rejected": 0, "retries": 0, "batches": 0}
+        self._thread = threading.Thread(target=self._run, name="invoice-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, invoice_data, filename=None, timeout=None):
+        """
+        Ajouter une facture extraite à la file.
+
+        Args:
+            invoice_data: Dictionnaire produit par extract_invoice_data_improved
+            filename: Fichier source (utilisé si le numéro de facture est absent)
+            timeout: Attente maximale si la file est pleine (None : attendre indéfiniment)
+
+        Raises:
+            queue.Full: si la file est toujours pleine après timeout secondes
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("La file d'écriture des factures est arrêtée")
+        # Date absente ou illisible : date du jour, comme save_invoice_data_to_db_improved
+        if not validate_date(invoice_data.get("issue_date")):
+            invoice_data = {**invoice_data, "issue_date": time.strftime("%Y-%m-%d")}
+        self._queue.put({"filename": filename, "data": invoice_data}, timeout=timeout)
+        self._count("submitted")
+
+    def flush(self):
+        """Attendre que toutes les factures déposées soient enregistrées ou rejetées"""
+        self._queue.join()
+
+    def close(self, timeout=None):
+        """Enregistrer les factures restantes puis arrêter le thread d'écriture"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {**self._stats, "pending": self._queue.qsize()}
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _next_batch(self):
+        """Attendre une facture, puis compléter le lot jusqu'à batch_size ou flush_interval"""
+        first = self._queue.get()
+        if first is _STOP:
+            return None, True
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # Le thread d'écriture ne doit jamais s'arrêter sur une erreur imprévue
+                    logger.exception(f"Erreur inattendue de la file d'écriture: {e}")
+                    self._dead_letter([(item, str(e), 1) for item in batch])
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+            if stop:
+                # Le marqueur d'arrêt compte aussi comme une tâche de la file
+                self._queue.task_done()
+
+    def _write(self, batch):
+        start_time = time.time()
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                results = self._writer(batch)
+                break
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Lot de {len(batch)} facture(s) abandonné après {attempt} tentatives: {e}")
+                    self._dead_letter([(item, str(e).strip(), attempt) for item in batch])
+                    return
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                logger.warning(f"Erreur transitoire ({e}), nouvelle tentative dans {delay:.1f}s")
+                self._count("retries")
+                time.sleep(delay)
+
+        self._count("batches")
+        PerformanceMonitor.record_metric("write_queue.batch", time.time() - start_time)
+
+        failed = [(item, result["error"], attempt) for item, result in zip(batch, results) if not result["success"]]
+        self._count("saved", len(batch) - len(failed))
+        if failed:
+            self._dead_letter(failed)
+
+    def _dead_letter(self, rejects):
+        """Ranger des factures rejetées : (facture, erreur, tentatives)"""
+        self._count("rejected", len(rejects))
+        rows = [
+            (
+                (item["data"] or {}).get("invoice_number") or item["filename"],
+                json.dumps(item["data"], default=str),
+                error,
+                attempts
+            )
+            for item, error, attempts in rejects
+        ]
+
+        try:
+            get_storage().save_invoice_rejects(rows)
+            for nom_facture, _, error, _ in rows:
+                print(f"❌ Facture {nom_facture} rejetée: {error}")
+        except Exception as e:
+            # Base injoignable : ne pas perdre la facture
+            logger.error(f"Impossible d'écrire dans dylan.facture_rejet ({e}), rejets conservés dans "
+                         f"{WRITE_QUEUE_CONFIG['dead_letter_file']}")
+            with open(WRITE_QUEUE_CONFIG["dead_letter_file"], "a", encoding="utf-8") as f:
+                for nom_facture, donnees, error, attempts in rows:
+                    f.write(json.dumps({
+                        "date_rejet": datetime.datetime.now().isoformat(),
+                        "nom_facture": nom_facture,
+                        "donnees": json.loads(donnees),
+                        "erreur": error,
+                        "tentatives": attempts
+                    }, ensure_ascii=False) + "\n")
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue():
+    """Retourne la file d'écriture du processus, créée au premier appel"""
+    global _write_queue
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                _write_queue = InvoiceWriteQueue()
+                # Les scripts batch n'ont rien à faire : les factures en attente sont écrites à la sortie
+                atexit.register(close_write_queue)
+    return _write_queue
+
+def submit_invoice(invoice_data, filename=None, timeout=None):
+    """Déposer une facture extraite dans la file d'écriture du processus"""
+    get_write_queue().submit(invoice_data, filename=filename, timeout=timeout)
+
+def close_write_queue():
+    """Vider la file d'écriture et arrêter son thread"""
+    global _write_queue
+    with _write_queue_lock:
+        write_queue, _write_queue = _write_queue, None
+    if write_queue is not None:
+        write_queue.close()
+        stats = write_queue.stats()
+        print(f"File d'écriture fermée: {stats['saved']} facture(s) enregistrée(s), "
+              f"{stats['rejected']} rejetée(s), {stats['retries']} nouvelle(s) tentative(s)")
@@ -0,0 +1,211 @@
+"""
+Contrôle d'admission des requêtes HTTP par classe de route.
+
+Chaque classe (OCR, lectures/écritures base, authentification, fichiers
+statiques) a une limite de requêtes traitées en même temps et une file
+d'attente bornée. Une requête qui trouve la file pleine, ou qui attend plus
+de max_wait secondes, reçoit aussitôt un 503 avec Retry-After : un pic de
+scans ne peut plus garder en mémoire des dizaines d'images agrandies.
+
+Le middleware est un middleware ASGI pur placé en tête de la pile : une
+requête refusée n'est ni lue ni journalisée, son corps (l'image envoyée)
+n'est jamais chargé.
+
+Configuration par classe (variables d'environnement, <CLASSE> = OCR, DB,
+AUTH ou STATIC) :
+    ADMISSION_<CLASSE>_CONCURRENCY   requêtes traitées en même temps (0 : sans limite)
+    ADMISSION_<CLASSE>_QUEUE         requêtes en attente au-delà desquelles on refuse
+    ADMISSION_<CLASSE>_MAX_WAIT      attente maximale dans la file, en secondes
+    ADMISSION_<CLASSE>_RETRY_AFTER   valeur de l'en-tête Retry-After, en secondes
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+from dotenv import load_dotenv
+from starlette.responses import JSONResponse
+
+from back_end.utils.monitoring import PerformanceMonitor
+
+load_dotenv()
+
+logger = logging.getLogger("admission")
+
+
+def _class_config(name, concurrency, queue, max_wait, retry_after):
+    prefix = f"ADMISSION_{name.upper()}_"
+    return {
+        "concurrency": int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+        "queue": int(os.getenv(prefix + "QUEUE", str(queue))),
+        "max_wait": float(os.getenv(prefix + "MAX_WAIT", str(max_wait))),
+        "retry_after": int(os.getenv(prefix + "RETRY_AFTER", str(retry_after))),
+    }
+
+ADMISSION_CONFIG = {
+    "enabled": os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes"),
+    "classes": {
+        # Chaque scan garde l'image et ses copies agrandies en mémoire, et occupe un cœur
+        "ocr": _class_config("ocr", 2, 8, 30, 5),
+        "db": _class_config("db", 20, 200, 5, 1),
+        "auth": _class_config("auth", 16, 64, 5, 1),
+        "static": _class_config("static", 64, 256, 2, 1),
+    },
+}
+
+# Préfixes de chemin -> classe, le premier qui correspond l'emporte.
+# Les pages HTML et le monitoring ne sont pas limités.
+ROUTE_CLASSES = [
+    ("/api/scan-invoice", "ocr"),
+    ("/auth/", "auth"),
+    ("/api/register", "auth"),
+    ("/api/", "db"),
+    ("/front_end/static/", "static"),
+]
+
+
+class AdmissionRejected(Exception):
+    """La requête est refusée : file pleine ou attente trop longue"""
+
+    def __init__(self, route_class, reason, retry_after):
+        super().__init__(f"Serveur saturé ({route_class}: {reason}), réessayez dans {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Limite de concurrence avec file d'attente FIFO bornée, pour une boucle d'événements.
+
+    Une place libérée est donnée directement à la plus ancienne requête en
+    attente : une requête arrivée plus tard ne peut pas la doubler.
+    """
+
+    def __init__(self, name, concurrency, queue, max_wait, retry_after):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._active = 0
+        self._waiters = deque()
+        self._stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    async def acquire(self):
+        """Attendre une place ; renvoie le temps passé dans la file, lève AdmissionRejected sinon"""
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+            self._stats["admitted"] += 1
+            return 0.0
+
+        if len(self._waiters) >= self.queue:
+            self._stats["rejected_queue_full"] += 1
+            raise AdmissionRejected(self.name, "file d'attente pleine", self.retry_after)
+
+        self._stats["queued"] += 1
+        start_time = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            # La place a pu être donnée dans la même itération que le délai : la rendre
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._remove(waiter)
+            self._stats["rejected_timeout"] += 1
+            raise AdmissionRejected(self.name, "attente trop longue", self.retry_after)
+        except asyncio.CancelledError:
+            # Client parti pendant l'attente : rendre la place si elle venait d'être donnée
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+
+        self._stats["admitted"] += 1
+        return time.monotonic() - start_time
+
+    def release(self):
+        """Libérer une place, donnée à la première requête encore en attente"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def _remove(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def stats(self):
+        return {
+            **self._stats,
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "concurrency": self.concurrency,
+            "queue": self.queue,
+            "max_wait": self.max_wait,
+        }
+
+
+_limiters = {
+    name: AdmissionLimiter(name, **config)
+    for name, config in ADMISSION_CONFIG["classes"].items()
+    if config["concurrency"] > 0
+}
+
+
+def route_class(path):
+    """Classe d'admission d'un chemin, ou None s'il n'est pas limité"""
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return None
+
+
+class AdmissionControlMiddleware:
+    """Middleware ASGI : applique la limite de la classe de route avant tout autre traitement"""
+
+    def __init__(self, app, limiters=None):
+        self.app = app
+        self.limiters = _limiters if limiters is None else limiters
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope["type"] == "http" and ADMISSION_CONFIG["enabled"]:
+            limiter = self.limiters.get(route_class(scope["path"]))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            wait_time = await limiter.acquire()
+        except AdmissionRejected as e:
+            # Compté dans les statistiques ; pas d'avertissement par requête pendant un pic
+            logger.debug(f"{scope['method']} {scope['path']} refusée: {e}")
+            response = JSONResponse(
+                content={"success": False, "error": str(e)},
+                status_code=503,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        PerformanceMonitor.record_metric(f"admission.{limiter.name}.queue_wait", wait_time)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+def get_admission_stats():
+    """État de chaque classe d'admission pour le monitoring"""
+    return {
+        "enabled": ADMISSION_CONFIG["enabled"],
+        "classes": {name: limiter.stats() for name, limiter in _limiters.items()},
+    }
@@ -1,10 +1,17 @@
 import jwt
+import hmac
+import time
+import uuid
+import asyncio
+import hashlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from passlib.context import CryptContext
-import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
 from dotenv import load_dotenv
@@ -17,19 +24,66 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "super_secret_key_change_in_production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Résolution de l'utilisateur d'un token (surchargeable par variables d'environnement)
+PRINCIPAL_CONFIG = {
+    # Durée de vie d'un profil utilisateur en cache, en secondes
+    "cache_ttl": float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "60")),
+    "cache_size": int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "10000")),
+    # Taille maximale de la liste de révocation (tokens et utilisateurs)
+    "max_revoked": int(os.getenv("AUTH_MAX_REVOKED", "10000")),
+}
+
+# Comptes autorisés sur les endpoints d'administration (profilage), séparés par des virgules
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+# Champs du profil gardés en cache (jamais le hash du mot de passe)
+PRINCIPAL_FIELDS = ("email", "nom_personne", "genre", "adresse", "date_anniversaire", "est_actif")
+
+# Hachage des mots de passe (surchargeable par variables d'environnement)
+HASH_CONFIG = {
+    # Coût bcrypt (2^rounds itérations) ; les hash d'un autre coût sont refaits à la connexion
+    "bcrypt_rounds": int(os.getenv("AUTH_BCRYPT_ROUNDS", "12")),
+    # Threads dédiés au hachage : une rafale de connexions n'occupe pas plus de cœurs
+    "workers": int(os.getenv("AUTH_HASH_WORKERS", "2")),
+    # Hachages en cours ou en attente au-delà desquels une demande est refusée
+    "max_pending": int(os.getenv("AUTH_HASH_MAX_PENDING", "64")),
+}
+
 # Sécurité pour le hash des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-
-# Fonction pour obtenir une connexion à la base de données
-def get_db_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD")
-    )
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=HASH_CONFIG["bcrypt_rounds"],
+    # Un hash d'un coût différent (plus faible ou plus élevé) doit être refait
+    bcrypt__min_rounds=HASH_CONFIG["bcrypt_rounds"],
+    bcrypt__max_rounds=HASH_CONFIG["bcrypt_rounds"],
+)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/jwt/login")
+
+# Les connexions à la base de données sont empruntées au pool partagé
+from back_end.utils.database import get_db_connection
+from back_end.utils.monitoring import PerformanceMonitor
+from back_end.utils.database import run_db
+from back_end.utils.cache import MemoryCache
+from back_end.utils.storage import get_storage
+
+
+class HashQueueFullError(RuntimeError):
+    """Trop de hachages en attente : la demande est refusée au lieu d'allonger la file"""
+
+
+_hash_executor = None
+_hash_executor_pid = None
+_hash_lock = threading.Lock()
+_hash_pending = 0
+
+# Profils utilisateur par email (sub du token), propres au processus
+_principals = MemoryCache(PRINCIPAL_CONFIG["cache_size"], PRINCIPAL_CONFIG["cache_ttl"])
+_principal_stats = {"hits": 0, "misses": 0, "rejected": 0}
+
+# Liste de révocation en mémoire : jti -> expiration du token
+_revoked_tokens = {}
+_revocation_lock = threading.Lock()
 
 # Vérification du mot de passe
 def verify_password(plain_password, hashed_password):
@@ -38,6 +92,94 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def verify_and_update_password(plain_password, hashed_password, salt=None):
+    """
+    Vérifie un mot de passe et indique s'il faut remplacer son hash.
+
+    Les comptes créés avant bcrypt ont un hash SHA-256 de (mot de passe + salt) :
+    il est vérifié tel quel, puis remplacé par un hash bcrypt.
+
+    Returns:
+        (mot de passe valide, nouveau hash à enregistrer ou None)
+    """
+    if pwd_context.identify(hashed_password) is None:
+        legacy_hash = hashlib.sha256((plain_password + (salt or "")).encode()).hexdigest()
+        if not hmac.compare_digest(legacy_hash, hashed_password or ""):
+            return False, None
+        return True, get_password_hash(plain_password)
+
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def get_hash_executor():
+    """Récupérer l'exécuteur borné dédié au hachage des mots de passe"""
+    global _hash_executor, _hash_executor_pid
+    if _hash_executor is not None and _hash_executor_pid == os.getpid():
+        return _hash_executor
+    with _hash_lock:
+        if _hash_executor is None or _hash_executor_pid != os.getpid():
+            _hash_executor = ThreadPoolExecutor(max_workers=HASH_CONFIG["workers"], thread_name_prefix="hash")
+            _hash_executor_pid = os.getpid()
+    return _hash_executor
+
+def close_hash_executor():
+    """Arrêter l'exécuteur de hachage (arrêt de l'application)"""
+    global _hash_executor
+    with _hash_lock:
+        if _hash_executor is not None and _hash_executor_pid == os.getpid():
+            _hash_executor.shutdown(wait=True)
+        _hash_executor = None
+
+def _timed_hash(func, submitted_at, *args):
+    started_at = time.monotonic()
+    PerformanceMonitor.record_metric("auth.hash_queue_wait", started_at - submitted_at)
+    try:
+        return func(*args)
+    finally:
+        PerformanceMonitor.record_metric("auth.hash_time", time.monotonic() - started_at)
+
+async def _run_hash(func, *args):
+    """
+    Exécuter un calcul bcrypt hors de la boucle d'événements.
+
+    bcrypt libère le GIL : les threads de hachage ne ralentissent pas la
+    boucle, et leur nombre borne le CPU qu'une rafale de connexions peut
+    prendre aux requêtes OCR.
+    """
+    global _hash_pending
+    with _hash_lock:
+        if _hash_pending >= HASH_CONFIG["max_pending"]:
+            raise HashQueueFullError(
+                f"Trop de vérifications de mot de passe en attente ({_hash_pending})"
+            )
+        _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_hash_executor(), functools.partial(_timed_hash, func, time.monotonic(), *args)
+        )
+    finally:
+        with _hash_lock:
+            _hash_pending -= 1
+
+async def hash_password_async(password):
+    """Hacher un mot de passe dans l'exécuteur de hachage"""
+    return await _run_hash(get_password_hash, password)
+
+async def verify_password_async(plain_password, hashed_password, salt=None):
+    """Vérifier un mot de passe dans l'exécuteur de hachage ; voir verify_and_update_password"""
+    return await _run_hash(verify_and_update_password, plain_password, hashed_password, salt)
+
+def get_hash_stats():
+    """État de l'exécuteur de hachage pour le monitoring"""
+    with _hash_lock:
+        pending = _hash_pending
+    return {
+        "bcrypt_rounds": HASH_CONFIG["bcrypt_rounds"],
+        "workers": HASH_CONFIG["workers"],
+        "max_pending": HASH_CONFIG["max_pending"],
+        "pending": pending,
+    }
+
 # Création du token JWT
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -45,7 +187,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # jti permet de révoquer un token (déconnexion)
+    to_encode.update({"exp": expire, "iat": int(time.time()), "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -71,37 +214,104 @@ def authenticate_user(email: str, password: str):
         cur.close()
         conn.close()
 
-# Récupérer l'utilisateur actuel à partir du token
-def get_current_user(token: str = Depends(oauth2_scheme)):
+def _purge_revocations(now):
+    """Oublier les révocations devenues inutiles (tokens concernés expirés)"""
+    for jti in [jti for jti, expires_at in _revoked_tokens.items() if expires_at < now]:
+        del _revoked_tokens[jti]
+
+def revoke_token(jti, expires_at):
+    """Refuser un token (déconnexion) jusqu'à son expiration (timestamp)"""
+    now = time.time()
+    with _revocation_lock:
+        _purge_revocations(now)
+        if len(_revoked_tokens) >= PRINCIPAL_CONFIG["max_revoked"]:
+            raise RuntimeError("Liste de révocation pleine")
+        _revoked_tokens[jti] = expires_at
+
+def cache_principal(user):
+    """Mettre en cache le profil lu à la connexion : la première requête authentifiée ne relit pas la base"""
+    _principals.set(user["email"], {field: user.get(field) for field in PRINCIPAL_FIELDS})
+
+def _is_revoked(claims):
+    # Lecture de dictionnaire, sans verrou : le chemin courant reste en microsecondes
+    return claims.get("jti") in _revoked_tokens
+
+def decode_access_token(token):
+    """
+    Vérifie un token et renvoie ses claims, sans accès à la base.
+
+    La signature, l'expiration et la liste de révocation suffisent : les
+    endpoints qui n'ont besoin que de l'email (sub) ou du nom n'attendent
+    aucune lecture.
+
+    Raises:
+        HTTPException 401: token invalide, expiré ou révoqué
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Token invalide ou expiré",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.PyJWTError:
+        _principal_stats["rejected"] += 1
         raise credentials_exception
-    
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    try:
-        cur.execute("""
-            SELECT * FROM dylan.utilisateurs 
-            WHERE email = %s
-        """, (email,))
-        
-        user = cur.fetchone()
-        
-        if user is None:
-            raise credentials_exception
-            
-        return user
-    finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+    if claims.get("sub") is None or _is_revoked(claims):
+        _principal_stats["rejected"] += 1
+        raise credentials_exception
+    return claims
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)):
+    """Dépendance FastAPI : claims du token (sub = email), sans accès à la base"""
+    return decode_access_token(token)
+
+async def require_admin(claims: dict = Depends(get_current_principal)):
+    """Dépendance FastAPI : claims du token d'un compte listé dans ADMIN_EMAILS, 403 sinon"""
+    if claims["sub"].lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs",
+        )
+    return claims
+
+def _load_principal(email):
+    user = get_storage().get_login_user(email)
+    return {field: user.get(field) for field in PRINCIPAL_FIELDS} if user else None
+
+# Récupérer l'utilisateur actuel à partir du token
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """
+    Dépendance FastAPI : profil de l'utilisateur du token.
+
+    Le profil est gardé en cache par email pendant AUTH_PRINCIPAL_CACHE_TTL
+    secondes : seule la première requête d'un utilisateur (puis une par
+    durée de vie) lit la base, hors de la boucle d'événements.
+    """
+    claims = decode_access_token(token)
+    email = claims["sub"]
+
+    user = _principals.get(email)
+    if user is not None:
+        _principal_stats["hits"] += 1
+    else:
+        _principal_stats["misses"] += 1
+        user = await run_db(_load_principal, email)
+        if user is not None:
+            _principals.set(email, user)
+
+    if user is None or (user.get("est_actif") is not None and not user["est_actif"]):
+        _principal_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalide ou expiré",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+def get_principal_stats():
+    """Succès du cache des profils et taille de la liste de révocation, pour le monitoring"""
+    with _revocation_lock:
+        revoked = {"revoked_tokens": len(_revoked_tokens)}
+    return {**_principal_stats, **_principals.stats(), **revoked}
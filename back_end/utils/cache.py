@@ -0,0 +1,304 @@
+"""
+Cache de lecture pour l'historique des factures et le détail d'une facture.
+
+Deux implémentations derrière la même interface (get / set / delete) :
+- MemoryCache : LRU avec durée de vie, propre au processus (par défaut)
+- RedisCache  : cache partagé entre les workers, activé par CACHE_BACKEND=redis
+
+Invalidation : chaque client a un numéro de génération stocké dans le cache.
+Les entrées de son historique et de ses factures sont enregistrées avec la
+génération courante ; une écriture pour ce client change la génération, ce
+qui rend toutes ses entrées obsolètes d'un coup, sans avoir à les lister.
+Une génération absente (expirée ou évincée) est recréée avec une nouvelle
+valeur : une entrée ne peut donc jamais être servie après une invalidation.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("cache")
+
+CACHE_CONFIG = {
+    # "memory" ou "redis" ; "none" désactive le cache
+    "backend": os.getenv("CACHE_BACKEND", "memory").lower(),
+    "max_entries": int(os.getenv("CACHE_MAX_ENTRIES", "1000")),
+    # Durée de vie d'une entrée, en secondes
+    "ttl": float(os.getenv("CACHE_TTL", "300")),
+    "redis_url": os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+}
+
+# Les générations vivent plus longtemps que les entrées qu'elles protègent
+GENERATION_TTL_FACTOR = 4
+
+
+class MemoryCache:
+    """Cache LRU thread-safe avec durée de vie par entrée"""
+
+    def __init__(self, max_entries=1000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+            }
+
+
+class RedisCache:
+    """Cache partagé entre les workers ; les valeurs sont sérialisées en JSON"""
+
+    def __init__(self, url, ttl=300, prefix="ocr:"):
+        # Dépendance optionnelle : importée seulement si ce backend est choisi
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        self._client.set(self.prefix + key, json.dumps(value, default=str), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+    def stats(self):
+        return {"backend": "redis"}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_cache():
+    """Retourne le cache de l'application (None si désactivé), créé au premier appel"""
+    global _cache
+    if _cache is None and CACHE_CONFIG["backend"] != "none":
+        with _cache_lock:
+            if _cache is None:
+                if CACHE_CONFIG["backend"] == "redis":
+                    try:
+                        _cache = RedisCache(CACHE_CONFIG["redis_url"], ttl=CACHE_CONFIG["ttl"])
+                        logger.info("Cache Redis activé")
+                    except Exception as e:
+                        logger.warning(f"Cache Redis indisponible ({e}), utilisation du cache mémoire")
+                if _cache is None:
+                    _cache = MemoryCache(CACHE_CONFIG["max_entries"], CACHE_CONFIG["ttl"])
+    return _cache
+
+def _count(namespace, outcome):
+    with _counters_lock:
+        counters = _counters.setdefault(namespace, {"hits": 0, "misses": 0, "errors": 0})
+        counters[outcome] += 1
+
+def _generation(cache, email):
+    """Génération courante des entrées d'un client (créée si absente)"""
+    return _generation_of(cache, f"gen:{email}")
+
+def _generation_of(cache, key):
+    """Génération stockée sous une clé (créée si absente)"""
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.set(key, generation, ttl=CACHE_CONFIG["ttl"] * GENERATION_TTL_FACTOR)
+    return generation
+
+def cached_factures_page(loader, email, params):
+    """
+    Lecture d'une page d'historique à travers le cache.
+
+    Args:
+        loader: Fonction sans argument qui lit la page en base en cas d'absence
+        email: Email du client (porte la génération)
+        params: Paramètres de la page (limite, curseur, filtres), partie de la clé
+    """
+    cache = get_cache()
+    if cache is None:
+        return loader()
+
+    try:
+        key = f"factures:{email}:{_generation(cache, email)}:{json.dumps(params, sort_keys=True, default=str)}"
+        page = cache.get(key)
+    except Exception as e:
+        # Un cache en panne ne doit pas rendre l'historique indisponible
+        logger.warning(f"Lecture du cache impossible: {e}")
+        _count("factures", "errors")
+        return loader()
+
+    if page is not None:
+        _count("factures", "hits")
+        return page
+
+    _count("factures", "misses")
+    page = loader()
+    try:
+        cache.set(key, page)
+    except Exception as e:
+        logger.warning(f"Écriture du cache impossible: {e}")
+    return page
+
+def cached_facture_details(loader, facture_id):
+    """
+    Lecture du détail d'une facture à travers le cache.
+
+    L'entrée garde l'email du client, sa génération et celle de la facture au
+    moment de la lecture : elle est ignorée si l'un des deux a été modifié
+    depuis (nom affiché, factures). Les générations sont lues avant la base ;
+    le client n'étant connu qu'après, son email est mémorisé à part et le
+    détail n'est mis en cache qu'à partir de la lecture suivante.
+
+    Args:
+        loader: Fonction sans argument qui lit la facture en base en cas d'absence ;
+            elle renvoie (email du client, détails) ou None
+        facture_id: Clé technique de la facture
+    """
+    cache = get_cache()
+    if cache is None:
+        result = loader()
+        return result[1] if result else None
+
+    key = f"facture:{facture_id}"
+    owner_key = f"facture_owner:{facture_id}"
+    try:
+        entry = cache.get(key)
+        facture_generation = _generation_of(cache, f"gen:{key}")
+        if (entry is not None
+                and entry.get("facture_generation") == facture_generation
+                and entry["generation"] == _generation(cache, entry["email"])):
+            _count("facture", "hits")
+            return entry["details"]
+        owner = cache.get(owner_key)
+        generation = _generation(cache, owner) if owner else None
+    except Exception as e:
+        logger.warning(f"Lecture du cache impossible: {e}")
+        _count("facture", "errors")
+        result = loader()
+        return result[1] if result else None
+
+    _count("facture", "misses")
+    result = loader()
+    if not result:
+        return None
+
+    email, details = result
+    try:
+        if email != owner:
+            cache.set(owner_key, email, ttl=CACHE_CONFIG["ttl"] * GENERATION_TTL_FACTOR)
+        # Une écriture pendant la lecture a changé une génération : le détail lu
+        # est peut-être déjà périmé, il n'est pas conservé
+        elif (facture_generation == cache.get(f"gen:{key}")
+                and generation == cache.get(f"gen:{email}")):
+            cache.set(key, {
+                "email": email,
+                "generation": generation,
+                "facture_generation": facture_generation,
+                "details": details,
+            })
+    except Exception as e:
+        logger.warning(f"Écriture du cache impossible: {e}")
+    return details
+
+def invalidate_customers(emails):
+    """Rendre obsolètes l'historique et les factures en cache des clients donnés"""
+    cache = get_cache()
+    if cache is None:
+        return
+
+    for email in set(emails):
+        if not email:
+            continue
+        try:
+            cache.set(f"gen:{email}", uuid.uuid4().hex, ttl=CACHE_CONFIG["ttl"] * GENERATION_TTL_FACTOR)
+        except Exception as e:
+            logger.error(f"Invalidation du cache impossible pour {email}: {e}")
+
+def invalidate_factures(facture_ids):
+    """Retirer du cache le détail des factures données"""
+    cache = get_cache()
+    if cache is None:
+        return
+
+    for facture_id in set(facture_ids):
+        try:
+            # Changer la génération écarte aussi une lecture en cours qui
+            # réécrirait l'ancien détail après la suppression
+            cache.set(f"gen:facture:{facture_id}", uuid.uuid4().hex,
+                      ttl=CACHE_CONFIG["ttl"] * GENERATION_TTL_FACTOR)
+            cache.delete(f"facture:{facture_id}")
+        except Exception as e:
+            logger.error(f"Invalidation du cache impossible pour la facture {facture_id}: {e}")
+
+def get_cache_stats():
+    """Statistiques du cache : succès, absences et taux de succès par type de lecture"""
+    with _counters_lock:
+        namespaces = {name: dict(counters) for name, counters in _counters.items()}
+
+    for counters in namespaces.values():
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_ratio"] = round(counters["hits"] / lookups, 4) if lookups else None
+
+    hits = sum(c["hits"] for c in namespaces.values())
+    lookups = hits + sum(c["misses"] for c in namespaces.values())
+    cache = get_cache()
+    return {
+        **(cache.stats() if cache is not None else {"backend": "none"}),
+        "hits": hits,
+        "misses": lookups - hits,
+        "hit_ratio": round(hits / lookups, 4) if lookups else None,
+        "namespaces": namespaces,
+    }
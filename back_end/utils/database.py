@@ -0,0 +1,428 @@
+"""
+Pool de connexions PostgreSQL partagé par toute l'application.
+
+Toutes les fonctions qui parlent à la base (main.py, save_data_bdd.py,
+clustering.py, auth_service.py) passent par get_db_connection() au lieu
+d'ouvrir leur propre psycopg2.connect : la poignée de main TCP+TLS+auth
+n'est payée qu'une fois par connexion physique.
+"""
+import os
+import re
+import time
+import hashlib
+import asyncio
+import functools
+import logging
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+
+from back_end.utils.monitoring import PerformanceMonitor
+
+load_dotenv()
+
+logger = logging.getLogger("database")
+
+# Configuration de la connexion à la base de données
+DB_CONFIG = {
+    "dbname": os.getenv("DB_NAME"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASSWORD"),
+    "host": os.getenv("DB_HOST"),
+    "port": os.getenv("DB_PORT")
+}
+
+# Configuration du pool (surchargeable par variables d'environnement)
+POOL_CONFIG = {
+    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+    # Durée de vie maximale d'une connexion physique, en secondes
+    "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+    # Une connexion inactive depuis plus longtemps est vérifiée (SELECT 1) avant d'être prêtée
+    "health_check_interval": float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30")),
+    # Temps d'attente maximal pour obtenir une connexion quand le pool est plein
+    "checkout_timeout": float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "30")),
+}
+
+# Requêtes fréquentes préparées une fois par connexion (désactiver derrière un
+# pgbouncer en mode transaction, où la session n'est pas conservée)
+PREPARED_STATEMENTS_ENABLED = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")
+
+# Nombre de threads qui exécutent les requêtes des handlers async.
+# Borné par la taille du pool : un thread de plus attendrait seulement une connexion.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(POOL_CONFIG["max_size"])))
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Aucune connexion n'a pu être obtenue du pool dans le délai imparti"""
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """Connexion physique qui retient les requêtes déjà préparées sur sa session"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+class ConnectionPool:
+    """Pool de connexions thread-safe avec taille min/max, contrôle de santé et durée de vie maximale"""
+
+    def __init__(self, db_config, min_size=1, max_size=10, max_lifetime=1800.0,
+                 health_check_interval=30.0, checkout_timeout=30.0):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError(f"Taille de pool invalide: min={min_size}, max={max_size}")
+
+        self.db_config = db_config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._cond = threading.Condition()
+        # Connexions disponibles : (connexion, date de création, dernier retour au pool)
+        self._idle = deque()
+        # Date de création de chaque connexion ouverte, prêtée ou non
+        self._created_at = {}
+        self._size = 0
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "health_check_failures": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+
+        for _ in range(min_size):
+            self._size += 1
+            conn = self._connect()
+            self._idle.append((conn, self._created_at[id(conn)], time.monotonic()))
+
+    def _connect(self):
+        """Ouvrir une connexion physique pour une place déjà réservée dans le pool"""
+        try:
+            conn = psycopg2.connect(connection_factory=PreparingConnection, **self.db_config)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        """Ferme une connexion physique et libère sa place dans le pool"""
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            if self._created_at.pop(id(conn), None) is not None:
+                self._size -= 1
+                self._stats["connections_discarded"] += 1
+            self._cond.notify()
+
+    def _is_expired(self, created_at):
+        return self.max_lifetime > 0 and time.monotonic() - created_at > self.max_lifetime
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Connexion du pool invalide, elle sera remplacée: {str(e)}")
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def getconn(self, timeout=None):
+        """Emprunter une connexion au pool, en attendant si nécessaire"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start_time = time.monotonic()
+        deadline = start_time + timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise psycopg2.InterfaceError("Le pool de connexions est fermé")
+                    if self._idle:
+                        conn, created_at, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        # Réserver la place avant d'ouvrir la connexion hors du verrou
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Aucune connexion disponible après {timeout:.1f}s "
+                            f"(taille max du pool: {self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                # Place libre : ouvrir une nouvelle connexion hors du verrou
+                conn = self._connect()
+            elif self._is_expired(created_at) or not self._is_healthy(conn, last_used):
+                self._discard(conn)
+                continue
+
+            wait_time = time.monotonic() - start_time
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["total_wait"] += wait_time
+                self._stats["max_wait"] = max(self._stats["max_wait"], wait_time)
+            PerformanceMonitor.record_metric("db_pool.checkout_wait", wait_time)
+            return conn
+
+    def putconn(self, conn):
+        """Rendre une connexion au pool après avoir annulé toute transaction en cours"""
+        created_at = self._created_at.get(id(conn))
+        if created_at is None:
+            # Connexion inconnue (pool recréé entre-temps) : la fermer simplement
+            if not conn.closed:
+                conn.close()
+            return
+
+        if self._closed or conn.closed or self._is_expired(created_at):
+            self._discard(conn)
+            return
+
+        try:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except Exception:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        """Fermer toutes les connexions inactives et refuser les nouveaux emprunts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Récupérer l'état du pool et les statistiques d'attente"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["size"] = self._size
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._size - len(self._idle)
+            stats["min_size"] = self.min_size
+            stats["max_size"] = self.max_size
+        stats["avg_wait"] = stats["total_wait"] / stats["checkouts"] if stats["checkouts"] else 0
+        return stats
+
+
+class PooledConnection:
+    """
+    Connexion empruntée au pool.
+
+    Se comporte comme une connexion psycopg2, mais close() la rend au pool
+    au lieu de fermer la connexion physique.
+    """
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+
+    @property
+    def raw_connection(self):
+        """Connexion psycopg2 sous-jacente"""
+        if self._conn is None:
+            raise psycopg2.InterfaceError("La connexion a déjà été rendue au pool")
+        return self._conn
+
+    @property
+    def closed(self):
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._pool.putconn(conn)
+
+    def __getattr__(self, name):
+        return getattr(self.raw_connection, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.raw_connection, name, value)
+
+    def __enter__(self):
+        self.raw_connection.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return self.raw_connection.__exit__(exc_type, exc_value, tb)
+
+    def __del__(self):
+        # Filet de sécurité : une connexion oubliée retourne au pool
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_executor = None
+_executor_pid = None
+
+
+def get_pool():
+    """Récupérer le pool du processus courant (créé au premier appel)"""
+    global _pool, _pool_pid
+    # Après un fork, les connexions héritées du parent ne doivent pas être réutilisées
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+            _pool_pid = os.getpid()
+            logger.info(
+                f"Pool de connexions créé (min={POOL_CONFIG['min_size']}, max={POOL_CONFIG['max_size']})"
+            )
+    return _pool
+
+
+def close_pool():
+    """Fermer le pool et l'exécuteur du processus courant (arrêt de l'application)"""
+    global _pool, _executor
+    with _pool_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=True)
+        _executor = None
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close_all()
+        _pool = None
+
+
+def get_db_executor():
+    """Récupérer l'exécuteur borné dédié aux appels base de données"""
+    global _executor, _executor_pid
+    if _executor is not None and _executor_pid == os.getpid():
+        return _executor
+    with _pool_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+            _executor_pid = os.getpid()
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Exécuter une fonction bloquante (psycopg2) hors de la boucle d'événements.
+
+    Les handlers async attendent le résultat sans bloquer la boucle : les
+    autres requêtes continuent d'être servies pendant l'aller-retour réseau.
+    Le contexte de la requête (request_id, étapes mesurées) suit la fonction
+    dans le thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+def get_db_connection(timeout=None):
+    """Emprunter une connexion au pool partagé ; close() la rend au pool"""
+    pool = get_pool()
+    return PooledConnection(pool, pool.getconn(timeout))
+
+
+@contextmanager
+def db_connection():
+    """Emprunter une connexion le temps d'un bloc with, puis la rendre au pool"""
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def get_pool_stats():
+    """Statistiques du pool pour le monitoring"""
+    if _pool is None or _pool_pid != os.getpid():
+        return {}
+    return _pool.stats()
+
+
+# Requête (style %s) -> (nom de l'instruction préparée, requête en $1, $2..., nombre de paramètres)
+_statements = {}
+_PLACEHOLDER = re.compile(r"%s")
+
+
+def _statement(query):
+    statement = _statements.get(query)
+    if statement is None:
+        counter = iter(range(1, query.count("%s") + 1))
+        prepared_sql = _PLACEHOLDER.sub(lambda _: f"${next(counter)}", query)
+        name = "stmt_" + hashlib.md5(query.encode()).hexdigest()[:16]
+        statement = _statements[query] = (name, prepared_sql, query.count("%s"))
+    return statement
+
+
+def execute_prepared(cursor, query, params=()):
+    """
+    Exécuter une requête fréquente sous forme d'instruction préparée.
+
+    La requête (avec des paramètres %s, comme pour cursor.execute) est
+    préparée au premier appel sur chaque connexion physique, puis exécutée
+    par son nom : Postgres ne l'analyse et ne la planifie plus à chaque appel.
+    Une instruction préparée survit aux rollbacks et vit autant que la
+    connexion, qui reste dans le pool entre deux emprunts.
+    """
+    conn = cursor.connection
+    prepared = getattr(conn, "prepared_statements", None)
+    if not PREPARED_STATEMENTS_ENABLED or prepared is None:
+        cursor.execute(query, params)
+        return
+
+    name, prepared_sql, nb_params = _statement(query)
+    if name not in prepared:
+        cursor.execute(f"PREPARE {name} AS {prepared_sql}")
+        prepared.add(name)
+
+    if nb_params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * nb_params)})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
@@ -192,4 +192,38 @@ def validate_total(items, total):
     if abs(calculated_total - total) > 0.01:
         print(f"⚠️ Incohérence dans le total: {total} vs {calculated_total} calculé")
         return False
-    return True
\ No newline at end of file
+    return True
+
+def extract_invoice_data(image_path):
+    """
+    Extrait les données d'une facture à partir d'une image, sans les enregistrer.
+
+    Returns:
+        Dictionnaire des données de la facture, ou None si l'OCR a échoué
+    """
+    # Extraire le numéro de facture du nom de fichier
+    file_invoice_number = extract_invoice_number_from_filename(image_path)
+    
+    # Effectuer l'OCR sur l'image
+    raw_text = perform_ocr(image_path)
+    if raw_text is None:
+        return None
+    
+    # Nettoyer le texte extrait
+    cleaned_text = clean_ocr_text(raw_text)
+    
+    # Extraire les différentes informations
+    invoice_data = {
+        "invoice_number": extract_invoice_number_from_text(cleaned_text, file_invoice_number),
+        "issue_date": extract_issue_date(cleaned_text),
+        "client": extract_client_name(cleaned_text),
+        "email": extract_email(cleaned_text),
+        "address": extract_address(cleaned_text),
+        "items": extract_items(cleaned_text),
+        "total": extract_total(cleaned_text)
+    }
+    
+    # Valider le total par rapport aux éléments
+    validate_total(invoice_data["items"], invoice_data["total"])
+    
+    return invoice_data
@@ -0,0 +1,147 @@
+"""
+Configuration de la journalisation de l'application (application.log).
+
+Les appels à logging ne font qu'ajouter l'enregistrement à une file mémoire
+bornée (QueueHandler) : aucune écriture de fichier ni de console sur la
+boucle d'événements. Un thread d'arrière-plan (QueueListener) écrit le
+fichier, avec rotation par taille ou par jour, et la console. Si la file est
+pleine, l'enregistrement est abandonné et compté plutôt que de ralentir la
+requête.
+
+L'identifiant de requête et de span (request_id_var, current_span_var) est
+ajouté à chaque enregistrement au moment de l'appel, sur le thread appelant.
+Il figure entre crochets après le niveau au format texte ("-" hors requête)
+et devient un champ à part entière au format JSON (LOG_FORMAT=json).
+"""
+import os
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+from pythonjsonlogger.json import JsonFormatter
+
+load_dotenv()
+
+LOGGING_CONFIG = {
+    "file": os.getenv("LOG_FILE", "application.log"),
+    "level": os.getenv("LOG_LEVEL", "INFO").upper(),
+    # text (par défaut) ou json (un objet JSON par ligne)
+    "format": os.getenv("LOG_FORMAT", "text").lower(),
+    # size : rotation à LOG_MAX_BYTES, time : rotation selon LOG_ROTATION_WHEN (midnight, H, ...)
+    "rotation": os.getenv("LOG_ROTATION", "size").lower(),
+    "max_bytes": int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+    "when": os.getenv("LOG_ROTATION_WHEN", "midnight"),
+    "backup_count": int(os.getenv("LOG_BACKUP_COUNT", "5")),
+    "console": os.getenv("LOG_CONSOLE", "true").lower() in ("1", "true", "yes"),
+    # Enregistrements en attente d'écriture au-delà desquels ils sont abandonnés
+    "queue_size": int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+}
+
+# L'identifiant de requête est à une place fixe pour que log_store puisse l'indexer
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+JSON_FIELDS = "%(asctime)s %(name)s %(levelname)s %(message)s %(request_id)s %(span_id)s"
+
+# Variables de contexte pour suivre les requêtes
+request_id_var = ContextVar("request_id", default=None)
+current_span_var = ContextVar("current_span", default=None)
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+
+class RequestContextFilter(logging.Filter):
+    """Ajoute request_id et span_id de la requête en cours à l'enregistrement"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.span_id = current_span_var.get()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """Format texte où un identifiant de requête absent s'écrit "-" """
+
+    def formatMessage(self, record):
+        return self._style._fmt % {**record.__dict__, "request_id": getattr(record, "request_id", None) or "-"}
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui abandonne (et compte) l'enregistrement quand la file est pleine"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _formatter():
+    if LOGGING_CONFIG["format"] == "json":
+        return JsonFormatter(JSON_FIELDS, rename_fields={"levelname": "level", "asctime": "timestamp"})
+    return TextFormatter(TEXT_FORMAT)
+
+def _file_handler():
+    if LOGGING_CONFIG["rotation"] == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            LOGGING_CONFIG["file"], when=LOGGING_CONFIG["when"],
+            backupCount=LOGGING_CONFIG["backup_count"], encoding="utf-8",
+        )
+    return logging.handlers.RotatingFileHandler(
+        LOGGING_CONFIG["file"], maxBytes=LOGGING_CONFIG["max_bytes"],
+        backupCount=LOGGING_CONFIG["backup_count"], encoding="utf-8",
+    )
+
+def configure_logging():
+    """Installer la file de journalisation sur le logger racine (une seule fois)"""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return
+        formatter = _formatter()
+        handlers = [_file_handler()]
+        if LOGGING_CONFIG["console"]:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOGGING_CONFIG["queue_size"]))
+        _queue_handler.addFilter(RequestContextFilter())
+        root = logging.getLogger()
+        root.setLevel(LOGGING_CONFIG["level"])
+        root.addHandler(_queue_handler)
+
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(close_logging)
+
+def close_logging():
+    """Écrire les enregistrements encore en file et arrêter le thread d'écriture"""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener = None
+
+def get_logging_stats():
+    """État de la file de journalisation pour le monitoring"""
+    return {
+        "file": LOGGING_CONFIG["file"],
+        "format": LOGGING_CONFIG["format"],
+        "rotation": LOGGING_CONFIG["rotation"],
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "queue_size": LOGGING_CONFIG["queue_size"],
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+    }
@@ -0,0 +1,188 @@
+"""
+Journal d'erreurs dylan.log écrit par lots.
+
+Les chemins d'erreur appellent log_error(), qui ne fait qu'ajouter l'entrée à
+un tampon mémoire : la requête en erreur n'attend jamais la base. Un thread
+d'arrière-plan vide le tampon par lots (un seul INSERT multi-lignes).
+
+Quand la base est injoignable, les entrées sont ajoutées à un fichier local
+(LOG_SINK_SPOOL_FILE) puis rejouées au premier envoi réussi, et la base n'est
+plus sollicitée pendant LOG_SINK_RETRY_DELAY secondes : une panne n'est pas
+aggravée par le journal des erreurs qu'elle provoque. Si le tampon déborde,
+les entrées les plus anciennes sont abandonnées et comptées.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import datetime
+import threading
+from collections import deque
+
+from dotenv import load_dotenv
+
+from back_end.utils.storage import get_storage
+
+load_dotenv()
+
+logger = logging.getLogger("log_sink")
+
+LOG_SINK_CONFIG = {
+    "max_buffer": int(os.getenv("LOG_SINK_MAX_BUFFER", "10000")),
+    "batch_size": int(os.getenv("LOG_SINK_BATCH_SIZE", "200")),
+    # Intervalle entre deux envois, en secondes
+    "flush_interval": float(os.getenv("LOG_SINK_FLUSH_INTERVAL", "2.0")),
+    # Pause après un échec d'envoi avant de solliciter à nouveau la base
+    "retry_delay": float(os.getenv("LOG_SINK_RETRY_DELAY", "30")),
+    # Attente maximale d'une connexion : le journal ne monopolise pas le pool
+    "checkout_timeout": float(os.getenv("LOG_SINK_CHECKOUT_TIMEOUT", "1.0")),
+    "spool_file": os.getenv("LOG_SINK_SPOOL_FILE", "dylan_log_spool.jsonl"),
+}
+
+
+class LogSink:
+    """Tampon d'entrées dylan.log vidé par lots sur un thread d'arrière-plan"""
+
+    def __init__(self, max_buffer=None, batch_size=None, flush_interval=None,
+                 retry_delay=None, spool_file=None):
+        self.batch_size = batch_size or LOG_SINK_CONFIG["batch_size"]
+        self.flush_interval = flush_interval if flush_interval is not None else LOG_SINK_CONFIG["flush_interval"]
+        self.retry_delay = retry_delay if retry_delay is not None else LOG_SINK_CONFIG["retry_delay"]
+        self.spool_file = spool_file or LOG_SINK_CONFIG["spool_file"]
+        self._buffer = deque(maxlen=max_buffer or LOG_SINK_CONFIG["max_buffer"])
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._db_available_at = 0.0
+        self._stats = {"logged": 0, "written": 0, "spooled": 0, "dropped": 0, "failed_flushes": 0}
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+
+    def log(self, fichier, erreur):
+        """Ajouter une entrée au tampon (ne bloque jamais sur la base)"""
+        entry = (datetime.datetime.now(), fichier, str(erreur))
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self._stats["dropped"] += 1
+            self._buffer.append(entry)
+            self._stats["logged"] += 1
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Envoyer immédiatement le contenu du tampon (ou le déposer dans le fichier local)"""
+        with self._flush_lock:
+            with self._lock:
+                entries = list(self._buffer)
+                self._buffer.clear()
+
+            if time.monotonic() < self._db_available_at:
+                self._spool(entries)
+                return
+
+            try:
+                spooled = self._read_spool()
+                self._write(spooled + entries)
+                if spooled:
+                    os.remove(self.spool_file)
+                    logger.info(f"{len(spooled)} entrée(s) du fichier {self.spool_file} rejouée(s)")
+            except Exception as e:
+                logger.warning(f"Écriture de dylan.log impossible ({e}), entrées conservées dans {self.spool_file}")
+                with self._lock:
+                    self._stats["failed_flushes"] += 1
+                self._db_available_at = time.monotonic() + self.retry_delay
+                self._spool(entries)
+
+    def close(self):
+        """Arrêter le thread et envoyer les dernières entrées"""
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        # Dernier essai vers la base, même pendant la pause qui suit un échec
+        self._db_available_at = 0.0
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "buffered": len(self._buffer)}
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                if self._buffer or os.path.exists(self.spool_file):
+                    self.flush()
+            except Exception as e:
+                logger.error(f"Erreur du journal dylan.log: {e}")
+
+    def _write(self, entries):
+        if not entries:
+            return
+        # Une seule transaction : en cas d'échec, toutes les entrées partent dans le fichier tampon
+        get_storage().write_logs(entries, timeout=LOG_SINK_CONFIG["checkout_timeout"])
+        with self._lock:
+            self._stats["written"] += len(entries)
+
+    def _spool(self, entries):
+        if not entries:
+            return
+        with open(self.spool_file, "a", encoding="utf-8") as f:
+            for time_, fichier, erreur in entries:
+                f.write(json.dumps({"time": time_.isoformat(), "fichier": fichier, "erreur": erreur},
+                                   ensure_ascii=False) + "\n")
+        with self._lock:
+            self._stats["spooled"] += len(entries)
+
+    def _read_spool(self):
+        if not os.path.exists(self.spool_file):
+            return []
+        entries = []
+        with open(self.spool_file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    entries.append((datetime.datetime.fromisoformat(record["time"]), record["fichier"], record["erreur"]))
+                except (ValueError, KeyError):
+                    # Ligne tronquée par un arrêt brutal : ignorée
+                    continue
+        return entries
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_log_sink():
+    """Retourne le journal du processus, créé au premier appel"""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = LogSink()
+                atexit.register(close_log_sink)
+    return _sink
+
+def log_error(fichier, erreur):
+    """Journaliser une erreur dans dylan.log sans attendre la base"""
+    try:
+        get_log_sink().log(fichier, erreur)
+    except Exception as e:
+        print(f"Erreur lors de l'enregistrement du log: {e}")
+
+def close_log_sink():
+    """Envoyer les entrées en attente et arrêter le journal (arrêt de l'application)"""
+    global _sink
+    with _sink_lock:
+        sink, _sink = _sink, None
+    if sink is not None:
+        sink.close()
+
+def get_log_sink_stats():
+    """Statistiques du journal pour le monitoring"""
+    return _sink.stats() if _sink is not None else {}
@@ -0,0 +1,310 @@
+"""
+Lecture indexée du journal application.log et de ses fichiers de rotation.
+
+Pour chaque fichier, un index garde la position (octet) du début de chaque
+enregistrement, avec son horodatage, son niveau et l'identifiant de requête
+qui l'a produit. L'index est complété au fil de l'eau : seuls les octets
+écrits depuis la dernière lecture sont relus. Les fichiers sont identifiés
+par leur inode, qu'une rotation (renommage) ne change pas : l'index de
+application.log devient celui de application.log.1 sans relecture.
+
+Une requête filtrée (niveau minimal, identifiant de requête, période) ne
+parcourt que l'index, puis lit les seuls enregistrements renvoyés. Les
+pages sont désignées par un curseur "<inode>:<position>", valable d'une
+rotation à l'autre.
+"""
+import os
+import re
+import glob
+import json
+import bisect
+import logging
+import threading
+import datetime
+from array import array
+
+from dotenv import load_dotenv
+
+from back_end.utils.log_config import LOGGING_CONFIG
+
+load_dotenv()
+
+LOG_STORE_CONFIG = {
+    # Intervalle entre deux lectures des nouvelles lignes pour le suivi en direct, en secondes
+    "follow_interval": float(os.getenv("LOG_FOLLOW_INTERVAL", "1.0")),
+    # Commentaire envoyé au client sans nouvelles lignes depuis ce délai, en secondes
+    "heartbeat_interval": float(os.getenv("LOG_FOLLOW_HEARTBEAT", "15")),
+}
+
+# Début d'un enregistrement au format texte ("2026-10-19 06:30:42,178 - nom - INFO - [request_id] message",
+# "-" hors requête, crochets absents des journaux antérieurs) ;
+# les autres lignes (traces d'exception) prolongent l'enregistrement précédent
+TEXT_RECORD = re.compile(
+    rb"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - .*? - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - (?:\[([^\]]*)\] )?"
+)
+
+LEVELS = {name: logging.getLevelName(name) for name in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")}
+
+
+class InvalidCursorError(ValueError):
+    """Curseur de pagination mal formé"""
+
+
+def _asctime(value):
+    """Borne de période au format des horodatages du journal (heure locale)"""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value.strftime("%Y-%m-%d %H:%M:%S") + f",{value.microsecond // 1000:03d}"
+    return value
+
+def _parse_line(line):
+    """(horodatage, niveau, request_id) si la ligne commence un enregistrement, sinon None"""
+    if line.startswith(b"{"):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict) or "timestamp" not in record:
+            return None
+        return record["timestamp"], LEVELS.get(record.get("level"), 0), record.get("request_id")
+    match = TEXT_RECORD.match(line)
+    if match is None:
+        return None
+    request_id = match.group(3)
+    return (
+        match.group(1).decode(),
+        LEVELS[match.group(2).decode()],
+        request_id.decode() if request_id and request_id != b"-" else None,
+    )
+
+
+class FileIndex:
+    """Index des enregistrements d'un fichier de journal"""
+
+    def __init__(self, key, path):
+        self.key = key
+        self.path = path
+        self.size = 0
+        self.offsets = array("q")
+        self.levels = array("b")
+        # Horodatages au format asctime : l'ordre des chaînes est l'ordre chronologique
+        self.times = []
+        self.requests = {}
+
+    def update(self):
+        """Indexer les lignes complètes écrites depuis la dernière lecture"""
+        with open(self.path, "rb") as f:
+            f.seek(self.size)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        position = 0
+        while position < end:
+            line_end = data.index(b"\n", position) + 1
+            parsed = _parse_line(data[position:line_end - 1])
+            if parsed is not None:
+                timestamp, level, request_id = parsed
+                if request_id:
+                    self.requests.setdefault(request_id, []).append(len(self.offsets))
+                self.offsets.append(self.size + position)
+                self.levels.append(level // 10)
+                self.times.append(timestamp)
+            position = line_end
+        self.size += end
+
+    def positions(self, min_level=0, request_id=None, since=None, until=None, before=None, after=None,
+                  newest_first=False):
+        """Positions des enregistrements correspondant aux filtres (itérateur, parcours paresseux)"""
+        low = bisect.bisect_left(self.times, since) if since else 0
+        high = bisect.bisect_right(self.times, until) if until else len(self.times)
+        if before is not None:
+            high = min(high, before)
+        if after is not None:
+            low = max(low, after + 1)
+        if request_id is not None:
+            candidates = [p for p in self.requests.get(request_id, ()) if low <= p < high]
+        else:
+            candidates = range(low, high)
+        if newest_first:
+            candidates = reversed(candidates)
+        min_level //= 10
+        if min_level:
+            return (p for p in candidates if self.levels[p] >= min_level)
+        return iter(candidates)
+
+    def read(self, f, position):
+        start = self.offsets[position]
+        end = self.offsets[position + 1] if position + 1 < len(self.offsets) else self.size
+        f.seek(start)
+        return f.read(end - start).decode("utf-8", errors="replace")
+
+
+class LogStore:
+    """Index du fichier de journal courant et de ses fichiers de rotation"""
+
+    def __init__(self, path=None):
+        self.path = path or LOGGING_CONFIG["file"]
+        self._files = {}
+        self._order = []
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Suivre les rotations et indexer les nouvelles lignes"""
+        with self._lock:
+            found = []
+            for path in glob.glob(glob.escape(self.path) + ".*") + [self.path]:
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # Le fichier courant en dernier, les fichiers de rotation du plus ancien au plus récent
+                found.append((path == self.path, stat.st_mtime, f"{stat.st_ino}", path, stat.st_size))
+            found.sort()
+
+            files = {}
+            for _, _, key, path, size in found:
+                index = self._files.get(key)
+                if index is None or size < index.size:
+                    index = FileIndex(key, path)
+                index.path = path
+                if size > index.size:
+                    index.update()
+                files[key] = index
+            self._files = files
+            self._order = [key for _, _, key, _, _ in found]
+
+    def query(self, level=None, request_id=None, since=None, until=None, limit=100, cursor=None):
+        """
+        Derniers enregistrements correspondant aux filtres, du plus ancien au plus récent.
+
+        cursor : next_cursor d'une page précédente, pour lire les enregistrements plus anciens.
+        """
+        cursor_key, cursor_position = self.parse_cursor(cursor)
+        min_level = LEVELS.get(level.upper(), 0) if level else 0
+        since, until = _asctime(since), _asctime(until)
+        self.refresh()
+        with self._lock:
+            order = self._order
+            if cursor_key is not None:
+                # Les fichiers plus récents que celui du curseur ont déjà été renvoyés ;
+                # si son fichier a été supprimé par la rotation, il n'y a rien de plus ancien
+                order = order[:order.index(cursor_key) + 1] if cursor_key in self._files else []
+            selected = []
+            for key in reversed(order):
+                before = cursor_position if key == cursor_key else None
+                positions = self._files[key].positions(
+                    min_level, request_id, since, until, before=before, newest_first=True
+                )
+                for position in positions:
+                    selected.append((key, position))
+                    if len(selected) > limit:
+                        break
+                if len(selected) > limit:
+                    break
+
+            has_more = len(selected) > limit
+            selected = selected[:limit]
+            selected.reverse()
+            return {
+                "logs": self._read(selected),
+                "next_cursor": self._cursor(selected[0]) if has_more else None,
+                "last_cursor": self._cursor(selected[-1]) if selected else self._end_cursor(),
+            }
+
+    def follow(self, cursor, level=None, request_id=None, limit=500):
+        """Enregistrements écrits après le curseur (suivi en direct), et le curseur du dernier renvoyé"""
+        cursor_key, cursor_position = self.parse_cursor(cursor)
+        min_level = LEVELS.get(level.upper(), 0) if level else 0
+        self.refresh()
+        with self._lock:
+            # Curseur dans un fichier supprimé par la rotation : reprendre au plus ancien fichier restant
+            start = self._order.index(cursor_key) if cursor_key in self._files else 0
+            selected = []
+            for key in self._order[start:]:
+                after = cursor_position if key == cursor_key else None
+                for position in self._files[key].positions(min_level, request_id, after=after):
+                    selected.append((key, position))
+                    if len(selected) >= limit:
+                        break
+                if len(selected) >= limit:
+                    break
+            next_cursor = self._cursor(selected[-1]) if selected else cursor
+            return self._read(selected), next_cursor
+
+    def end_cursor(self):
+        """Curseur du dernier enregistrement indexé (point de départ du suivi en direct)"""
+        self.refresh()
+        with self._lock:
+            return self._end_cursor()
+
+    def _end_cursor(self):
+        for key in reversed(self._order):
+            if len(self._files[key].offsets):
+                return f"{key}:{len(self._files[key].offsets) - 1}"
+        return f"{self._order[-1]}:-1" if self._order else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": [
+                    {"path": index.path, "size": index.size, "records": len(index.offsets)}
+                    for index in (self._files[key] for key in self._order)
+                ],
+            }
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """(inode, position) d'un curseur ; lève InvalidCursorError s'il est mal formé"""
+        if not cursor:
+            return None, None
+        try:
+            key, position = cursor.split(":")
+            return key, int(position)
+        except ValueError:
+            raise InvalidCursorError(f"Curseur invalide: {cursor}")
+
+    @staticmethod
+    def _cursor(entry):
+        return f"{entry[0]}:{entry[1]}"
+
+    def _read(self, selected):
+        lines = []
+        handles = {}
+        try:
+            for key, position in selected:
+                index = self._files[key]
+                if key not in handles:
+                    handles[key] = self._open(index)
+                if handles[key] is not None:
+                    lines.append(index.read(handles[key], position))
+        finally:
+            for f in handles.values():
+                if f is not None:
+                    f.close()
+        return lines
+
+    @staticmethod
+    def _open(index):
+        """Ouvrir le fichier indexé, ou None s'il a été supprimé ou renommé depuis l'indexation"""
+        try:
+            f = open(index.path, "rb")
+        except FileNotFoundError:
+            return None
+        if f"{os.fstat(f.fileno()).st_ino}" != index.key:
+            f.close()
+            return None
+        return f
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_log_store():
+    """Index partagé du journal de l'application (créé au premier appel)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LogStore()
+    return _store
@@ -0,0 +1,233 @@
+"""
+Migrations versionnées du schéma dylan.
+
+Chaque fichier structures/migrations/NNNN_nom.sql est appliqué une seule fois,
+dans l'ordre, et enregistré dans dylan.schema_migrations. Le schéma n'est plus
+modifié par les handlers de requêtes : les migrations sont jouées au
+déploiement, avant le démarrage de l'API.
+
+Usage :
+    python -m back_end.utils.migrations                 # appliquer les migrations en attente
+    python -m back_end.utils.migrations --status        # lister les migrations
+    python -m back_end.utils.migrations --check-plans   # vérifier les index des requêtes fréquentes
+"""
+import re
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+
+from back_end.utils.database import get_db_connection
+
+logger = logging.getLogger("migrations")
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "structures" / "migrations"
+
+# Verrou consultatif : deux déploiements simultanés n'appliquent pas deux fois la même migration
+MIGRATION_LOCK_ID = 727_001
+
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Partitions annuelles (facture_2024, article_defaut...) : rapportées à leur table dans --check-plans
+PARTITION_PATTERN = re.compile(r"^(facture|article)_(\d{4}|defaut)$")
+
+
+def list_migrations():
+    """Lister les migrations disponibles sous forme de (version, nom, chemin), triées par version"""
+    migrations = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        match = MIGRATION_FILE_PATTERN.match(path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Numéros de migration en double dans {MIGRATIONS_DIR}")
+    return migrations
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE SCHEMA IF NOT EXISTS dylan;
+        CREATE TABLE IF NOT EXISTS dylan.schema_migrations (
+            version INTEGER PRIMARY KEY,
+            nom VARCHAR(255) NOT NULL,
+            date_application TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def get_applied_versions(cur):
+    """Versions déjà appliquées sur la base"""
+    cur.execute("SELECT version FROM dylan.schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+def apply_migrations():
+    """
+    Appliquer les migrations en attente, chacune dans sa propre transaction.
+
+    Returns:
+        Liste des noms de migrations appliquées
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    applied = []
+
+    try:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        _ensure_migrations_table(cur)
+        conn.commit()
+
+        done = get_applied_versions(cur)
+        for version, name, path in list_migrations():
+            if version in done:
+                continue
+
+            logger.info(f"Application de la migration {version:04d}_{name}")
+            try:
+                cur.execute(path.read_text(encoding="utf-8"))
+                cur.execute(
+                    "INSERT INTO dylan.schema_migrations (version, nom) VALUES (%s, %s)",
+                    (version, name)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.error(f"Échec de la migration {version:04d}_{name}")
+                raise
+            applied.append(f"{version:04d}_{name}")
+
+        return applied
+    finally:
+        try:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+def migration_status():
+    """Lister les migrations avec leur état (appliquée ou en attente)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        _ensure_migrations_table(cur)
+        conn.commit()
+        done = get_applied_versions(cur)
+        return [
+            {"version": version, "nom": name, "appliquee": version in done}
+            for version, name, _ in list_migrations()
+        ]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _hot_queries():
+    """Requêtes fréquentes à vérifier : nom -> (requête, paramètres d'exemple, tables à lire par index)"""
+    from back_end.classe.read_data_bdd import (
+        build_factures_page_query, build_recherche_query, encode_cursor, DETAILS_FACTURE_QUERY
+    )
+
+    return {
+        "historique_par_email": (
+            *build_factures_page_query("exemple@example.com", 50),
+            {"facture"}
+        ),
+        "historique_page_suivante": (
+            *build_factures_page_query("exemple@example.com", 50, encode_cursor("2024-06-01", 1000)),
+            {"facture"}
+        ),
+        "details_facture": (DETAILS_FACTURE_QUERY, (1,), {"facture", "article"}),
+        "recherche_factures": (
+            *build_recherche_query("lait entier"),
+            {"facture", "article", "utilisateur"}
+        ),
+        "recherche_factures_par_email": (
+            *build_recherche_query("0042", "exemple@example.com"),
+            {"facture", "article", "utilisateur"}
+        ),
+        "historique_par_periode": (
+            *build_factures_page_query("exemple@example.com", 50, date_from="2024-01-01", date_to="2024-12-31"),
+            {"facture"}
+        ),
+        "factures_par_date": (
+            "SELECT nom_facture FROM dylan.facture WHERE date_facture BETWEEN %s AND %s",
+            ("2024-01-01", "2024-12-31"),
+            {"facture"}
+        ),
+        "articles_par_facture": (
+            "SELECT nom_article, quantite, prix FROM dylan.article WHERE nom_facture = %s",
+            ("FAC/2024/0001",),
+            {"article"}
+        ),
+    }
+
+def _scans(plan):
+    """Parcourir un plan EXPLAIN JSON et renvoyer les (table, type de parcours)"""
+    scans = []
+    if "Relation Name" in plan:
+        scans.append((plan["Relation Name"], plan["Node Type"]))
+    for child in plan.get("Plans", []):
+        scans.extend(_scans(child))
+    return scans
+
+def check_query_plans():
+    """
+    Vérifier par EXPLAIN que les requêtes fréquentes peuvent utiliser un index.
+
+    Les parcours séquentiels sont désactivés le temps de l'EXPLAIN : sur une
+    petite base le planificateur les préfère à raison, mais s'il en choisit
+    encore un, c'est qu'aucun index ne couvre le prédicat.
+
+    Returns:
+        Dictionnaire nom de requête -> {"ok": bool, "scans": [(table, parcours)]}
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    results = {}
+
+    try:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for name, (query, params, indexed_tables) in _hot_queries().items():
+            cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = _scans(plan[0]["Plan"])
+            ok = all(
+                scan_type != "Seq Scan"
+                for table, scan_type in scans
+                if PARTITION_PATTERN.sub(r"\1", table) in indexed_tables
+            )
+            results[name] = {"ok": ok, "scans": scans}
+        return results
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Migrations du schéma dylan")
+    parser.add_argument("--status", action="store_true", help="Lister les migrations et leur état")
+    parser.add_argument("--check-plans", action="store_true", help="Vérifier les plans des requêtes fréquentes")
+    args = parser.parse_args()
+
+    if args.status:
+        for migration in migration_status():
+            etat = "appliquée" if migration["appliquee"] else "en attente"
+            print(f"{migration['version']:04d}_{migration['nom']}: {etat}")
+    elif args.check_plans:
+        all_ok = True
+        for name, result in check_query_plans().items():
+            all_ok = all_ok and result["ok"]
+            scans = ", ".join(f"{table}={scan_type}" for table, scan_type in result["scans"])
+            print(f"{'✅' if result['ok'] else '❌'} {name}: {scans}")
+        sys.exit(0 if all_ok else 1)
+    else:
+        applied = apply_migrations()
+        print(f"{len(applied)} migration(s) appliquée(s)" + (f": {', '.join(applied)}" if applied else ""))
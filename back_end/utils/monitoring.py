@@ -1,224 +1,622 @@
 import time
+import bisect
 import logging
+import re
+import inspect
 import functools
+import threading
 import traceback
+from contextlib import contextmanager
 from contextvars import ContextVar
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Response
 import uuid
+import random
+import urllib.parse
 import json
 import os
+from dotenv import load_dotenv
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.core import HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
 
-# Configuration du logger
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("application.log", mode="a", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+from back_end.utils.log_config import configure_logging, request_id_var, current_span_var
+from back_end.utils.shared_metrics import SHARED_METRICS_CONFIG, SharedMetricsStore
+
+load_dotenv()
+
+# Configuration du logger : écriture du fichier et de la console sur un thread
+# d'arrière-plan (back_end.utils.log_config)
+configure_logging()
 
 # Créer un logger spécifique pour le monitoring
 logger = logging.getLogger("monitoring")
 logger.setLevel(logging.INFO)
 
-# S'assurer que le fichier de log existe
-if not os.path.exists("application.log"):
-    with open("application.log", "w", encoding="utf-8") as f:
-        f.write("Initialisation du fichier de log\n")
-    logger.info("Fichier de log créé")
+# Histogrammes de latence : bornes fixes espacées géométriquement (erreur relative
+# d'au plus METRICS_HISTOGRAM_GROWTH - 1 sur un percentile), plus les bornes
+# exportées vers Prometheus pour que leurs compteurs soient exacts.
+HISTOGRAM_CONFIG = {
+    "min_value": float(os.getenv("METRICS_HISTOGRAM_MIN", "0.00001")),
+    "max_value": float(os.getenv("METRICS_HISTOGRAM_MAX", "300")),
+    "growth": float(os.getenv("METRICS_HISTOGRAM_GROWTH", "1.1")),
+    # Au-delà, les nouvelles clés sont regroupées sous OVERFLOW_KEY
+    "max_series": int(os.getenv("METRICS_MAX_SERIES", "1000")),
+}
+
+PROMETHEUS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Fenêtres glissantes (secondes) et tranches de temps qui les composent :
+# (largeur d'une tranche, nombre de tranches gardées). Les tranches sont
+# numérotées sur l'horloge murale, commune à tous les processus.
+WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+TIERS = ((10, 30), (60, 60))
+
+OVERFLOW_KEY = "autres"
+
+def _bucket_bounds(config):
+    bounds = set(PROMETHEUS_BUCKETS)
+    bound = config["min_value"]
+    while bound < config["max_value"]:
+        bounds.add(bound)
+        bound *= config["growth"]
+    bounds.add(config["max_value"])
+    return tuple(sorted(bounds))
+
+BUCKET_BOUNDS = _bucket_bounds(HISTOGRAM_CONFIG)
+
+
+def _percentile(counts, count, q, max_value):
+    """Percentile q (0-1) estimé à partir des compteurs par tranche de BUCKET_BOUNDS"""
+    if count == 0:
+        return 0
+    rank = q * count
+    seen = 0
+    for index, bucket_count in enumerate(counts):
+        if bucket_count and seen + bucket_count >= rank:
+            lower = BUCKET_BOUNDS[index - 1] if index > 0 else 0
+            upper = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else max(max_value, lower)
+            # Interpolation linéaire dans la tranche, sans dépasser le maximum observé
+            return min(lower + (upper - lower) * (rank - seen) / bucket_count, max_value)
+        seen += bucket_count
+    return max_value
+
+
+class LatencyHistogram:
+    """
+    Histogramme des durées d'une clé : depuis le démarrage et par tranches de temps.
+
+    Une observation coûte une recherche dichotomique dans BUCKET_BOUNDS et un
+    incrément par niveau de tranches, quel que soit le nombre d'observations.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        # Une case de plus pour les durées au-delà de la dernière borne
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        # Par niveau : anneau de tranches [numéro de tranche, somme, compteurs], créées à la demande
+        self._slots = [[None] * size for _, size in TIERS]
+
+    @classmethod
+    def from_state(cls, state):
+        """Histogramme en lecture seule construit à partir de SharedSeries.state()"""
+        histogram = cls()
+        histogram.count, histogram.total, histogram.min, histogram.max, histogram.counts, histogram._slots = state
+        return histogram
+
+    def record(self, value, now=None):
+        index = bisect.bisect_left(BUCKET_BOUNDS, value)
+        now = time.time() if now is None else now
+        with self._lock:
+            self.count += 1
+            self.total += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+            self.counts[index] += 1
+            for (width, size), slots in zip(TIERS, self._slots):
+                slot_id = int(now // width)
+                slot = slots[slot_id % size]
+                if slot is None or slot[0] != slot_id:
+                    slot = slots[slot_id % size] = [slot_id, 0.0, [0] * len(self.counts)]
+                slot[1] += value
+                slot[2][index] += 1
+
+    def window(self, seconds, now=None):
+        """(nombre, somme, compteurs) des observations des `seconds` dernières secondes"""
+        now = time.time() if now is None else now
+        tier = next(
+            (i for i, (width, size) in enumerate(TIERS) if width * size >= seconds),
+            len(TIERS) - 1,
+        )
+        width, _ = TIERS[tier]
+        # Tranche en cours comprise : la fenêtre couvre au plus `seconds` + une tranche partielle
+        oldest = int(now // width) - max(int(seconds // width), 1) + 1
+        count, total = 0, 0.0
+        counts = [0] * len(self.counts)
+        with self._lock:
+            for slot in self._slots[tier]:
+                if slot is not None and slot[0] >= oldest:
+                    total += slot[1]
+                    for index, bucket_count in enumerate(slot[2]):
+                        if bucket_count:
+                            counts[index] += bucket_count
+                            count += bucket_count
+        return count, total, counts
+
+    def percentile(self, q, window=None):
+        """Percentile q (0-1) depuis le démarrage, ou sur une fenêtre de WINDOWS ("1m", "5m", "1h")"""
+        if window is None:
+            with self._lock:
+                counts, count = list(self.counts), self.count
+        else:
+            count, _, counts = self.window(WINDOWS[window])
+        return _percentile(counts, count, q, self.max)
+
+    def summary(self):
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.total
+            min_value, max_value = self.min, self.max
+        result = {
+            "count": count,
+            "avg_time": total / count if count > 0 else 0,
+            "min_time": min_value if min_value != float("inf") else 0,
+            "max_time": max_value,
+            "p50": _percentile(counts, count, 0.50, max_value),
+            "p95": _percentile(counts, count, 0.95, max_value),
+            "p99": _percentile(counts, count, 0.99, max_value),
+            "windows": {},
+        }
+        for name, seconds in WINDOWS.items():
+            window_count, window_total, window_counts = self.window(seconds)
+            result["windows"][name] = {
+                "count": window_count,
+                "avg_time": window_total / window_count if window_count > 0 else 0,
+                "p50": _percentile(window_counts, window_count, 0.50, max_value),
+                "p95": _percentile(window_counts, window_count, 0.95, max_value),
+                "p99": _percentile(window_counts, window_count, 0.99, max_value),
+            }
+        return result
+
+    def prometheus_buckets(self):
+        """Compteurs cumulés aux bornes PROMETHEUS_BUCKETS, et la somme des durées"""
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.total
+        buckets = []
+        cumulative = 0
+        index = 0
+        for le in PROMETHEUS_BUCKETS:
+            while index < len(BUCKET_BOUNDS) and BUCKET_BOUNDS[index] <= le:
+                cumulative += counts[index]
+                index += 1
+            buckets.append((floatToGoString(le), cumulative))
+        buckets.append(("+Inf", count))
+        return buckets, total
+
+
+# Étapes mesurées pendant la requête en cours : nom -> [durée totale, nombre d'appels].
+# Le dictionnaire est créé par MonitoringMiddleware et partagé avec les threads
+# lancés par run_db (copie du contexte), qui y ajoutent leurs étapes.
+request_timings_var = ContextVar("request_timings", default=None)
+
+def _add_request_timing(name, duration):
+    timings = request_timings_var.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += duration
+        entry[1] += 1
+
+
+class Span:
+    """Étape mesurée : histogramme "stage.<nom>", en-tête Server-Timing et span_id des logs"""
+
+    __slots__ = ("name", "_start", "_token")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._token = current_span_var.set(os.urandom(8).hex())
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        current_span_var.reset(self._token)
+        PerformanceMonitor.record_metric(f"stage.{self.name}", duration)
+        _add_request_timing(self.name, duration)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+# Histogrammes communs à tous les processus du serveur (METRICS_SHARED_DIR)
+_shared_store = SharedMetricsStore(
+    SHARED_METRICS_CONFIG["dir"], BUCKET_BOUNDS, TIERS, OVERFLOW_KEY,
+    snapshot_file=SHARED_METRICS_CONFIG["snapshot_file"],
+) if SHARED_METRICS_CONFIG["dir"] else None
 
-# Variable de contexte pour suivre les requêtes
-request_id_var = ContextVar("request_id", default=None)
-current_span_var = ContextVar("current_span", default=None)
 
 class PerformanceMonitor:
     """Utilitaire pour suivre les performances des fonctions et méthodes"""
     
+    # clé -> LatencyHistogram, ou SharedSeries du fichier du processus avec METRICS_SHARED_DIR
     _metrics = {}
+    _metrics_lock = threading.Lock()
     
     @classmethod
     def time_function(cls, func):
-        """Décorateur pour mesurer le temps d'exécution d'une fonction"""
+        """Décorateur pour mesurer le temps d'exécution d'une fonction (synchrone ou async), avec journalisation"""
+        function_name = f"{func.__module__}.{func.__name__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with cls._timed_call(function_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
         @functools.wraps(func)
-        async def wrapper(*args, **kwargs):
-            function_name = f"{func.__module__}.{func.__name__}"
-            start_time = time.time()
-            request_id = request_id_var.get()
-            parent_span = current_span_var.get()
+        def wrapper(*args, **kwargs):
+            with cls._timed_call(function_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    @classmethod
+    @contextmanager
+    def _timed_call(cls, function_name):
+        start_time = time.time()
+        request_id = request_id_var.get()
+        parent_span = current_span_var.get()
+        
+        # Créer un nouveau span (segment de trace)
+        span_id = str(uuid.uuid4())
+        token = current_span_var.set(span_id)
+        
+        logger = logging.getLogger(function_name)
+        logger.info(f"[{request_id}][{span_id}] DÉBUT: parent={parent_span}")
+        
+        try:
+            # Exécuter la fonction
+            yield
             
-            # Créer un nouveau span (segment de trace)
-            span_id = str(uuid.uuid4())
-            current_span_var.set(span_id)
+            # Mesurer le temps d'exécution
+            execution_time = time.time() - start_time
             
-            logger = logging.getLogger(function_name)
-            logger.info(f"[{request_id}][{span_id}] DÉBUT: parent={parent_span}")
+            # Stocker les métriques
+            cls.record_metric(function_name, execution_time)
+            _add_request_timing(function_name, execution_time)
             
-            try:
-                # Exécuter la fonction
-                result = await func(*args, **kwargs)
-                
-                # Mesurer le temps d'exécution
-                execution_time = time.time() - start_time
-                
-                # Stocker les métriques
-                if function_name not in cls._metrics:
-                    cls._metrics[function_name] = {
-                        "count": 0,
-                        "total_time": 0,
-                        "min_time": float("inf"),
-                        "max_time": 0
-                    }
-                
-                cls._metrics[function_name]["count"] += 1
-                cls._metrics[function_name]["total_time"] += execution_time
-                cls._metrics[function_name]["min_time"] = min(cls._metrics[function_name]["min_time"], execution_time)
-                cls._metrics[function_name]["max_time"] = max(cls._metrics[function_name]["max_time"], execution_time)
-                
-                # Journaliser la fin de l'exécution
-                logger.info(f"[{request_id}][{span_id}] FIN: durée={execution_time:.4f}s - succès")
-                
-                return result
-            except Exception as e:
-                # En cas d'erreur, journaliser l'exception
-                execution_time = time.time() - start_time
-                logger.error(f"[{request_id}][{span_id}] ERREUR: durée={execution_time:.4f}s - {str(e)}")
-                logger.error(f"[{request_id}][{span_id}] TRACE: {traceback.format_exc()}")
-                raise
-            finally:
-                # Restaurer le span parent
-                current_span_var.set(parent_span)
-        
-        return wrapper
+            # Journaliser la fin de l'exécution
+            logger.info(f"[{request_id}][{span_id}] FIN: durée={execution_time:.4f}s - succès")
+        except Exception as e:
+            # En cas d'erreur, journaliser l'exception
+            execution_time = time.time() - start_time
+            logger.error(f"[{request_id}][{span_id}] ERREUR: durée={execution_time:.4f}s - {str(e)}")
+            logger.error(f"[{request_id}][{span_id}] TRACE: {traceback.format_exc()}")
+            raise
+        finally:
+            # Restaurer le span parent
+            current_span_var.reset(token)
+
+    @classmethod
+    def span(cls, name):
+        """Étape mesurée, en bloc with (ou async with) : with PerformanceMonitor.span("ocr.regex"): ..."""
+        return Span(name)
+
+    @classmethod
+    def trace(cls, name=None):
+        """
+        Décorateur d'étape pour une fonction synchrone ou async, sans journalisation.
+
+        La durée va dans l'histogramme "stage.<nom>" et dans l'en-tête Server-Timing
+        de la requête en cours ; nom par défaut : module.fonction.
+        """
+        def decorator(func):
+            stage = name or f"{func.__module__}.{func.__name__}"
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with Span(stage):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with Span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
     
     @classmethod
     def record_endpoint_metrics(cls, path, method, execution_time):
         """Enregistrer les métriques pour un endpoint"""
-        endpoint_key = f"{method} {path}"
-        
-        if endpoint_key not in cls._metrics:
-            cls._metrics[endpoint_key] = {
-                "count": 0,
-                "total_time": 0,
-                "min_time": float("inf"),
-                "max_time": 0
-            }
-        
-        cls._metrics[endpoint_key]["count"] += 1
-        cls._metrics[endpoint_key]["total_time"] += execution_time
-        cls._metrics[endpoint_key]["min_time"] = min(cls._metrics[endpoint_key]["min_time"], execution_time)
-        cls._metrics[endpoint_key]["max_time"] = max(cls._metrics[endpoint_key]["max_time"], execution_time)
+        cls.record_metric(f"{method} {path}", execution_time)
+
+    @classmethod
+    def record_metric(cls, metric_key, execution_time):
+        """Enregistrer une durée sous une clé arbitraire (ex: attente du pool de connexions)"""
+        histogram = cls._metrics.get(metric_key)
+        if histogram is None:
+            with cls._metrics_lock:
+                histogram = cls._metrics.get(metric_key)
+                if histogram is None:
+                    if _shared_store is not None:
+                        # La clé de débordement est choisie par le fichier partagé
+                        histogram = _shared_store.series(metric_key)
+                    else:
+                        if len(cls._metrics) >= HISTOGRAM_CONFIG["max_series"]:
+                            metric_key = OVERFLOW_KEY
+                        histogram = cls._metrics.get(metric_key) or LatencyHistogram()
+                    cls._metrics[metric_key] = histogram
+        histogram.record(execution_time)
+
+    @classmethod
+    def _histograms(cls, scope="host"):
+        """
+        clé -> LatencyHistogram ; scope "host" : tous les processus du serveur
+        (avec METRICS_SHARED_DIR), "process" : le processus courant.
+        """
+        if _shared_store is None:
+            return dict(cls._metrics)
+        if scope == "process":
+            metrics_file = _shared_store.local()
+            items = metrics_file.items() if metrics_file is not None else []
+            return {name: LatencyHistogram.from_state(series.state()) for name, series in items}
+        total = _shared_store.collect()
+        try:
+            return {name: LatencyHistogram.from_state(series.state()) for name, series in total.items()}
+        finally:
+            total.close()
+
+    @classmethod
+    def percentile(cls, metric_key, q, window=None):
+        """Percentile q (0-1) d'une clé dans ce processus, depuis le démarrage ou sur une fenêtre ("1m", "5m", "1h")"""
+        histogram = cls._metrics.get(metric_key)
+        if histogram is not None and _shared_store is not None:
+            histogram = LatencyHistogram.from_state(histogram.state())
+        return histogram.percentile(q, window) if histogram is not None else 0
     
     @classmethod
-    def get_metrics(cls):
-        """Récupérer les métriques collectées"""
-        result = {}
-        for endpoint_name, metrics in cls._metrics.items():
-            result[endpoint_name] = {
-                "count": metrics["count"],
-                "avg_time": metrics["total_time"] / metrics["count"] if metrics["count"] > 0 else 0,
-                "min_time": metrics["min_time"] if metrics["min_time"] != float("inf") else 0,
-                "max_time": metrics["max_time"]
-            }
-        return result
+    def get_metrics(cls, scope="host"):
+        """
+        Récupérer les métriques collectées, avec percentiles depuis le démarrage et par fenêtre.
+
+        Avec METRICS_SHARED_DIR, scope "host" additionne tous les processus du
+        serveur (workers, processus OCR), archives des processus terminés comprises.
+        """
+        return {name: histogram.summary() for name, histogram in cls._histograms(scope).items()}
+
+    @classmethod
+    def prometheus_text(cls):
+        """Métriques au format texte d'exposition Prometheus"""
+        return generate_latest(_prometheus_registry)
     
     @classmethod
     def reset_metrics(cls):
         """Réinitialiser les métriques"""
         cls._metrics = {}
+        cls._metrics_lock = threading.Lock()
 
-class MonitoringMiddleware(BaseHTTPMiddleware):
-    """Middleware pour surveiller les requêtes HTTP"""
-    
-    async def dispatch(self, request: Request, call_next):
+
+def _after_fork():
+    # Processus enfant (pool OCR en fork) : ne pas écrire dans le fichier du parent
+    PerformanceMonitor.reset_metrics()
+    if _shared_store is not None:
+        _shared_store.after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def start_shared_metrics():
+    """Archivage des processus terminés et instantanés périodiques (METRICS_SNAPSHOT_FILE)"""
+    if _shared_store is not None:
+        _shared_store.start_snapshots()
+
+def stop_shared_metrics():
+    if _shared_store is not None:
+        _shared_store.stop_snapshots()
+
+def get_shared_metrics_stats():
+    """Fichiers de métriques partagés entre processus, pour le monitoring"""
+    if _shared_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **_shared_store.stats()}
+
+
+class _PerformanceCollector:
+    """Collecteur prometheus_client : un histogramme par clé de PerformanceMonitor"""
+
+    def collect(self):
+        family = HistogramMetricFamily(
+            "ocr_app_duration_seconds",
+            "Durées enregistrées par PerformanceMonitor (endpoints, fonctions, attentes)",
+            labels=["metric"],
+        )
+        for name, histogram in PerformanceMonitor._histograms().items():
+            buckets, total = histogram.prometheus_buckets()
+            family.add_metric([name], buckets, total)
+        yield family
+
+_prometheus_registry = CollectorRegistry(auto_describe=False)
+_prometheus_registry.register(_PerformanceCollector())
+
+MONITORING_CONFIG = {
+    # Part des requêtes JSON / formulaire dont le début du corps est journalisé (0 : jamais)
+    "body_sample_rate": float(os.getenv("MONITORING_BODY_SAMPLE_RATE", "0.01")),
+    # Octets du corps gardés au plus pour le journal ; au-delà le corps n'est pas journalisé
+    "body_max_bytes": int(os.getenv("MONITORING_BODY_MAX_BYTES", "2048")),
+}
+
+# Seuls ces corps peuvent être journalisés : jamais les envois multipart (images) ni les binaires
+LOGGABLE_CONTENT_TYPES = ("application/json", "application/x-www-form-urlencoded")
+# Nom d'une métrique Server-Timing : un token HTTP
+SERVER_TIMING_INVALID = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+SERVER_TIMING_MAX_ENTRIES = 40
+SENSITIVE_FIELDS = {"password", "mot_de_passe", "token", "access_token", "refresh_token", "secret"}
+
+
+def _route_path(scope):
+    """Chemin de la route trouvée (/api/facture/{facture_id}) : une série par route, pas par facture"""
+    route = scope.get("route")
+    return getattr(route, "path", scope["path"])
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1").lower()
+    return ""
+
+def _server_timing(timings, total):
+    """En-tête Server-Timing : durée (ms) et nombre d'appels de chaque étape, puis le total"""
+    entries = []
+    for name, (duration, count) in list(timings.items())[:SERVER_TIMING_MAX_ENTRIES]:
+        entry = f"{SERVER_TIMING_INVALID.sub('_', name)};dur={duration * 1000:.1f}"
+        if count > 1:
+            entry += f';desc="x{count}"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries).encode("latin-1")
+
+def _mask(value):
+    if isinstance(value, dict):
+        return {k: "***MASQUÉ***" if k.lower() in SENSITIVE_FIELDS else _mask(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_mask(v) for v in value]
+    return value
+
+def _parse_body(body_bytes, content_type):
+    """Corps complet décodé, mots de passe et tokens masqués"""
+    try:
+        if content_type.startswith("application/json"):
+            return _mask(json.loads(body_bytes))
+        fields = urllib.parse.parse_qs(body_bytes.decode("utf-8"), keep_blank_values=True)
+        return _mask({k: v[0] if len(v) == 1 else v for k, v in fields.items()})
+    except (ValueError, UnicodeDecodeError):
+        return "<corps illisible>"
+
+
+class MonitoringMiddleware:
+    """
+    Middleware ASGI pour surveiller les requêtes HTTP.
+
+    Le corps de la requête n'est jamais lu à la place du handler : les envois
+    d'images passent en flux jusqu'à l'endpoint. Pour une part des requêtes
+    JSON ou formulaire (body_sample_rate), les premiers octets sont copiés au
+    passage et journalisés une fois la requête terminée. Chaque requête donne
+    une seule ligne de journal compacte ; le temps passé dans le middleware
+    lui-même est enregistré sous la métrique "monitoring.overhead".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
         # Générer un ID unique pour la requête
         request_id = str(uuid.uuid4())
         request_id_var.set(request_id)
         current_span_var.set(None)
-        
-        # Récupérer les informations de la requête
-        path = request.url.path
-        method = request.method
-        
-        # Journaliser le début de la requête
-        start_time = time.time()
-        logger.info(f"[{request_id}] REQUÊTE DÉBUT: {method} {path}")
-        
-        # Récupérer les paramètres de la requête
-        query_params = dict(request.query_params)
-        headers = dict(request.headers)
-        sensitive_headers = ["authorization", "cookie"]
-        for header in sensitive_headers:
-            if header in headers:
-                headers[header] = "***MASQUÉ***"
-        
-        body = None
-        if method in ["POST", "PUT", "PATCH"]:
-            try:
-                # Essayer de lire le corps de la requête
-                body_bytes = await request.body()
-                request._body = body_bytes  # Restaurer le corps pour les handlers suivants
-                
-                content_type = request.headers.get("content-type", "")
-                if "application/json" in content_type:
-                    body = json.loads(body_bytes)
-                elif "application/x-www-form-urlencoded" in content_type:
-                    form = await request.form()
-                    body = dict(form)
-                    # Masquer les mots de passe
-                    if "password" in body:
-                        body["password"] = "***MASQUÉ***"
-            except Exception as e:
-                logger.warning(f"[{request_id}] Impossible de lire le corps de la requête: {str(e)}")
-        
-        request_details = {
-            "method": method,
-            "path": path,
-            "query_params": query_params,
-            "headers": headers,
-            "body": body
-        }
-        
-        logger.info(f"[{request_id}] DÉTAILS REQUÊTE: {json.dumps(request_details, indent=2, default=str)}")
-        
+        timings = {}
+        request_timings_var.set(timings)
+        method = scope["method"]
+
+        response_status = None
+        body_capture = None
+        if method in ("POST", "PUT", "PATCH") and random.random() < MONITORING_CONFIG["body_sample_rate"]:
+            content_type = _header(scope, b"content-type")
+            if content_type.startswith(LOGGABLE_CONTENT_TYPES):
+                body_capture = {"content_type": content_type, "chunks": [], "size": 0}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request" and body_capture["size"] <= MONITORING_CONFIG["body_max_bytes"]:
+                # Copie bornée des morceaux lus par le handler, sans rien lire de plus
+                chunk = message.get("body", b"")
+                body_capture["size"] += len(chunk)
+                if body_capture["size"] <= MONITORING_CONFIG["body_max_bytes"]:
+                    body_capture["chunks"].append(chunk)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+                # En-têtes ajoutés au début de la réponse : temps jusqu'au premier octet
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode()))
+                headers.append((b"x-response-time", f"{time.perf_counter() - start_time:.4f}s".encode()))
+                headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - start_time)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        overhead = time.perf_counter() - start_time
+        error = None
         try:
-            # Exécuter le handler de la requête
-            response = await call_next(request)
-            
-            # Mesurer le temps d'exécution
-            execution_time = time.time() - start_time
-            
-            # Enregistrer les métriques pour cet endpoint
-            PerformanceMonitor.record_endpoint_metrics(path, method, execution_time)
-            
-            # Journaliser la fin de la requête
-            logger.info(f"[{request_id}] REQUÊTE FIN: {method} {path} - statut={response.status_code}, durée={execution_time:.4f}s")
-            
-            # Ajouter des en-têtes de performance à la réponse
-            response.headers["X-Request-ID"] = request_id
-            response.headers["X-Response-Time"] = f"{execution_time:.4f}s"
-            
-            return response
+            await self.app(scope, receive_wrapper if body_capture is not None else receive, send_wrapper)
         except Exception as e:
+            error = e
+
+        post_start = time.perf_counter()
+        execution_time = post_start - start_time
+        PerformanceMonitor.record_endpoint_metrics(_route_path(scope), method, execution_time)
+
+        record = {
+            "request_id": request_id,
+            "method": method,
+            "path": scope["path"],
+            "status": response_status if response_status is not None else 500,
+            "duration": round(execution_time, 4),
+        }
+        if scope.get("query_string"):
+            record["query"] = scope["query_string"].decode("latin-1")
+        if timings:
+            record["stages"] = {name: round(total, 4) for name, (total, _) in timings.items()}
+        if body_capture is not None and body_capture["size"]:
+            if body_capture["size"] <= MONITORING_CONFIG["body_max_bytes"]:
+                record["body"] = _parse_body(b"".join(body_capture["chunks"]), body_capture["content_type"])
+            else:
+                record["body"] = f"<plus de {MONITORING_CONFIG['body_max_bytes']} octets, non journalisé>"
+
+        if error is None:
+            logger.info(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str))
+        else:
             # En cas d'erreur, journaliser l'exception
-            execution_time = time.time() - start_time
-            logger.error(f"[{request_id}] REQUÊTE ERREUR: {method} {path} - {str(e)}, durée={execution_time:.4f}s")
-            logger.error(f"[{request_id}] TRACE: {traceback.format_exc()}")
-            
-            # Enregistrer les métriques même en cas d'erreur
-            PerformanceMonitor.record_endpoint_metrics(path, method, execution_time)
-            
+            record["error"] = str(error)
+            logger.error(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str))
+            trace = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+            logger.error(f"[{request_id}] TRACE: {trace}")
+
+        # Temps passé dans le middleware avant et après le handler, journalisation comprise
+        PerformanceMonitor.record_metric("monitoring.overhead", overhead + time.perf_counter() - post_start)
+        if error is not None:
+            if response_status is not None:
+                # Réponse déjà commencée : impossible d'envoyer un 500 à la place
+                raise error
             # Créer une réponse d'erreur
-            return Response(
+            response = Response(
                 content=json.dumps({
-                    "error": str(e),
+                    "error": str(error),
                     "request_id": request_id
                 }),
                 status_code=500,
                 media_type="application/json",
                 headers={"X-Request-ID": request_id, "X-Response-Time": f"{execution_time:.4f}s"}
             )
+            await response(scope, receive, send)
 
 # Endpoint pour afficher les métriques
 async def get_metrics():
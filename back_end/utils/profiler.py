@@ -0,0 +1,232 @@
+"""
+Profileur par échantillonnage, activable à la demande sur un processus en service.
+
+Un thread relève toutes les PROFILER_INTERVAL_MS millisecondes la pile
+d'appels de chaque thread du processus (sys._current_frames) : boucle
+d'événements (middlewares, handlers, OCR lancé depuis un endpoint), threads
+de run_db, de hachage, etc. Le code mesuré n'est pas instrumenté, le coût
+est celui du thread d'échantillonnage et disparaît à l'arrêt.
+
+Résultats :
+- piles repliées ("thread;fonction;fonction... nombre"), lisibles par
+  flamegraph.pl ou speedscope ;
+- fonctions les plus présentes, en propre (en haut de pile) et au total.
+
+Les échantillons des threads en attente (Condition.wait, select de la
+boucle d'événements, file vide) sont comptés à part et exclus par défaut.
+
+Les processus OCR de l'import en masse (import_factures --profile) lancent
+le profileur pendant toute leur durée de vie et écrivent leurs piles dans un
+fichier à l'arrêt du processus.
+"""
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILER_CONFIG = {
+    "interval": float(os.getenv("PROFILER_INTERVAL_MS", "10")) / 1000,
+    "max_seconds": float(os.getenv("PROFILER_MAX_SECONDS", "60")),
+    # Cadres gardés par pile (les plus proches du haut de pile)
+    "max_depth": int(os.getenv("PROFILER_MAX_DEPTH", "64")),
+}
+
+# Haut de pile d'un thread qui attend : (fichier, fonction)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProfilerBusyError(RuntimeError):
+    """Un profilage est déjà en cours dans ce processus"""
+
+
+def _short_path(path):
+    """Chemin lisible : relatif au paquet installé ou au projet, nom du fichier pour la bibliothèque standard"""
+    for marker in ("site-packages", "dist-packages"):
+        index = path.rfind(marker + os.sep)
+        if index >= 0:
+            return path[index + len(marker) + 1:]
+    if path.startswith(PROJECT_ROOT + os.sep):
+        return path[len(PROJECT_ROOT) + 1:]
+    parent, name = os.path.split(path)
+    return f"{os.path.basename(parent)}/{name}" if name == "__init__.py" else name
+
+
+class SamplingProfiler:
+    """Échantillonnage périodique des piles de tous les threads du processus"""
+
+    def __init__(self, interval=None, max_depth=None, include_idle=False):
+        self.interval = interval or PROFILER_CONFIG["interval"]
+        self.max_depth = max_depth or PROFILER_CONFIG["max_depth"]
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.duration = 0.0
+        self._labels = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self, seconds):
+        """Profiler pendant `seconds` secondes (bloquant)"""
+        self.start()
+        self._stopped.wait(seconds)
+        self.stop()
+        return self
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+            self._labels[code] = label
+        return label
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        thread_names = {}
+        start_time = time.perf_counter()
+        next_sample = start_time
+        while not self._stopped.is_set():
+            frames = sys._current_frames()
+            if frames.keys() - thread_names.keys():
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own_ident:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    self.idle_samples += 1
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, f"thread-{ident}").replace(";", ","))
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+            self.samples += 1
+            del frames
+            # Cadence fixe : le temps d'échantillonnage est pris sur l'intervalle
+            next_sample += self.interval
+            self._stopped.wait(max(0.0, next_sample - time.perf_counter()))
+        self.duration = time.perf_counter() - start_time
+
+    def collapsed(self):
+        return format_collapsed(self.stacks)
+
+    def top(self, limit=30):
+        return top_functions(self.stacks, limit)
+
+    def report(self, limit=30):
+        return {
+            "duration": round(self.duration, 3),
+            "interval": self.interval,
+            "samples": self.samples,
+            "idle_samples": self.idle_samples,
+            "top": self.top(limit),
+            "collapsed": self.collapsed(),
+        }
+
+    def dump(self, path):
+        """Écrire les piles repliées dans un fichier"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(format_collapsed(self.stacks))
+
+
+def format_collapsed(stacks):
+    """Piles repliées, une par ligne : "thread;appelant;...;appelé nombre" """
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks, limit=30):
+    """Fonctions les plus échantillonnées : en propre (haut de pile) et au total (présentes dans la pile)"""
+    self_counts = Counter()
+    total_counts = Counter()
+    total = sum(stacks.values())
+    for stack, count in stacks.items():
+        frames = stack[1:]
+        if not frames:
+            continue
+        self_counts[frames[-1]] += count
+        for frame in set(frames):
+            total_counts[frame] += count
+    return [
+        {
+            "function": function,
+            "self": self_counts[function],
+            "total": total_counts[function],
+            "self_percent": round(100 * self_counts[function] / total, 1) if total else 0,
+            "total_percent": round(100 * total_counts[function] / total, 1) if total else 0,
+        }
+        for function, _ in sorted(total_counts.items(), key=lambda item: (-self_counts[item[0]], -item[1]))[:limit]
+    ]
+
+
+_profile_lock = threading.Lock()
+
+
+def profile(seconds, interval=None, include_idle=False, limit=30):
+    """
+    Profiler le processus courant pendant `seconds` secondes (bloquant, à lancer hors de la boucle).
+
+    Un seul profilage à la fois par processus : ProfilerBusyError sinon.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("Un profilage est déjà en cours dans ce processus")
+    try:
+        seconds = min(seconds, PROFILER_CONFIG["max_seconds"])
+        return SamplingProfiler(interval, include_idle=include_idle).run(seconds).report(limit)
+    finally:
+        _profile_lock.release()
+
+
+def start_process_profiler(output_dir, interval=None):
+    """
+    Profiler le processus jusqu'à sa fin et écrire ses piles dans
+    <output_dir>/profile-<pid>.collapsed (processus d'un pool multiprocessing).
+    """
+    from multiprocessing import util
+
+    os.makedirs(output_dir, exist_ok=True)
+    profiler = SamplingProfiler(interval).start()
+
+    def finish():
+        profiler.stop()
+        profiler.dump(os.path.join(output_dir, f"profile-{os.getpid()}.collapsed"))
+
+    # Les finaliseurs de multiprocessing sont exécutés à la sortie normale d'un processus du pool
+    util.Finalize(None, finish, exitpriority=10)
+    return profiler
+
+
+def merge_collapsed(paths):
+    """Additionner des fichiers de piles repliées"""
+    stacks = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    stacks[tuple(stack.split(";"))] += int(count)
+    return stacks
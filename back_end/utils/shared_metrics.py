@@ -0,0 +1,500 @@
+"""
+Histogrammes de durées partagés entre processus, dans des fichiers mappés en mémoire.
+
+Chaque processus (workers uvicorn, processus OCR de l'import en masse) écrit
+ses observations dans son propre fichier METRICS_SHARED_DIR/process-<pid>.bin :
+un seul écrivain par fichier, les compteurs sont incrémentés directement dans
+la mémoire partagée, sans verrou entre processus ni appel système. La
+lecture (/metrics) additionne les fichiers de tous les processus du serveur.
+
+Un processus garde un verrou flock sur son fichier tant qu'il vit. Le fichier
+d'un processus terminé est ajouté à archive.bin puis supprimé (au démarrage
+d'un processus et à chaque instantané) : les totaux survivent aux
+redémarrages. Un verrou sur METRICS_SHARED_DIR/.lock (partagé pour lire,
+exclusif pour cet ajout) évite de compter deux fois un fichier pendant son
+transfert.
+
+Avec METRICS_SNAPSHOT_FILE, un thread écrit toutes les
+METRICS_SNAPSHOT_INTERVAL secondes la somme de tous les fichiers, au même
+format ; elle sert d'archive si le dossier est vide au démarrage (dossier en
+/dev/shm effacé par un redémarrage de la machine).
+
+Format d'un fichier : un en-tête puis max_series enregistrements de taille
+fixe, un par clé : nom, nombre, somme, minimum, maximum, compteurs par tranche
+de bornes, puis pour chaque niveau de tranches de temps un anneau (numéro de
+tranche, somme, compteurs). Les fichiers sont créés creux : seules les pages
+des clés utilisées occupent de la place.
+"""
+import os
+import glob
+import mmap
+import time
+import zlib
+import struct
+import bisect
+import logging
+import operator
+import threading
+from array import array
+
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:
+    # Windows : pas de flock, seules les métriques propres à chaque processus sont disponibles
+    fcntl = None
+
+load_dotenv()
+
+logger = logging.getLogger("shared_metrics")
+
+SHARED_METRICS_CONFIG = {
+    # Dossier des fichiers partagés (vide : métriques propres à chaque processus)
+    "dir": os.getenv("METRICS_SHARED_DIR", ""),
+    # Clés par fichier ; au-delà, les nouvelles clés sont regroupées sous la clé de débordement
+    "max_series": int(os.getenv("METRICS_SHARED_MAX_SERIES", "256")),
+    # Instantané périodique de la somme de tous les processus (vide : pas d'instantané)
+    "snapshot_file": os.getenv("METRICS_SNAPSHOT_FILE", ""),
+    "snapshot_interval": float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "300")),
+}
+
+MAGIC = b"OCRM"
+VERSION = 1
+# magic, version, empreinte du format, nombre de clés, pid, date de création
+HEADER = struct.Struct("<4sIIIQd")
+HEADER_SIZE = 64
+SERIES_OFFSET = struct.calcsize("<4sII")
+KEY_SIZE = 192
+ARCHIVE_NAME = "archive.bin"
+
+
+class SharedMetricsLayout:
+    """Emplacement des compteurs d'une clé, pour des bornes et des niveaux de tranches donnés"""
+
+    def __init__(self, bounds, tiers, max_series):
+        self.bounds = bounds
+        self.tiers = tiers
+        self.max_series = max_series
+        # Une case de plus pour les durées au-delà de la dernière borne
+        self.bucket_count = len(bounds) + 1
+        self.fingerprint = zlib.crc32(repr((VERSION, bounds, tiers, max_series)).encode())
+
+        offset = KEY_SIZE
+        # nombre (Q), puis somme, minimum, maximum (d)
+        self.count_offset = offset
+        self.values_offset = offset + 8
+        offset += 32
+        self.counts_offset = offset
+        offset += 8 * self.bucket_count
+        self.tier_offsets = []
+        for _, size in tiers:
+            # numéros de tranche (q), sommes (d), compteurs (I)
+            self.tier_offsets.append((offset, offset + 8 * size, offset + 16 * size))
+            offset += 16 * size + 4 * size * self.bucket_count
+        self.record_size = (offset + 7) // 8 * 8
+        self.file_size = HEADER_SIZE + max_series * self.record_size
+        self.zero_slot = array("I", bytes(4 * self.bucket_count))
+
+
+class SharedSeries:
+    """Compteurs d'une clé dans un fichier (écrits par le seul processus propriétaire)"""
+
+    def __init__(self, layout, buffer, offset):
+        self.layout = layout
+        self._lock = threading.Lock()
+        self._count = buffer[offset + layout.count_offset:offset + layout.values_offset].cast("Q")
+        self._values = buffer[offset + layout.values_offset:offset + layout.counts_offset].cast("d")
+        self._counts = buffer[offset + layout.counts_offset:offset + layout.tier_offsets[0][0]].cast("Q")
+        self._tiers = []
+        for (_, size), (ids_offset, sums_offset, counts_offset) in zip(layout.tiers, layout.tier_offsets):
+            self._tiers.append((
+                buffer[offset + ids_offset:offset + sums_offset].cast("q"),
+                buffer[offset + sums_offset:offset + counts_offset].cast("d"),
+                buffer[offset + counts_offset:offset + counts_offset + 4 * size * layout.bucket_count].cast("I"),
+            ))
+
+    def initialize(self):
+        self._values[1] = float("inf")
+
+    def record(self, value, now=None):
+        layout = self.layout
+        index = bisect.bisect_left(layout.bounds, value)
+        now = time.time() if now is None else now
+        with self._lock:
+            self._count[0] += 1
+            values = self._values
+            values[0] += value
+            if value < values[1]:
+                values[1] = value
+            if value > values[2]:
+                values[2] = value
+            self._counts[index] += 1
+            for (width, size), (ids, sums, counts) in zip(layout.tiers, self._tiers):
+                slot_id = int(now // width)
+                position = slot_id % size
+                start = position * layout.bucket_count
+                if ids[position] != slot_id:
+                    ids[position] = slot_id
+                    sums[position] = 0.0
+                    counts[start:start + layout.bucket_count] = layout.zero_slot
+                sums[position] += value
+                counts[start + index] += 1
+
+    def merge(self, other):
+        """Ajouter les compteurs d'une autre clé (même format) à ceux-ci"""
+        bucket_count = self.layout.bucket_count
+        with self._lock:
+            self._count[0] += other._count[0]
+            self._values[0] += other._values[0]
+            self._values[1] = min(self._values[1], other._values[1])
+            self._values[2] = max(self._values[2], other._values[2])
+            self._counts[:] = array("Q", map(operator.add, self._counts, other._counts))
+            for (ids, sums, counts), (other_ids, other_sums, other_counts) in zip(self._tiers, other._tiers):
+                for position, slot_id in enumerate(other_ids):
+                    if slot_id == 0 or slot_id < ids[position]:
+                        continue
+                    start = position * bucket_count
+                    end = start + bucket_count
+                    if slot_id == ids[position]:
+                        sums[position] += other_sums[position]
+                        counts[start:end] = array("I", map(operator.add, counts[start:end], other_counts[start:end]))
+                    else:
+                        ids[position] = slot_id
+                        sums[position] = other_sums[position]
+                        counts[start:end] = other_counts[start:end]
+
+    def state(self):
+        """(nombre, somme, minimum, maximum, compteurs, tranches) ; tranches : par niveau, [numéro, somme, compteurs] ou None"""
+        bucket_count = self.layout.bucket_count
+        with self._lock:
+            slots = []
+            for ids, sums, counts in self._tiers:
+                slots.append([
+                    [slot_id, sums[position], counts[position * bucket_count:(position + 1) * bucket_count].tolist()]
+                    if slot_id else None
+                    for position, slot_id in enumerate(ids)
+                ])
+            return (self._count[0], self._values[0], self._values[1], self._values[2], self._counts.tolist(), slots)
+
+    def release(self):
+        for view in (self._count, self._values, self._counts, *(v for tier in self._tiers for v in tier)):
+            view.release()
+
+
+class MetricsFile:
+    """Fichier de métriques (ou tampon mémoire) : en-tête et enregistrements de taille fixe"""
+
+    def __init__(self, layout, buffer, writable=True, path=None, handle=None, capacity=None):
+        self.layout = layout
+        self.path = path
+        self.capacity = capacity or layout.max_series
+        self._mmap = buffer
+        self._buffer = memoryview(buffer)
+        self._handle = handle
+        self._writable = writable
+        self._series = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, layout, path, handle):
+        """Initialiser un fichier ouvert en écriture (handle : descripteur de fichier)"""
+        os.ftruncate(handle, layout.file_size)
+        buffer = mmap.mmap(handle, layout.file_size)
+        buffer[:HEADER.size] = HEADER.pack(MAGIC, VERSION, layout.fingerprint, 0, os.getpid(), time.time())
+        return cls(layout, buffer, path=path, handle=handle)
+
+    @classmethod
+    def open(cls, layout, path, writable=False):
+        """Ouvrir un fichier existant ; None s'il est absent, vide ou d'un autre format"""
+        try:
+            handle = os.open(path, os.O_RDWR if writable else os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            if os.fstat(handle).st_size != layout.file_size:
+                os.close(handle)
+                return None
+            buffer = mmap.mmap(handle, layout.file_size, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            os.close(handle)
+            return None
+        magic, version, fingerprint = struct.unpack_from("<4sII", buffer)
+        if (magic, version, fingerprint) != (MAGIC, VERSION, layout.fingerprint):
+            buffer.close()
+            os.close(handle)
+            return None
+        return cls(layout, buffer, writable=writable, path=path, handle=handle)
+
+    @classmethod
+    def in_memory(cls, layout, capacity):
+        """Tampon mémoire pour `capacity` clés (somme de plusieurs fichiers)"""
+        buffer = bytearray(HEADER_SIZE + capacity * layout.record_size)
+        buffer[:HEADER.size] = HEADER.pack(MAGIC, VERSION, layout.fingerprint, 0, 0, time.time())
+        return cls(layout, buffer, capacity=capacity)
+
+    @property
+    def series_count(self):
+        return struct.unpack_from("<I", self._mmap, SERIES_OFFSET)[0]
+
+    def _key(self, number):
+        offset = HEADER_SIZE + number * self.layout.record_size
+        return bytes(self._buffer[offset:offset + KEY_SIZE]).rstrip(b"\0").decode("utf-8", errors="replace")
+
+    def _view(self, number):
+        return SharedSeries(self.layout, self._buffer, HEADER_SIZE + number * self.layout.record_size)
+
+    def items(self):
+        """(clé, SharedSeries) des clés du fichier"""
+        with self._lock:
+            for number in range(len(self._series), min(self.series_count, self.capacity)):
+                self._series.setdefault(self._key(number), self._view(number))
+            return list(self._series.items())
+
+    def series(self, key, overflow_key):
+        """Compteurs d'une clé, créés si besoin ; la dernière place est gardée pour overflow_key"""
+        series = self._series.get(key)
+        if series is not None:
+            return series
+        with self._lock:
+            series = self._series.get(key)
+            if series is not None:
+                return series
+            number = self.series_count
+            if number >= self.capacity - 1 and key != overflow_key:
+                return None
+            encoded = key.encode("utf-8")[:KEY_SIZE]
+            offset = HEADER_SIZE + number * self.layout.record_size
+            self._buffer[offset:offset + len(encoded)] = encoded
+            series = self._series[key] = self._view(number)
+            series.initialize()
+            # Publiée en dernier : un lecteur ne voit la clé qu'une fois initialisée
+            struct.pack_into("<I", self._mmap, SERIES_OFFSET, number + 1)
+            return series
+
+    def merge(self, other, overflow_key):
+        """Ajouter toutes les clés d'un autre fichier à celui-ci"""
+        for key, series in other.items():
+            target = self.series(key, overflow_key) or self.series(overflow_key, overflow_key)
+            target.merge(series)
+
+    def write_to(self, path):
+        """Écrire le contenu dans un fichier au format complet, remplacé d'un coup"""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(self._buffer)
+            f.truncate(self.layout.file_size)
+        os.replace(temporary, path)
+
+    def close(self):
+        for series in self._series.values():
+            series.release()
+        self._series = {}
+        self._buffer.release()
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        if self._handle is not None:
+            os.close(self._handle)
+            self._handle = None
+
+
+class SharedMetricsStore:
+    """Fichiers de métriques des processus d'un même serveur, dans un dossier"""
+
+    def __init__(self, directory, bounds, tiers, overflow_key, max_series=None, snapshot_file=None):
+        if fcntl is None:
+            raise RuntimeError("METRICS_SHARED_DIR nécessite fcntl.flock (Linux, macOS)")
+        self.directory = directory
+        self.layout = SharedMetricsLayout(bounds, tiers, max_series or SHARED_METRICS_CONFIG["max_series"])
+        self.overflow_key = overflow_key
+        self.snapshot_file = snapshot_file
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._snapshot_thread = None
+        self._stopped = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._lock_path = os.path.join(directory, ".lock")
+        if snapshot_file:
+            self._restore_snapshot()
+
+    def _dir_lock(self, operation):
+        handle = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(handle, operation)
+        return handle
+
+    @staticmethod
+    def _dir_unlock(handle):
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        os.close(handle)
+
+    def series(self, key):
+        """Compteurs d'une clé dans le fichier du processus courant"""
+        if self._pid != os.getpid():
+            self._open_process_file()
+        return self._file.series(key, self.overflow_key) or self._file.series(self.overflow_key, self.overflow_key)
+
+    def _open_process_file(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.compact()
+            path = os.path.join(self.directory, f"process-{os.getpid()}.bin")
+            # Verrou partagé du dossier : le fichier n'est pas pris pour celui d'un
+            # processus terminé entre sa création et la pose de son verrou
+            lock = self._dir_lock(fcntl.LOCK_SH)
+            try:
+                handle = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                self._file = MetricsFile.create(self.layout, path, handle)
+            finally:
+                self._dir_unlock(lock)
+            self._pid = os.getpid()
+
+    def after_fork(self):
+        """
+        Dans un processus créé par fork : oublier le fichier du parent sans y
+        toucher (il reste verrouillé et mappé par le parent).
+        """
+        if self._file is not None and self._file._handle is not None:
+            os.close(self._file._handle)
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._snapshot_thread = None
+        self._stopped = threading.Event()
+
+    def _paths(self):
+        return glob.glob(os.path.join(glob.escape(self.directory), "*.bin"))
+
+    def compact(self):
+        """Ajouter les fichiers des processus terminés à l'archive, puis les supprimer"""
+        lock = self._dir_lock(fcntl.LOCK_EX)
+        try:
+            archive_path = os.path.join(self.directory, ARCHIVE_NAME)
+            own_path = self._file.path if self._file is not None and self._pid == os.getpid() else None
+            archive = None
+            for path in self._paths():
+                if path in (archive_path, own_path):
+                    continue
+                handle = os.open(path, os.O_RDONLY)
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Processus encore en vie
+                    os.close(handle)
+                    continue
+                try:
+                    source = MetricsFile.open(self.layout, path)
+                    if source is None:
+                        logger.warning(f"Fichier de métriques ignoré (format différent): {path}")
+                    else:
+                        if archive is None:
+                            archive = self._open_archive(archive_path)
+                        archive.merge(source, self.overflow_key)
+                        source.close()
+                    os.unlink(path)
+                finally:
+                    os.close(handle)
+            if archive is not None:
+                archive.close()
+        finally:
+            self._dir_unlock(lock)
+
+    def _open_archive(self, path):
+        archive = MetricsFile.open(self.layout, path, writable=True)
+        if archive is not None:
+            return archive
+        if os.path.exists(path):
+            logger.warning(f"Archive de métriques remplacée (format différent): {path}")
+        handle = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        return MetricsFile.create(self.layout, path, handle)
+
+    def _restore_snapshot(self):
+        """Dossier vide (mémoire partagée effacée au redémarrage de la machine) : repartir du dernier instantané"""
+        lock = self._dir_lock(fcntl.LOCK_EX)
+        try:
+            if self._paths():
+                return
+            snapshot = MetricsFile.open(self.layout, self.snapshot_file)
+            if snapshot is None:
+                return
+            archive = self._open_archive(os.path.join(self.directory, ARCHIVE_NAME))
+            archive.merge(snapshot, self.overflow_key)
+            archive.close()
+            snapshot.close()
+            logger.info(f"Métriques reprises de l'instantané {self.snapshot_file}")
+        finally:
+            self._dir_unlock(lock)
+
+    def collect(self):
+        """Somme des fichiers de tous les processus, en mémoire (MetricsFile)"""
+        lock = self._dir_lock(fcntl.LOCK_SH)
+        try:
+            sources = [source for source in (MetricsFile.open(self.layout, path) for path in self._paths()) if source]
+            try:
+                keys = {key for source in sources for key, _ in source.items()}
+                total = MetricsFile.in_memory(self.layout, len(keys) + 1)
+                for source in sources:
+                    total.merge(source, self.overflow_key)
+            finally:
+                for source in sources:
+                    source.close()
+        finally:
+            self._dir_unlock(lock)
+        return total
+
+    def local(self):
+        """Fichier du processus courant (None avant sa première mesure)"""
+        return self._file if self._pid == os.getpid() else None
+
+    def snapshot(self):
+        """Écrire la somme de tous les processus dans snapshot_file"""
+        total = self.collect()
+        try:
+            total.write_to(self.snapshot_file)
+        finally:
+            total.close()
+
+    def start_snapshots(self, interval=None):
+        """Thread d'arrière-plan : archivage des processus terminés et instantané périodique"""
+        interval = interval or SHARED_METRICS_CONFIG["snapshot_interval"]
+        with self._lock:
+            if self._snapshot_thread is not None:
+                return
+            self._snapshot_thread = threading.Thread(
+                target=self._snapshot_loop, args=(interval,), name="metrics-snapshot", daemon=True
+            )
+            self._snapshot_thread.start()
+
+    def _snapshot_loop(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.compact()
+                if self.snapshot_file:
+                    self.snapshot()
+            except Exception as e:
+                logger.error(f"Instantané des métriques impossible: {e}")
+
+    def stop_snapshots(self):
+        self._stopped.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+    def stats(self):
+        files = []
+        for path in sorted(self._paths()):
+            source = MetricsFile.open(self.layout, path)
+            if source is None:
+                continue
+            pid = struct.unpack_from("<Q", source._mmap, SERIES_OFFSET + 4)[0]
+            files.append({"path": path, "pid": pid, "series": source.series_count})
+            source.close()
+        return {
+            "dir": self.directory,
+            "max_series": self.layout.max_series,
+            "file_size": self.layout.file_size,
+            "snapshot_file": self.snapshot_file or None,
+            "files": files,
+        }
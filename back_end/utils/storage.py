@@ -0,0 +1,167 @@
+"""
+Interface de stockage des données de l'application.
+
+Toutes les opérations sur les utilisateurs, les factures, les articles et le
+journal passent par get_storage(), qui renvoie l'implémentation choisie par
+STORAGE_BACKEND :
+- "postgres" (par défaut) : la base Postgres du schéma dylan
+  (back_end/classe/postgres_storage.py)
+- "sqlite" : une base SQLite embarquée, fichier ou mémoire
+  (back_end/classe/sqlite_storage.py), pour lancer l'application sur un poste
+  sans base distante et mesurer le pipeline OCR + enregistrement sans réseau
+
+Les implémentations sont importées à la demande : le mode SQLite ne
+nécessite pas de serveur Postgres joignable.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STORAGE_CONFIG = {
+    "backend": os.getenv("STORAGE_BACKEND", "postgres").lower(),
+    # Chemin de la base SQLite (":memory:" : base en mémoire, perdue à l'arrêt)
+    "sqlite_path": os.getenv("SQLITE_PATH", ":memory:"),
+}
+
+
+class InvoiceStorage(ABC):
+    """Opérations de stockage communes à toutes les implémentations"""
+
+    # Factures
+
+    @abstractmethod
+    def save_invoices_batch(self, invoices):
+        """
+        Enregistre un lot de factures, chacune réussissant ou échouant seule.
+
+        Args:
+            invoices: Liste de {"filename": ..., "data": {...}} comme envoyée par le scanner
+
+        Returns:
+            Liste de {"invoice_number", "filename", "success", "error"} dans l'ordre du lot
+        """
+
+    @abstractmethod
+    def get_existing_invoice_numbers(self, numbers):
+        """Numéros de facture déjà enregistrés parmi ceux donnés"""
+
+    @abstractmethod
+    def get_factures_page(self, email, limit=50, cursor=None, include_total=False, **filters):
+        """
+        Page de l'historique des factures d'un utilisateur.
+
+        Returns:
+            {"factures": [...], "next_cursor": str ou None, "total": int (si demandé)}
+
+        Raises:
+            ValueError: si le curseur est invalide
+        """
+
+    @abstractmethod
+    def get_facture_details(self, facture_id):
+        """Facture et ses articles, ou None si elle n'existe pas"""
+
+    @abstractmethod
+    def search_factures(self, terme, email=None, limit=20, offset=0):
+        """
+        Recherche classée de factures par numéro (même partiel), nom d'article ou nom de client.
+
+        Returns:
+            {"factures": [... avec "score" et "champs"], "next_offset": int ou None}
+
+        Raises:
+            ValueError: si le terme est trop court
+        """
+
+    @abstractmethod
+    def save_invoice_rejects(self, rows):
+        """Range des factures rejetées : liste de (nom_facture, données JSON, erreur, tentatives)"""
+
+    # Utilisateurs
+
+    @abstractmethod
+    def register_user_account(self, email, nom, prenom, date_naissance, password_hash, salt):
+        """Crée un utilisateur et son authentification ; False si l'email est déjà utilisé"""
+
+    @abstractmethod
+    def get_login_user(self, email):
+        """Informations d'authentification et profil d'un utilisateur, ou None"""
+
+    @abstractmethod
+    def update_password_hash(self, email, password_hash, salt=""):
+        """Remplace le hash du mot de passe (rehachage à la connexion)"""
+
+    @abstractmethod
+    def update_customers_from_qr(self, qr_items):
+        """Met à jour genre et date de naissance des clients à partir de QR codes décodés"""
+
+    # Clustering
+
+    @abstractmethod
+    def get_customer_features(self, date_from=None, date_to=None):
+        """
+        Caractéristiques d'achat par client (liste de dictionnaires, voir clustering.get_customer_data),
+        sur toutes les factures ou sur celles de la période [date_from, date_to]
+        """
+
+    @abstractmethod
+    def get_product_features(self, date_from=None, date_to=None):
+        """Statistiques d'achat par article (liste de dictionnaires, voir clustering.get_product_data), même période"""
+
+    # Journal
+
+    @abstractmethod
+    def write_logs(self, entries, timeout=None):
+        """
+        Écrit des entrées de journal en une fois.
+
+        Args:
+            entries: Liste de (date, fichier, erreur)
+            timeout: Attente maximale de la ressource de stockage, en secondes
+        """
+
+    def close(self):
+        """Libérer les ressources du stockage (arrêt de l'application)"""
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(backend=None, **options):
+    """Créer une implémentation de stockage ("postgres" ou "sqlite")"""
+    backend = (backend or STORAGE_CONFIG["backend"]).lower()
+    if backend == "postgres":
+        from back_end.classe.postgres_storage import PostgresStorage
+        return PostgresStorage(**options)
+    if backend == "sqlite":
+        from back_end.classe.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(options.get("path", STORAGE_CONFIG["sqlite_path"]))
+    raise ValueError(f"Stockage inconnu: {backend!r} (attendu : postgres ou sqlite)")
+
+def get_storage():
+    """Retourne le stockage de l'application, créé au premier appel"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+def set_storage(storage):
+    """Remplacer le stockage de l'application (benchmarks, tests d'intégration)"""
+    global _storage
+    with _storage_lock:
+        _storage = storage
+
+def close_storage():
+    """Fermer le stockage de l'application"""
+    global _storage
+    with _storage_lock:
+        storage, _storage = _storage, None
+    if storage is not None:
+        storage.close()
@@ -2,6 +2,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const metricsTable = document.getElementById('metrics-table');
     const logsContent = document.getElementById('logs-content');
     const refreshBtn = document.getElementById('refresh-btn');
+    const windowSelect = document.getElementById('window-select');
     
     // Fonction pour charger les métriques
     async function loadMetrics() {
@@ -12,70 +13,137 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             const data = await response.json();
             
+            // Nombre d'appels, moyenne et percentiles sur la fenêtre choisie ; min et max depuis le démarrage
+            const windowName = windowSelect.value;
             let tableHtml = '';
             for (const [endpoint, metrics] of Object.entries(data)) {
+                const stats = windowName ? metrics.windows[windowName] : metrics;
+                if (stats.count === 0) {
+                    continue;
+                }
                 tableHtml += `
                     <tr>
                         <td>${endpoint}</td>
-                        <td>${metrics.count}</td>
-                        <td>${metrics.avg_time.toFixed(4)}</td>
+                        <td>${stats.count}</td>
+                        <td>${stats.avg_time.toFixed(4)}</td>
                         <td>${metrics.min_time.toFixed(4)}</td>
                         <td>${metrics.max_time.toFixed(4)}</td>
+                        <td>${stats.p50.toFixed(4)}</td>
+                        <td>${stats.p95.toFixed(4)}</td>
+                        <td>${stats.p99.toFixed(4)}</td>
                     </tr>
                 `;
             }
             
             if (tableHtml === '') {
-                tableHtml = '<tr><td colspan="5" class="text-center">Aucune donnée disponible</td></tr>';
+                tableHtml = '<tr><td colspan="8" class="text-center">Aucune donnée disponible</td></tr>';
             }
             
             metricsTable.innerHTML = tableHtml;
         } catch (error) {
             console.error('Erreur lors du chargement des métriques:', error);
-            metricsTable.innerHTML = `<tr><td colspan="5" class="text-center text-danger">Erreur lors du chargement des métriques: ${error.message}</td></tr>`;
+            metricsTable.innerHTML = `<tr><td colspan="8" class="text-center text-danger">Erreur lors du chargement des métriques: ${error.message}</td></tr>`;
         }
     }
     
-    // Fonction pour charger les logs
+    const logLevel = document.getElementById('log-level');
+    const logRequestId = document.getElementById('log-request-id');
+    const olderLogsBtn = document.getElementById('older-logs-btn');
+    let olderCursor = null;
+    let logStream = null;
+    
+    function logFilters() {
+        const params = new URLSearchParams();
+        if (logLevel.value) params.set('level', logLevel.value);
+        if (logRequestId.value.trim()) params.set('request_id', logRequestId.value.trim());
+        return params;
+    }
+    
+    // Suivi en direct : le serveur envoie seulement les nouvelles lignes
+    function followLogs(cursor) {
+        if (logStream) {
+            logStream.close();
+        }
+        const params = logFilters();
+        if (cursor) params.set('cursor', cursor);
+        logStream = new EventSource(`/logs/stream?${params}`);
+        logStream.onmessage = function(event) {
+            const atBottom = logsContent.scrollTop + logsContent.clientHeight >= logsContent.scrollHeight - 5;
+            if (logsContent.textContent === "Aucun log disponible") {
+                logsContent.textContent = '';
+            }
+            logsContent.textContent += event.data + '\n';
+            if (atBottom) {
+                logsContent.scrollTop = logsContent.scrollHeight;
+            }
+        };
+    }
+    
+    // Fonction pour charger les logs (dernière page, puis suivi en direct)
     async function loadLogs() {
         try {
-            console.log("Chargement des logs...");
             logsContent.textContent = "Chargement des logs...";
             
-            const response = await fetch('/logs');
-            if (!response.ok) {
-                throw new Error(`Erreur HTTP: ${response.status}`);
-            }
-            
+            const response = await fetch(`/logs?${logFilters()}`);
             const data = await response.json();
-            console.log("Logs récupérés:", data);
+            if (!response.ok || !data.success) {
+                throw new Error(data.error || `Erreur HTTP: ${response.status}`);
+            }
             
-            if (data.logs && Array.isArray(data.logs) && data.logs.length > 0) {
+            olderCursor = data.next_cursor;
+            olderLogsBtn.disabled = !olderCursor;
+            if (data.logs.length > 0) {
                 logsContent.textContent = data.logs.join('');
                 // Défiler automatiquement vers le bas pour voir les logs les plus récents
                 logsContent.scrollTop = logsContent.scrollHeight;
             } else {
                 logsContent.textContent = "Aucun log disponible";
             }
+            followLogs(data.last_cursor);
         } catch (error) {
             console.error('Erreur lors du chargement des logs:', error);
             logsContent.textContent = `Erreur lors du chargement des logs: ${error.message}`;
         }
     }
     
+    // Page précédente, ajoutée en haut sans perdre la position de lecture
+    async function loadOlderLogs() {
+        if (!olderCursor) return;
+        try {
+            const params = logFilters();
+            params.set('cursor', olderCursor);
+            const response = await fetch(`/logs?${params}`);
+            const data = await response.json();
+            if (!response.ok || !data.success) {
+                throw new Error(data.error || `Erreur HTTP: ${response.status}`);
+            }
+            const previousHeight = logsContent.scrollHeight;
+            logsContent.textContent = data.logs.join('') + logsContent.textContent;
+            logsContent.scrollTop += logsContent.scrollHeight - previousHeight;
+            olderCursor = data.next_cursor;
+            olderLogsBtn.disabled = !olderCursor;
+        } catch (error) {
+            console.error('Erreur lors du chargement des logs:', error);
+        }
+    }
+    
+    logLevel.addEventListener('change', loadLogs);
+    logRequestId.addEventListener('change', loadLogs);
+    olderLogsBtn.addEventListener('click', loadOlderLogs);
+    
     // Charger les données au chargement de la page
     loadMetrics();
     loadLogs();
     
+    // Changer de fenêtre recharge les métriques
+    windowSelect.addEventListener('change', loadMetrics);
+    
     // Actualiser les données quand le bouton est cliqué
     refreshBtn.addEventListener('click', function() {
         loadMetrics();
         loadLogs();
     });
     
-    // Actualiser automatiquement toutes les 30 secondes
-    setInterval(function() {
-        loadMetrics();
-        loadLogs();
-    }, 30000);
+    // Actualiser automatiquement les métriques toutes les 30 secondes (les logs arrivent en direct)
+    setInterval(loadMetrics, 30000);
 });
\ No newline at end of file
@@ -37,7 +37,7 @@ document.addEventListener('DOMContentLoaded', function() {
     window.showDetails = function(factureId) {
         console.log("ID de la facture:", factureId);
 
-        fetch(`/facture/${factureId}`)
+        fetch(`/api/facture/${factureId}`)
             .then(response => response.json())
             .then(data => {
                 console.log("Réponse du serveur:", data);
@@ -83,19 +83,75 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     };
 
-    if (userEmail) {
-        const encodedEmail = encodeURIComponent(userEmail);
+    // Pagination : la page suivante n'est demandée qu'au clic sur "Charger plus"
+    const PAGE_SIZE = 50;
+    const tbody = document.querySelector('tbody');
+    const loadMoreButton = document.getElementById('chargerPlus');
+    const countLabel = document.getElementById('nombreFactures');
+    let nextCursor = null;
+    let nextOffset = null;
+    let loadedCount = 0;
+    let totalCount = null;
+
+    function currentFilters() {
+        const filters = {
+            date_from: document.getElementById('filtreDateDebut').value,
+            date_to: document.getElementById('filtreDateFin').value,
+            min_total: document.getElementById('filtreMontantMin').value,
+            max_total: document.getElementById('filtreMontantMax').value
+        };
+        // Ne transmettre que les filtres renseignés
+        return Object.fromEntries(Object.entries(filters).filter(([, value]) => value !== ''));
+    }
+
+    function pageUrl(reset) {
+        // Recherche par numéro, article ou client : résultats classés par pertinence
+        const terme = document.getElementById('rechercheFactures').value.trim();
+        if (terme) {
+            const params = new URLSearchParams({ q: terme, email: userEmail, limit: PAGE_SIZE });
+            if (!reset && nextOffset) {
+                params.set('offset', nextOffset);
+            }
+            return `/api/recherche?${params}`;
+        }
+
+        const params = new URLSearchParams({ limit: PAGE_SIZE, ...currentFilters() });
+        if (reset) {
+            // Le total n'est calculé qu'une fois par recherche
+            params.set('include_total', 'true');
+        } else if (nextCursor) {
+            params.set('cursor', nextCursor);
+        }
+        return `/api/factures/${encodeURIComponent(userEmail)}?${params}`;
+    }
+
+    function loadPage(reset) {
+        const url = pageUrl(reset);
+        loadMoreButton.disabled = true;
 
-        fetch(`/api/factures/${encodedEmail}`)
+        fetch(url)
             .then(response => response.json())
             .then(data => {
-                if (data.success) {
-                    const facturesData = data.factures;
-                    const tbody = document.querySelector('tbody');
-                    tbody.innerHTML = facturesData.map(facture => createFactureRow(facture)).join('');
-                } else {
+                if (!data.success) {
                     throw new Error(data.error || 'Erreur lors du chargement des factures');
                 }
+
+                const rows = data.factures.map(facture => createFactureRow(facture)).join('');
+                if (reset) {
+                    tbody.innerHTML = rows;
+                    loadedCount = 0;
+                    totalCount = data.total;
+                } else {
+                    tbody.insertAdjacentHTML('beforeend', rows);
+                }
+                loadedCount += data.factures.length;
+                nextCursor = data.next_cursor || null;
+                nextOffset = data.next_offset || null;
+
+                countLabel.textContent = totalCount !== null && totalCount !== undefined
+                    ? `${loadedCount} facture(s) affichée(s) sur ${totalCount}`
+                    : `${loadedCount} facture(s) affichée(s)`;
+                loadMoreButton.classList.toggle('d-none', !nextCursor && !nextOffset);
             })
             .catch(error => {
                 console.error('Erreur:', error);
@@ -103,7 +159,23 @@ document.addEventListener('DOMContentLoaded', function() {
                 errorMessage.className = 'alert alert-danger';
                 errorMessage.textContent = 'Erreur lors du chargement des factures: ' + error.message;
                 document.querySelector('.table-responsive').before(errorMessage);
+            })
+            .finally(() => {
+                loadMoreButton.disabled = false;
             });
+    }
+
+    if (userEmail) {
+        loadMoreButton.addEventListener('click', () => loadPage(false));
+
+        document.getElementById('filtresFactures').addEventListener('submit', event => {
+            event.preventDefault();
+            nextCursor = null;
+            nextOffset = null;
+            loadPage(true);
+        });
+
+        loadPage(true);
     } else {
         const notLoggedInMessage = document.createElement('div');
         notLoggedInMessage.className = 'alert alert-info';
@@ -533,6 +533,8 @@ function saveInvoiceData() {
             // Mettre à jour les données de la facture dans le tableau selectedFiles
             if (selectedFiles[currentInvoiceIndex]) {
                 selectedFiles[currentInvoiceIndex].data = formData;
+                // Une facture modifiée doit être renvoyée à la base
+                selectedFiles[currentInvoiceIndex].saved = false;
                 
                 // Mettre à jour le résumé de la facture dans la liste
                 updateInvoiceSummary(currentInvoiceIndex, formData);
@@ -633,8 +635,8 @@ function saveAllInvoicesToDatabase() {
     const loadingSpinner = document.getElementById('loadingSpinner');
     const resultContainer = document.getElementById('resultContainer');
     
-    // Vérifier s'il y a des factures à enregistrer
-    const invoicesWithData = selectedFiles.filter(file => file.data);
+    // Vérifier s'il y a des factures à enregistrer (celles déjà enregistrées ne sont pas renvoyées)
+    const invoicesWithData = selectedFiles.filter(file => file.data && !file.saved);
     
     if (invoicesWithData.length === 0) {
         // Afficher un message d'erreur si aucune facture n'a été analysée
@@ -681,6 +683,15 @@ function saveAllInvoicesToDatabase() {
         // Masquer le spinner
         loadingSpinner.classList.add('d-none');
         
+        // Marquer les factures enregistrées pour ne renvoyer que les échecs
+        const results = data.results || [];
+        results.forEach((result, position) => {
+            const file = invoicesWithData[position];
+            if (file && result.success) {
+                file.saved = true;
+            }
+        });
+        
         if (data.success) {
             // Afficher un message de succès
             const successAlert = document.createElement('div');
@@ -693,8 +704,8 @@ function saveAllInvoicesToDatabase() {
             resultContainer.prepend(successAlert);
             
             // Ajouter un badge "Enregistré" à chaque facture
-            invoicesWithData.forEach((file, index) => {
-                const invoiceResult = document.getElementById(`invoice-result-${index}`);
+            invoicesWithData.forEach(file => {
+                const invoiceResult = document.getElementById(`invoice-result-${selectedFiles.indexOf(file)}`);
                 if (invoiceResult) {
                     const cardHeader = invoiceResult.querySelector('.card-header');
                     if (cardHeader) {
@@ -723,9 +734,15 @@ function saveAllInvoicesToDatabase() {
             // Afficher un message d'erreur
             const errorAlert = document.createElement('div');
             errorAlert.className = 'alert alert-danger';
+            const failedList = results
+                .filter(result => !result.success)
+                .map(result => `<li>${result.invoice_number || result.filename}: ${result.error}</li>`)
+                .join('');
             errorAlert.innerHTML = `
                 <h4>Erreur lors de l'enregistrement</h4>
                 <p>${data.error || "Une erreur s'est produite lors de l'enregistrement des données."}</p>
+                ${data.saved_count ? `<p>${data.message}. Seules les factures en échec seront renvoyées au prochain enregistrement.</p>` : ''}
+                ${failedList ? `<ul class="mb-0">${failedList}</ul>` : ''}
             `;
             
             resultContainer.prepend(errorAlert);
@@ -1,17 +1,14 @@
-from fastapi import FastAPI, Request, Form, UploadFile, File, Response, Depends, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, Form, UploadFile, File, Response, Depends, HTTPException, Query
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import os
 import shutil
 from pathlib import Path
-import psycopg2
-from psycopg2.extras import RealDictCursor
 import datetime
 import json
 from dotenv import load_dotenv
-import hashlib
-import secrets
+from prometheus_client import CONTENT_TYPE_LATEST as PROMETHEUS_CONTENT_TYPE
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from fastapi.middleware.cors import CORSMiddleware
@@ -23,7 +20,23 @@ import time
 import urllib.parse
 
 from back_end.classe.extract_qr_code import extract_data_qrcode
-from back_end.utils.monitoring import MonitoringMiddleware, PerformanceMonitor, get_metrics
+from back_end.utils.monitoring import (
+    MonitoringMiddleware, PerformanceMonitor, get_metrics,
+    start_shared_metrics, stop_shared_metrics, get_shared_metrics_stats,
+)
+from back_end.utils.database import close_pool, get_pool_stats, run_db
+from back_end.utils.cache import get_cache_stats
+from back_end.utils.admission import AdmissionControlMiddleware, get_admission_stats
+from back_end.utils.storage import get_storage, close_storage
+from back_end.utils.log_sink import log_error, close_log_sink, get_log_sink_stats
+from back_end.utils.log_config import get_logging_stats
+from back_end.utils.profiler import profile, ProfilerBusyError, PROFILER_CONFIG
+from back_end.utils.log_store import get_log_store, InvalidCursorError, LEVELS as LOG_LEVELS, LOG_STORE_CONFIG
+from back_end.utils.auth_service import (
+    hash_password_async, verify_password_async, close_hash_executor, get_hash_stats, HashQueueFullError,
+    create_access_token, cache_principal, get_current_principal, get_current_user, revoke_token,
+    get_principal_stats, require_admin
+)
 from back_end.classe.classe_improved.OCR import process_image, extract_invoice_data, get_available_ocr_services
 
 
@@ -49,18 +62,21 @@ app.mount("/front_end/static", StaticFiles(directory="front_end/static"), name="
 
 templates = Jinja2Templates(directory="front_end/templates")
 
-# Configuration de la connexion à la base de données
-DB_CONFIG = {
-    "dbname": os.getenv("DB_NAME"),
-    "user": os.getenv("DB_USER"),
-    "password": os.getenv("DB_PASSWORD"),
-    "host": os.getenv("DB_HOST"),
-    "port": os.getenv("DB_PORT")
-}
-
-# Fonction pour obtenir une connexion à la base de données
-def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
+# Les données passent par le stockage choisi par STORAGE_BACKEND (back_end.utils.storage) ;
+# les appels bloquants sont exécutés hors de la boucle d'événements avec run_db
+@app.on_event("startup")
+def start_metrics_snapshots():
+    # Métriques partagées entre workers (METRICS_SHARED_DIR) : archivage et instantanés
+    start_shared_metrics()
+
+@app.on_event("shutdown")
+def shutdown_db_pool():
+    stop_shared_metrics()
+    # Envoyer les dernières erreurs journalisées avant de fermer le stockage
+    close_log_sink()
+    close_storage()
+    close_pool()
+    close_hash_executor()
 
 # Ajoutez ceci après la création de l'application FastAPI
 app.add_middleware(
@@ -74,6 +90,10 @@ app.add_middleware(
 # Ajouter le middleware de monitoring
 app.add_middleware(MonitoringMiddleware)
 
+# Contrôle d'admission, ajouté en dernier pour passer en premier : une requête
+# refusée (503) n'est ni lue ni journalisée par les middlewares suivants
+app.add_middleware(AdmissionControlMiddleware)
+
 # Modèles Pydantic pour les requêtes et réponses
 
 class InvoiceItem(BaseModel):
@@ -249,108 +269,38 @@ async def save_invoices_to_database(request: Request):
                 status_code=400
             )
         
-        # Établir une connexion à la base de données
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        # Écrire le lot ; chaque facture réussit ou échoue indépendamment des autres
+        results = await run_db(get_storage().save_invoices_batch, invoices)
+        failed = [result for result in results if not result["success"]]
+        saved_count = len(results) - len(failed)
         
-        saved_count = 0
-        
-        for invoice_data in invoices:
-            filename = invoice_data.get('filename')
-            invoice = invoice_data.get('data', {})
-            
-            # 1. Vérifier si l'utilisateur existe, sinon le créer
-            email = invoice.get('email')
-            client_name = invoice.get('client')
-            address = invoice.get('address')
-            
-            if email:
-                # Vérifier si l'utilisateur existe
-                cursor.execute(
-                    "SELECT * FROM dylan.utilisateur WHERE email_personne = %s",
-                    (email,)
-                )
-                user = cursor.fetchone()
-                
-                if not user:
-                    # Créer un nouvel utilisateur
-                    cursor.execute(
-                        "INSERT INTO dylan.utilisateur (email_personne, nom_personne, adresse) VALUES (%s, %s, %s)",
-                        (email, client_name, address)
-                    )
-            
-            # 2. Insérer la facture
-            invoice_number = invoice.get('invoice_number')
-            issue_date_str = invoice.get('issue_date')
-            total = invoice.get('total', 0)
-            
-            # Convertir la date si elle est fournie
-            issue_date = None
-            if issue_date_str:
-                try:
-                    issue_date = datetime.datetime.strptime(issue_date_str, '%Y-%m-%d').date()
-                except ValueError:
-                    # Gérer le cas où la date n'est pas au format attendu
-                    pass
-            
-            # Insérer la facture
-            cursor.execute(
-                "INSERT INTO dylan.facture (nom_facture, date_facture, total_facture, email_personne) VALUES (%s, %s, %s, %s)",
-                (invoice_number or filename, issue_date, total, email)
+        if failed:
+            # Succès partiel : le client ne renvoie que les factures en échec
+            return JSONResponse(
+                content={
+                    "success": False,
+                    "error": f"{len(failed)} facture(s) n'ont pas pu être enregistrée(s)",
+                    "message": f"{saved_count} facture(s) enregistrée(s), {len(failed)} en échec",
+                    "saved_count": saved_count,
+                    "failed_count": len(failed),
+                    "results": results
+                },
+                status_code=207
             )
-            
-            # 3. Insérer les articles
-            items = invoice.get('items', [])
-            for item in items:
-                item_name = item.get('name')
-                quantity = item.get('quantity', 0)
-                unit_price = item.get('unit_price', 0)
-                
-                if item_name:
-                    cursor.execute(
-                        "INSERT INTO dylan.article (nom_facture, nom_article, quantite, prix) VALUES (%s, %s, %s, %s)",
-                        (invoice_number or filename, item_name, quantity, unit_price)
-                    )
-            
-            saved_count += 1
-        
-        # Valider les changements
-        conn.commit()
-        
-        # Fermer la connexion
-        cursor.close()
-        conn.close()
         
         return JSONResponse(
             content={
                 "success": True, 
                 "message": f"{saved_count} facture(s) enregistrée(s) avec succès",
-                "saved_count": saved_count
+                "saved_count": saved_count,
+                "failed_count": 0,
+                "results": results
             }
         )
     except Exception as e:
-        # En cas d'erreur, effectuer un rollback si une connexion est établie
-        if 'conn' in locals() and conn:
-            conn.rollback()
-            cursor.close()
-            conn.close()
-        
-        # Enregistrer l'erreur dans la table log
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO dylan.log (time, fichier, erreur) VALUES (%s, %s, %s)",
-                (datetime.datetime.now(), "save_invoices_to_database", str(e))
-            )
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-        except Exception as log_error:
-            # Si même l'enregistrement de l'erreur échoue, on affiche simplement l'erreur
-            print(f"Erreur lors de l'enregistrement du log: {log_error}")
+        # Le rollback est effectué par save_invoices_batch
+        # Enregistrer l'erreur dans la table log (envoi différé, sans attendre la base)
+        log_error("save_invoices_to_database", e)
         
         return JSONResponse(
             content={"success": False, "error": str(e)}, 
@@ -394,96 +344,36 @@ async def register_user(user_data: UserCreate):
         Confirmation de l'inscription
     """
     try:
-        # Générer un salt aléatoire
-        salt = secrets.token_hex(16)
-        
-        # Hasher le mot de passe avec le salt
-        password_hash = hashlib.sha256((user_data.password + salt).encode()).hexdigest()
-        
-        # Établir une connexion à la base de données
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Vérifier si l'email existe déjà
-        cursor.execute(
-            "SELECT email_personne FROM dylan.utilisateur WHERE email_personne = %s", 
-            (user_data.email,)
+        # Hasher le mot de passe (bcrypt, salt inclus dans le hash) hors de la boucle d'événements
+        password_hash = await hash_password_async(user_data.password)
+        
+        # Créer le compte hors de la boucle d'événements
+        created = await run_db(
+            get_storage().register_user_account,
+            user_data.email, user_data.nom, user_data.prenom, user_data.date_naissance,
+            password_hash, ""
         )
         
-        if cursor.fetchone():
+        if not created:
             return JSONResponse(
                 content={"success": False, "message": "Cet email est déjà utilisé"},
                 status_code=400
             )
         
-        # Insérer l'utilisateur
-        cursor.execute(
-            """
-            INSERT INTO dylan.utilisateur 
-            (email_personne, nom_personne, prenom_personne, date_anniversaire) 
-            VALUES (%s, %s, %s, %s)
-            """, 
-            (user_data.email, user_data.nom, user_data.prenom, user_data.date_naissance)
-        )
-        
-        # Créer la table d'authentification si elle n'existe pas
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS dylan.authentification (
-                email VARCHAR(255) PRIMARY KEY,
-                mot_de_passe_hash VARCHAR(255) NOT NULL,
-                salt VARCHAR(100) NOT NULL,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                derniere_connexion TIMESTAMP,
-                est_actif BOOLEAN DEFAULT TRUE,
-                FOREIGN KEY (email) REFERENCES dylan.utilisateur(email_personne)
-            )
-            """
-        )
-        
-        # Insérer les informations d'authentification
-        cursor.execute(
-            """
-            INSERT INTO dylan.authentification 
-            (email, mot_de_passe_hash, salt, date_creation) 
-            VALUES (%s, %s, %s, %s)
-            """, 
-            (user_data.email, password_hash, salt, datetime.datetime.now())
-        )
-        
-        # Valider les changements
-        conn.commit()
-        
-        # Fermer la connexion
-        cursor.close()
-        conn.close()
-        
         return JSONResponse(
             content={"success": True, "message": "Inscription réussie"}
         )
         
+    except HashQueueFullError as e:
+        return JSONResponse(
+            content={"success": False, "error": str(e)},
+            status_code=503,
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
-        # En cas d'erreur, effectuer un rollback si une connexion est établie
-        if 'conn' in locals() and conn:
-            conn.rollback()
-            cursor.close()
-            conn.close()
-        
-        # Enregistrer l'erreur dans la table log
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO dylan.log (time, fichier, erreur) VALUES (%s, %s, %s)",
-                (datetime.datetime.now(), "register_user", str(e))
-            )
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-        except Exception as log_error:
-            print(f"Erreur lors de l'enregistrement du log: {log_error}")
+        # Le rollback est effectué par register_user_account
+        # Enregistrer l'erreur dans la table log (envoi différé, sans attendre la base)
+        log_error("register_user", e)
         
         return JSONResponse(
             content={"success": False, "error": str(e)}, 
@@ -525,25 +415,27 @@ async def jwt_login(request: Request):
         if not email or not password:
             raise HTTPException(status_code=400, detail="Email et mot de passe requis")
 
-        # Connexion à la base de données
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Requête pour récupérer les données utilisateur
-        query = """
-        SELECT a.email, a.mot_de_passe, u.nom_personne, u.genre, u.adresse, u.date_anniversaire
-        FROM dylan.authentification a
-        JOIN dylan.utilisateur u ON a.email = u.email_personne
-        WHERE a.email = %s
-        """
-        cursor.execute(query, (email,))
-        user = cursor.fetchone()
-
-        if not user or password != user['mot_de_passe']:
+        # Récupérer les données utilisateur hors de la boucle d'événements
+        user = await run_db(get_storage().get_login_user, email)
+
+        if not user:
             raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
 
-        # Créer un token d'accès (à remplacer par une vraie génération de JWT)
-        access_token = "votre_token_jwt"
+        # Vérifier le mot de passe (bcrypt) dans l'exécuteur de hachage, hors de la boucle d'événements
+        valid, new_hash = await verify_password_async(password, user['mot_de_passe_hash'], user['salt'])
+        if not valid:
+            raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
+
+        if new_hash:
+            # Coût bcrypt modifié ou ancien hash SHA-256 : le hash est remplacé sans gêner la connexion
+            try:
+                await run_db(get_storage().update_password_hash, email, new_hash)
+            except Exception as e:
+                log_error("jwt_login", f"Rehachage du mot de passe de {email}: {e}")
+
+        # Token signé : les requêtes authentifiées n'ont pas besoin de relire la base pour l'identifier
+        access_token = create_access_token({"sub": user['email'], "nom": user['nom_personne']})
+        cache_principal(user)
 
         # Réponse avec les données utilisateur réelles
         return JSONResponse(
@@ -560,121 +452,227 @@ async def jwt_login(request: Request):
                 }
             }
         )
+    except HTTPException as e:
+        return JSONResponse(
+            content={"success": False, "error": e.detail},
+            status_code=e.status_code
+        )
+    except HashQueueFullError as e:
+        return JSONResponse(
+            content={"success": False, "error": str(e)},
+            status_code=503,
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         print(f"Erreur dans jwt_login: {str(e)}")
         return JSONResponse(
             content={"success": False, "error": str(e)},
             status_code=500
         )
-    finally:
-        cursor.close()
-        conn.close()
+
+@app.post("/auth/jwt/logout", tags=["Authentification"])
+async def jwt_logout(claims: dict = Depends(get_current_principal)):
+    """Déconnexion : le token est refusé jusqu'à son expiration (liste de révocation en mémoire)"""
+    try:
+        revoke_token(claims["jti"], claims["exp"])
+    except (KeyError, RuntimeError) as e:
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=400)
+    return {"success": True}
+
+@app.get("/auth/jwt/me", tags=["Authentification"])
+async def jwt_me(user: dict = Depends(get_current_user)):
+    """Profil de l'utilisateur connecté (lu dans le cache des profils)"""
+    return {
+        "email": user['email'],
+        "nom": user['nom_personne'],
+        "genre": user['genre'],
+        "adresse": user['adresse'],
+    }
         
 
 # Ajouter un endpoint pour consulter les métriques
 @app.get("/metrics", tags=["Monitoring"])
-async def metrics_endpoint():
-    """Endpoint pour récupérer les métriques de performance"""
-    try:
-        # Générer quelques métriques de test si aucune n'existe encore
-        if not PerformanceMonitor._metrics:
-            print("Aucune métrique disponible, génération de données de test")
-            PerformanceMonitor._metrics = {
-                "test_endpoint": {
-                    "count": 5,
-                    "total_time": 2.5,
-                    "min_time": 0.4,
-                    "max_time": 0.6
-                },
-                "/auth/jwt/login": {
-                    "count": 3,
-                    "total_time": 1.2,
-                    "min_time": 0.3,
-                    "max_time": 0.5
-                }
-            }
-        
-        # Convertir les métriques au format attendu par le frontend
-        result = {}
-        for function_name, metrics in PerformanceMonitor._metrics.items():
-            result[function_name] = {
-                "count": metrics["count"],
-                "avg_time": metrics["total_time"] / metrics["count"] if metrics["count"] > 0 else 0,
-                "min_time": metrics["min_time"] if metrics["min_time"] != float("inf") else 0,
-                "max_time": metrics["max_time"]
-            }
-        
-        print("Métriques renvoyées:", result)
-        return result
-    except Exception as e:
-        print(f"Erreur dans metrics_endpoint: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        # Renvoyer au moins quelques données de test en cas d'erreur
-        return {
-            "error_endpoint": {
-                "count": 1,
-                "avg_time": 0.0,
-                "min_time": 0.0,
-                "max_time": 0.0
-            }
-        }
+async def metrics_endpoint(scope: str = Query("host", pattern="^(host|process)$")):
+    """
+    Endpoint pour récupérer les métriques de performance (moyenne, min, max, p50/p95/p99 sur 1 min, 5 min, 1 h).
+    
+    Args:
+        scope: host (tous les workers et processus OCR du serveur, avec METRICS_SHARED_DIR)
+            ou process (le worker qui répond)
+    """
+    # Avec METRICS_SHARED_DIR, lecture et addition des fichiers de tous les processus
+    return await asyncio.to_thread(PerformanceMonitor.get_metrics, scope)
+
+@app.get("/metrics/prometheus", tags=["Monitoring"])
+async def prometheus_metrics_endpoint():
+    """Endpoint pour récupérer les histogrammes de durées au format texte Prometheus"""
+    content = await asyncio.to_thread(PerformanceMonitor.prometheus_text)
+    return Response(content=content, media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/metrics/shared", tags=["Monitoring"])
+async def shared_metrics_endpoint():
+    """Endpoint pour récupérer l'état des fichiers de métriques partagés entre processus (un par processus, archive)"""
+    return get_shared_metrics_stats()
+
+# Endpoint pour consulter l'état du pool de connexions
+@app.get("/metrics/db-pool", tags=["Monitoring"])
+async def db_pool_metrics_endpoint():
+    """Endpoint pour récupérer l'état du pool de connexions à la base de données"""
+    return get_pool_stats()
+
+@app.get("/metrics/cache", tags=["Monitoring"])
+async def cache_metrics_endpoint():
+    """Endpoint pour récupérer le taux de succès du cache de lecture des factures"""
+    return get_cache_stats()
+
+@app.get("/metrics/log-sink", tags=["Monitoring"])
+async def log_sink_metrics_endpoint():
+    """Endpoint pour récupérer l'état du journal d'erreurs dylan.log (tampon, fichier local, pertes)"""
+    return get_log_sink_stats()
+
+@app.get("/metrics/logging", tags=["Monitoring"])
+async def logging_metrics_endpoint():
+    """Endpoint pour récupérer l'état de la file de journalisation d'application.log (en attente, abandonnés) et de son index"""
+    return {**get_logging_stats(), "index": get_log_store().stats()}
+
+@app.get("/metrics/admission", tags=["Monitoring"])
+async def admission_metrics_endpoint():
+    """Endpoint pour récupérer l'état du contrôle d'admission (requêtes actives, en attente, refusées)"""
+    return get_admission_stats()
+
+@app.get("/metrics/auth-principal", tags=["Monitoring"])
+async def auth_principal_metrics_endpoint():
+    """Endpoint pour récupérer le taux de succès du cache des profils authentifiés et la liste de révocation"""
+    return get_principal_stats()
+
+@app.get("/metrics/auth-hash", tags=["Monitoring"])
+async def auth_hash_metrics_endpoint():
+    """Endpoint pour récupérer l'état de l'exécuteur de hachage des mots de passe (coût bcrypt, file d'attente)"""
+    metrics = await asyncio.to_thread(PerformanceMonitor.get_metrics)
+    return {**get_hash_stats(), "metrics": {
+        name: metric for name, metric in metrics.items() if name.startswith("auth.")
+    }}
 
 # Endpoint pour consulter les logs récents
 @app.get("/logs", tags=["Monitoring"])
-async def logs_endpoint():
-    """Endpoint pour récupérer les logs récents"""
-    try:
-        log_file_path = "application.log"
-        
-        # Vérifier si le fichier de log existe
-        if not os.path.exists(log_file_path):
-            print(f"Fichier de log non trouvé: {os.path.abspath(log_file_path)}")
-            # Générer quelques logs de test
-            test_logs = [
-                "2023-03-25 10:28:00 - INFO - Application démarrée",
-                "2023-03-25 10:28:05 - INFO - Requête GET /",
-                "2023-03-25 10:28:10 - INFO - Requête POST /auth/jwt/login",
-                "2023-03-25 10:28:15 - WARNING - Tentative de connexion échouée"
-            ]
-            return {"logs": test_logs}
-        
-        # Lire les N dernières lignes du fichier de log
-        with open(log_file_path, "r", encoding="utf-8") as f:
-            # Obtenir la taille du fichier
-            f.seek(0, os.SEEK_END)
-            file_size = f.tell()
-            
-            # Si le fichier est trop grand, lire seulement les derniers 100 KB
-            if file_size > 100000:  # 100 KB
-                f.seek(-100000, os.SEEK_END)
-                # Ignorer la première ligne partielle
-                f.readline()
-                lines = f.readlines()
-            else:
-                f.seek(0)
-                lines = f.readlines()
-            
-            # Limiter à 500 lignes pour éviter une surcharge
-            recent_logs = lines[-500:]
-        
-        print(f"Nombre de lignes de log récupérées: {len(recent_logs)}")
+async def logs_endpoint(
+    level: Optional[str] = None,
+    request_id: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    limit: int = Query(200, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """
+    Endpoint pour récupérer les logs récents, fichiers de rotation compris.
+    
+    Args:
+        level: Niveau minimal (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        request_id: Identifiant de requête (en-tête X-Request-ID)
+        since, until: Bornes d'horodatage (incluses, heure locale du serveur)
+        limit: Nombre d'enregistrements par page
+        cursor: Curseur "next_cursor" renvoyé par la page précédente (enregistrements plus anciens)
         
-        return {"logs": recent_logs}
+    Returns:
+        Enregistrements du plus ancien au plus récent, curseur de la page précédente
+        (null s'il n'y en a pas) et curseur de départ du suivi en direct (/logs/stream)
+    """
+    if level and level.upper() not in LOG_LEVELS:
+        return JSONResponse(content={"success": False, "error": f"Niveau inconnu: {level}"}, status_code=400)
+    try:
+        # Lecture des fichiers hors de la boucle d'événements
+        page = await asyncio.to_thread(
+            get_log_store().query,
+            level=level,
+            request_id=request_id,
+            since=since,
+            until=until,
+            limit=limit,
+            cursor=cursor
+        )
+        return JSONResponse(content={"success": True, **page})
+    except InvalidCursorError as e:
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=400)
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Erreur lors de la récupération des logs: {str(e)}")
-        print(error_trace)
-        # Renvoyer des logs de test en cas d'erreur
-        return {"logs": [
-            f"Erreur lors de la récupération des logs: {str(e)}",
-            "Voici quelques logs de test pour vérifier l'affichage:",
-            "2023-03-25 10:28:00 - INFO - Test log 1",
-            "2023-03-25 10:28:05 - INFO - Test log 2",
-            "2023-03-25 10:28:10 - WARNING - Test log 3",
-            error_trace
-        ]}
+        logging.getLogger("monitoring").error(f"Erreur lors de la récupération des logs: {str(e)}")
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
+
+@app.get("/logs/stream", tags=["Monitoring"])
+async def logs_stream_endpoint(
+    request: Request,
+    level: Optional[str] = None,
+    request_id: Optional[str] = None,
+    cursor: Optional[str] = None
+):
+    """
+    Suivi en direct des logs (Server-Sent Events) : chaque événement contient les
+    enregistrements écrits depuis le précédent ; son id est le curseur à reprendre
+    après une reconnexion (en-tête Last-Event-ID).
+    """
+    if level and level.upper() not in LOG_LEVELS:
+        return JSONResponse(content={"success": False, "error": f"Niveau inconnu: {level}"}, status_code=400)
+    store = get_log_store()
+    cursor = request.headers.get("last-event-id") or cursor
+    try:
+        store.parse_cursor(cursor)
+    except InvalidCursorError as e:
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=400)
+    if cursor is None:
+        cursor = await asyncio.to_thread(store.end_cursor)
+
+    async def events():
+        nonlocal cursor
+        idle_time = 0.0
+        while not await request.is_disconnected():
+            lines, cursor = await asyncio.to_thread(store.follow, cursor, level, request_id)
+            if lines:
+                idle_time = 0.0
+                data = "".join(lines).rstrip("\n").replace("\r", "")
+                yield f"id: {cursor}\n" + "".join(f"data: {line}\n" for line in data.split("\n")) + "\n"
+            elif idle_time >= LOG_STORE_CONFIG["heartbeat_interval"]:
+                # Commentaire SSE : garde la connexion ouverte derrière un proxy
+                idle_time = 0.0
+                yield ": ping\n\n"
+            await asyncio.sleep(LOG_STORE_CONFIG["follow_interval"])
+            idle_time += LOG_STORE_CONFIG["follow_interval"]
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/admin/profile", tags=["Monitoring"])
+async def profile_endpoint(
+    seconds: float = Query(10, gt=0, le=PROFILER_CONFIG["max_seconds"]),
+    interval_ms: float = Query(PROFILER_CONFIG["interval"] * 1000, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+    include_idle: bool = False,
+    limit: int = Query(30, ge=1, le=500),
+    admin: dict = Depends(require_admin)
+):
+    """
+    Profiler par échantillonnage le processus qui reçoit la requête pendant `seconds` secondes.
+    
+    Args:
+        seconds: Durée du profilage
+        interval_ms: Intervalle entre deux relevés des piles
+        format: json (fonctions les plus présentes et piles repliées) ou collapsed
+            (piles repliées seules, pour flamegraph.pl / speedscope)
+        include_idle: Garder les threads en attente (boucle d'événements inactive, pools vides)
+        limit: Nombre de fonctions dans le résumé
+    """
+    logging.getLogger("monitoring").info(f"Profilage de {seconds}s demandé par {admin['sub']}")
+    try:
+        # Le profileur a son propre thread ; l'attente se fait hors de la boucle d'événements
+        report = await asyncio.to_thread(
+            profile, seconds, interval=interval_ms / 1000, include_idle=include_idle, limit=limit
+        )
+    except ProfilerBusyError as e:
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=409)
+    if format == "collapsed":
+        return Response(content=report["collapsed"], media_type="text/plain; charset=utf-8")
+    return JSONResponse(content={"success": True, "pid": os.getpid(), **report})
 
 # Ajouter une route pour le dashboard de monitoring
 @app.get("/monitoring", response_class=HTMLResponse, tags=["Monitoring"])
@@ -683,81 +681,94 @@ async def monitoring_dashboard(request: Request):
     return templates.TemplateResponse("dashboard.html", {"request": request})
     
 @app.get("/api/factures/{email}", tags=["Details Facture"])
-async def get_factures(request: Request, email: str):
+async def get_factures(
+    request: Request,
+    email: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime.date] = None,
+    date_to: Optional[datetime.date] = None,
+    min_total: Optional[float] = None,
+    max_total: Optional[float] = None,
+    include_total: bool = False
+):
     """
-    Endpoint pour récupérer toutes les factures d'un utilisateur
+    Endpoint pour récupérer l'historique des factures d'un utilisateur, page par page.
+    
+    Args:
+        email: Email de l'utilisateur
+        limit: Nombre de factures par page
+        cursor: Curseur "next_cursor" renvoyé par la page précédente
+        date_from, date_to: Bornes de date de facture (incluses)
+        min_total, max_total: Bornes de montant (incluses)
+        include_total: Renvoyer aussi le nombre total de factures correspondant aux filtres
+        
+    Returns:
+        Factures de la page et curseur de la page suivante (null sur la dernière page)
     """
     try:
         # Décoder l'email
         decoded_email = urllib.parse.unquote(email)
-        # Connexion à la base de données
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Requête pour récupérer les factures de l'utilisateur
-        query = """
-        SELECT f.nom_facture, f.date_facture, f.total_facture, u.nom_personne
-        FROM dylan.facture f
-        JOIN dylan.utilisateur u ON f.email_personne = u.email_personne
-        WHERE u.email_personne = %s
-        """
-        cursor.execute(query, (decoded_email,))
-        factures = cursor.fetchall()
-        
-        for facture in factures:
-            if isinstance(facture['date_facture'], datetime.date):
-                facture['date_facture'] = facture['date_facture'].strftime('%Y-%m-%d')
+        # Requête exécutée hors de la boucle d'événements
+        page = await run_db(
+            get_storage().get_factures_page,
+            decoded_email,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total,
+            date_from=date_from,
+            date_to=date_to,
+            min_total=min_total,
+            max_total=max_total
+        )
 
-        return JSONResponse(content={"success": True, "factures": factures})
+        return JSONResponse(content={"success": True, **page})
+    except ValueError as e:
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=400)
     except Exception as e:
         print(f"Erreur dans get_factures: {str(e)}")
         return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
-    finally:
-        cursor.close()
-        conn.close()
+
+@app.get("/api/recherche", tags=["Details Facture"])
+async def search_factures(
+    q: str,
+    email: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Endpoint de recherche de factures par numéro (même partiel), nom d'article ou nom de client.
+
+    Args:
+        q: Texte recherché (au moins 3 caractères)
+        email: Limiter la recherche aux factures de cet utilisateur
+        limit: Nombre de factures par page
+        offset: Valeur "next_offset" renvoyée par la page précédente
+
+    Returns:
+        Factures classées par pertinence (score, champs trouvés) et position de la page suivante
+    """
+    try:
+        # Requête exécutée hors de la boucle d'événements
+        resultats = await run_db(get_storage().search_factures, q, email=email, limit=limit, offset=offset)
+
+        return JSONResponse(content={"success": True, **resultats})
+    except ValueError as e:
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=400)
+    except Exception as e:
+        print(f"Erreur dans search_factures: {str(e)}")
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
 
 @app.get("/api/facture/{facture_id}", tags=["Details Facture"])
 async def get_facture_details(facture_id: int):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        query = """
-        SELECT f.nom_facture, f.date_facture, f.total_facture, u.nom_personne, a.nom_article, a.quantite, a.prix
-        FROM dylan.facture f
-        JOIN dylan.utilisateur u ON f.email_personne = u.email_personne
-        LEFT JOIN dylan.article a ON f.id = a.facture_id
-        WHERE f.id = %s
-        """
-        cursor.execute(query, (facture_id,))
-        facture_details = cursor.fetchall()
-
-        print("Détails de la facture récupérés:", facture_details)
-
-        for detail in facture_details:
-            if isinstance(detail['date_facture'], datetime.date):
-                detail['date_facture'] = detail['date_facture'].isoformat()
-
-        facture = {
-            "nom_facture": facture_details[0]['nom_facture'],
-            "date_facture": facture_details[0]['date_facture'],
-            "total_facture": facture_details[0]['total_facture'],
-            "nom_personne": facture_details[0]['nom_personne'],
-            "articles": [
-                {
-                    "nom_article": detail['nom_article'],
-                    "quantite": detail['quantite'],
-                    "prix": detail['prix']
-                } for detail in facture_details if detail['nom_article'] is not None
-            ]
-        }
+        # Requête exécutée hors de la boucle d'événements
+        facture = await run_db(get_storage().get_facture_details, facture_id)
+
+        if facture is None:
+            return JSONResponse(content={"success": False, "error": "Facture introuvable"}, status_code=404)
 
         return JSONResponse(content={"success": True, "facture_details": [facture]})
     except Exception as e:
         print(f"Erreur dans get_facture_details: {str(e)}")
         return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
-    finally:
-        cursor.close()
-        conn.close()
-
-        
\ No newline at end of file
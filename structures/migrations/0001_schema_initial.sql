@@ -0,0 +1,39 @@
+-- Schéma initial, tel que créé jusqu'ici par save_data_bdd.create_tables.
+-- IF NOT EXISTS : une base déjà en production est simplement marquée comme à jour.
+CREATE SCHEMA IF NOT EXISTS dylan;
+
+-- Table utilisateur
+CREATE TABLE IF NOT EXISTS dylan.utilisateur (
+    email_personne VARCHAR(255) PRIMARY KEY,
+    nom_personne VARCHAR(255),
+    genre VARCHAR(50),
+    adresse VARCHAR(500),
+    date_anniversaire DATE
+);
+
+-- Table Facture
+CREATE TABLE IF NOT EXISTS dylan.facture (
+    nom_facture VARCHAR(255) PRIMARY KEY,
+    date_facture DATE,
+    total_facture float,
+    email_personne VARCHAR(255),
+    FOREIGN KEY (email_personne) REFERENCES dylan.utilisateur(email_personne)
+);
+
+-- Table Article
+CREATE TABLE IF NOT EXISTS dylan.article (
+    nom_facture VARCHAR(255),
+    nom_article VARCHAR(255),
+    quantite float,
+    prix float,
+    PRIMARY KEY (nom_facture, nom_article),
+    FOREIGN KEY (nom_facture) REFERENCES dylan.facture(nom_facture)
+);
+
+-- Table log
+CREATE TABLE IF NOT EXISTS dylan.log (
+    id SERIAL PRIMARY KEY,
+    time TIMESTAMP,
+    fichier VARCHAR(255),
+    erreur TEXT
+);
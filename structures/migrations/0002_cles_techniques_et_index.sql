@@ -0,0 +1,35 @@
+-- Clés techniques utilisées par /api/facture/{id} (f.id et a.facture_id).
+-- Écrit pour passer aussi sur une base où ces colonnes auraient été ajoutées à la main.
+ALTER TABLE dylan.facture ADD COLUMN IF NOT EXISTS id BIGSERIAL;
+CREATE UNIQUE INDEX IF NOT EXISTS facture_id_key ON dylan.facture (id);
+
+ALTER TABLE dylan.article ADD COLUMN IF NOT EXISTS id BIGSERIAL;
+CREATE UNIQUE INDEX IF NOT EXISTS article_id_key ON dylan.article (id);
+ALTER TABLE dylan.article ADD COLUMN IF NOT EXISTS facture_id BIGINT;
+
+-- Rattacher les articles existants à leur facture
+UPDATE dylan.article a
+SET facture_id = f.id
+FROM dylan.facture f
+WHERE a.nom_facture = f.nom_facture
+  AND a.facture_id IS NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'article_facture_id_fkey') THEN
+        ALTER TABLE dylan.article
+            ADD CONSTRAINT article_facture_id_fkey
+            FOREIGN KEY (facture_id) REFERENCES dylan.facture(id);
+    END IF;
+END $$;
+
+-- Index des requêtes fréquentes
+-- Historique d'un utilisateur (get_factures)
+CREATE INDEX IF NOT EXISTS facture_email_personne_idx ON dylan.facture (email_personne);
+-- Filtres et tris par date
+CREATE INDEX IF NOT EXISTS facture_date_facture_idx ON dylan.facture (date_facture);
+-- Jointure facture -> articles (get_facture_details)
+CREATE INDEX IF NOT EXISTS article_facture_id_idx ON dylan.article (facture_id);
+-- Les recherches d'articles par nom_facture utilisent déjà la clé primaire
+-- (nom_facture, nom_article), dont nom_facture est la première colonne :
+-- un index séparé sur article.nom_facture ne ferait que ralentir les écritures.
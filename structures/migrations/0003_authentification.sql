@@ -0,0 +1,13 @@
+-- Table d'authentification, créée jusqu'ici à chaque inscription par register_user
+CREATE TABLE IF NOT EXISTS dylan.authentification (
+    email VARCHAR(255) PRIMARY KEY,
+    mot_de_passe_hash VARCHAR(255) NOT NULL,
+    salt VARCHAR(100) NOT NULL,
+    date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    derniere_connexion TIMESTAMP,
+    est_actif BOOLEAN DEFAULT TRUE,
+    FOREIGN KEY (email) REFERENCES dylan.utilisateur(email_personne)
+);
+
+-- Prénom renseigné à l'inscription
+ALTER TABLE dylan.utilisateur ADD COLUMN IF NOT EXISTS prenom_personne VARCHAR(255);
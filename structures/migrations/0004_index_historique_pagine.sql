@@ -0,0 +1,8 @@
+-- Pagination par clé de l'historique : (email, date décroissante, id décroissant).
+-- L'expression COALESCE place les factures sans date en fin d'historique et
+-- correspond exactement au ORDER BY de read_data_bdd.FACTURES_PAR_EMAIL_QUERY.
+CREATE INDEX IF NOT EXISTS facture_email_date_id_idx
+    ON dylan.facture (email_personne, (COALESCE(date_facture, '-infinity'::date)) DESC, id DESC);
+
+-- Couvert par la première colonne du nouvel index
+DROP INDEX IF EXISTS dylan.facture_email_personne_idx;
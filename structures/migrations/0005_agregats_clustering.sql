@@ -0,0 +1,279 @@
+-- Agrégats clients et articles lus par le clustering, tenus à jour par triggers
+-- à chaque écriture de facture ou d'article : le clustering ne reparcourt plus
+-- tout l'historique avec des GROUP BY.
+
+-- Caractéristiques d'achat par client (get_customer_data)
+CREATE TABLE IF NOT EXISTS dylan.agregat_client (
+    email_personne VARCHAR(255) PRIMARY KEY,
+    nombre_factures INTEGER NOT NULL DEFAULT 0,
+    total_depense DOUBLE PRECISION NOT NULL DEFAULT 0,
+    derniere_facture DATE,
+    nombre_articles_distincts INTEGER NOT NULL DEFAULT 0
+);
+
+-- Statistiques d'achat par article (get_product_data)
+CREATE TABLE IF NOT EXISTS dylan.agregat_article (
+    nom_article VARCHAR(255) PRIMARY KEY,
+    nombre_achats INTEGER NOT NULL DEFAULT 0,
+    -- Lignes avec un prix renseigné : dénominateur du prix moyen
+    nombre_prix INTEGER NOT NULL DEFAULT 0,
+    somme_prix DOUBLE PRECISION NOT NULL DEFAULT 0,
+    quantite_totale DOUBLE PRECISION NOT NULL DEFAULT 0,
+    nombre_clients INTEGER NOT NULL DEFAULT 0
+);
+
+-- Nombre de lignes par (client, article) : sert à maintenir les COUNT(DISTINCT)
+-- (articles distincts d'un client, clients distincts d'un article)
+CREATE TABLE IF NOT EXISTS dylan.agregat_client_article (
+    email_personne VARCHAR(255),
+    nom_article VARCHAR(255),
+    nombre_lignes INTEGER NOT NULL,
+    PRIMARY KEY (email_personne, nom_article)
+);
+
+-- Appliquer des variations de lignes (signe +1 / -1) aux couples client/article.
+-- Le RETURNING de l'upsert donne le nombre de lignes après verrouillage du couple,
+-- ce qui reste juste quand deux transactions touchent le même couple.
+CREATE OR REPLACE FUNCTION dylan.maj_agregat_paires(p_emails VARCHAR[], p_articles VARCHAR[], p_signes INTEGER[])
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    WITH delta AS (
+        SELECT email_personne, nom_article, SUM(signe)::INTEGER AS lignes
+        FROM unnest(p_emails, p_articles, p_signes) AS l(email_personne, nom_article, signe)
+        WHERE email_personne IS NOT NULL
+        GROUP BY email_personne, nom_article
+        HAVING SUM(signe) <> 0
+    ),
+    paires AS (
+        INSERT INTO dylan.agregat_client_article AS p (email_personne, nom_article, nombre_lignes)
+        SELECT email_personne, nom_article, lignes FROM delta
+        ON CONFLICT (email_personne, nom_article) DO UPDATE
+        SET nombre_lignes = p.nombre_lignes + EXCLUDED.nombre_lignes
+        RETURNING p.email_personne, p.nom_article, p.nombre_lignes
+    ),
+    transitions AS (
+        -- +1 quand le couple apparaît, -1 quand il disparaît
+        SELECT p.email_personne, p.nom_article,
+               CASE WHEN p.nombre_lignes > 0 AND p.nombre_lignes - d.lignes <= 0 THEN 1
+                    WHEN p.nombre_lignes <= 0 AND p.nombre_lignes - d.lignes > 0 THEN -1
+                    ELSE 0 END AS signe
+        FROM paires p
+        JOIN delta d ON d.email_personne = p.email_personne AND d.nom_article = p.nom_article
+    ),
+    clients AS (
+        INSERT INTO dylan.agregat_client AS c (email_personne, nombre_articles_distincts)
+        SELECT email_personne, SUM(signe) FROM transitions
+        GROUP BY email_personne HAVING SUM(signe) <> 0
+        ON CONFLICT (email_personne) DO UPDATE
+        SET nombre_articles_distincts = c.nombre_articles_distincts + EXCLUDED.nombre_articles_distincts
+    )
+    INSERT INTO dylan.agregat_article AS a (nom_article, nombre_clients)
+    SELECT nom_article, SUM(signe) FROM transitions
+    GROUP BY nom_article HAVING SUM(signe) <> 0
+    ON CONFLICT (nom_article) DO UPDATE
+    SET nombre_clients = a.nombre_clients + EXCLUDED.nombre_clients;
+
+    DELETE FROM dylan.agregat_client_article p
+    USING unnest(p_emails, p_articles) AS l(email_personne, nom_article)
+    WHERE p.email_personne = l.email_personne
+      AND p.nom_article = l.nom_article
+      AND p.nombre_lignes <= 0;
+END $$;
+
+-- Appliquer des variations de lignes d'article aux statistiques par article et par couple
+CREATE OR REPLACE FUNCTION dylan.maj_agregat_lignes(
+    p_emails VARCHAR[], p_articles VARCHAR[], p_quantites DOUBLE PRECISION[],
+    p_prix DOUBLE PRECISION[], p_signes INTEGER[]
+)
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO dylan.agregat_article AS a (nom_article, nombre_achats, nombre_prix, somme_prix, quantite_totale)
+    SELECT nom_article,
+           SUM(signe),
+           COALESCE(SUM(signe) FILTER (WHERE prix IS NOT NULL), 0),
+           COALESCE(SUM(signe * prix), 0),
+           COALESCE(SUM(signe * quantite), 0)
+    FROM unnest(p_articles, p_quantites, p_prix, p_signes) AS l(nom_article, quantite, prix, signe)
+    GROUP BY nom_article
+    ON CONFLICT (nom_article) DO UPDATE
+    SET nombre_achats = a.nombre_achats + EXCLUDED.nombre_achats,
+        nombre_prix = a.nombre_prix + EXCLUDED.nombre_prix,
+        somme_prix = a.somme_prix + EXCLUDED.somme_prix,
+        quantite_totale = a.quantite_totale + EXCLUDED.quantite_totale;
+
+    PERFORM dylan.maj_agregat_paires(p_emails, p_articles, p_signes);
+END $$;
+
+-- Appliquer des variations de factures aux agrégats clients
+CREATE OR REPLACE FUNCTION dylan.maj_agregat_factures(p_emails VARCHAR[], p_totaux DOUBLE PRECISION[], p_signes INTEGER[])
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO dylan.agregat_client AS c (email_personne, nombre_factures, total_depense)
+    SELECT email_personne, SUM(signe), COALESCE(SUM(signe * total), 0)
+    FROM unnest(p_emails, p_totaux, p_signes) AS l(email_personne, total, signe)
+    WHERE email_personne IS NOT NULL
+    GROUP BY email_personne
+    ON CONFLICT (email_personne) DO UPDATE
+    SET nombre_factures = c.nombre_factures + EXCLUDED.nombre_factures,
+        total_depense = c.total_depense + EXCLUDED.total_depense;
+
+    -- Le maximum ne se décrémente pas : il est relu pour les seuls clients touchés
+    UPDATE dylan.agregat_client c
+    SET derniere_facture = (
+        SELECT MAX(f.date_facture) FROM dylan.facture f WHERE f.email_personne = c.email_personne
+    )
+    WHERE c.email_personne = ANY(p_emails);
+END $$;
+
+-- Triggers par instruction : une écriture groupée de N lignes ne met à jour
+-- chaque agrégat qu'une fois
+CREATE OR REPLACE FUNCTION dylan.agregats_facture_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM dylan.maj_agregat_factures(array_agg(email_personne), array_agg(total_facture), array_agg(1))
+        FROM nouvelles;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM dylan.maj_agregat_factures(array_agg(email_personne), array_agg(total_facture), array_agg(-1))
+        FROM anciennes;
+    ELSE
+        PERFORM dylan.maj_agregat_factures(array_agg(l.email_personne), array_agg(l.total_facture), array_agg(l.signe))
+        FROM (
+            SELECT email_personne, total_facture, -1 AS signe FROM anciennes
+            UNION ALL
+            SELECT email_personne, total_facture, 1 AS signe FROM nouvelles
+        ) l;
+
+        -- Les articles d'une facture qui change de client passent au nouveau client
+        PERFORM dylan.maj_agregat_paires(array_agg(l.email_personne), array_agg(l.nom_article), array_agg(l.signe))
+        FROM (
+            SELECT o.email_personne, a.nom_article, -1 AS signe
+            FROM anciennes o
+            JOIN nouvelles n ON n.id = o.id
+            JOIN dylan.article a ON a.nom_facture = n.nom_facture
+            WHERE o.email_personne IS DISTINCT FROM n.email_personne
+            UNION ALL
+            SELECT n.email_personne, a.nom_article, 1 AS signe
+            FROM anciennes o
+            JOIN nouvelles n ON n.id = o.id
+            JOIN dylan.article a ON a.nom_facture = n.nom_facture
+            WHERE o.email_personne IS DISTINCT FROM n.email_personne
+        ) l;
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION dylan.agregats_article_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    -- Le client d'une ligne est celui de sa facture
+    IF TG_OP = 'INSERT' THEN
+        PERFORM dylan.maj_agregat_lignes(
+            array_agg(f.email_personne), array_agg(n.nom_article), array_agg(n.quantite),
+            array_agg(n.prix), array_agg(1)
+        )
+        FROM nouvelles n JOIN dylan.facture f ON f.nom_facture = n.nom_facture;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM dylan.maj_agregat_lignes(
+            array_agg(f.email_personne), array_agg(o.nom_article), array_agg(o.quantite),
+            array_agg(o.prix), array_agg(-1)
+        )
+        FROM anciennes o JOIN dylan.facture f ON f.nom_facture = o.nom_facture;
+    ELSE
+        PERFORM dylan.maj_agregat_lignes(
+            array_agg(f.email_personne), array_agg(l.nom_article), array_agg(l.quantite),
+            array_agg(l.prix), array_agg(l.signe)
+        )
+        FROM (
+            SELECT nom_facture, nom_article, quantite, prix, -1 AS signe FROM anciennes
+            UNION ALL
+            SELECT nom_facture, nom_article, quantite, prix, 1 AS signe FROM nouvelles
+        ) l
+        JOIN dylan.facture f ON f.nom_facture = l.nom_facture;
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS agregats_facture_insert ON dylan.facture;
+CREATE TRIGGER agregats_facture_insert AFTER INSERT ON dylan.facture
+    REFERENCING NEW TABLE AS nouvelles
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_facture_trigger();
+DROP TRIGGER IF EXISTS agregats_facture_update ON dylan.facture;
+CREATE TRIGGER agregats_facture_update AFTER UPDATE ON dylan.facture
+    REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_facture_trigger();
+DROP TRIGGER IF EXISTS agregats_facture_delete ON dylan.facture;
+CREATE TRIGGER agregats_facture_delete AFTER DELETE ON dylan.facture
+    REFERENCING OLD TABLE AS anciennes
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_facture_trigger();
+
+DROP TRIGGER IF EXISTS agregats_article_insert ON dylan.article;
+CREATE TRIGGER agregats_article_insert AFTER INSERT ON dylan.article
+    REFERENCING NEW TABLE AS nouvelles
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_article_trigger();
+DROP TRIGGER IF EXISTS agregats_article_update ON dylan.article;
+CREATE TRIGGER agregats_article_update AFTER UPDATE ON dylan.article
+    REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_article_trigger();
+DROP TRIGGER IF EXISTS agregats_article_delete ON dylan.article;
+CREATE TRIGGER agregats_article_delete AFTER DELETE ON dylan.article
+    REFERENCING OLD TABLE AS anciennes
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_article_trigger();
+
+-- Recalcul complet des agrégats depuis l'historique : sert de remplissage initial
+-- et de réparation (SELECT dylan.recalculer_agregats();)
+CREATE OR REPLACE FUNCTION dylan.recalculer_agregats()
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    -- Bloquer les écritures de factures pendant le recalcul
+    LOCK TABLE dylan.facture, dylan.article IN SHARE MODE;
+    TRUNCATE dylan.agregat_client, dylan.agregat_article, dylan.agregat_client_article;
+
+    INSERT INTO dylan.agregat_client_article (email_personne, nom_article, nombre_lignes)
+    SELECT f.email_personne, a.nom_article, COUNT(*)
+    FROM dylan.article a
+    JOIN dylan.facture f ON f.nom_facture = a.nom_facture
+    WHERE f.email_personne IS NOT NULL
+    GROUP BY f.email_personne, a.nom_article;
+
+    INSERT INTO dylan.agregat_client
+        (email_personne, nombre_factures, total_depense, derniere_facture, nombre_articles_distincts)
+    SELECT f.email_personne, COUNT(*), COALESCE(SUM(f.total_facture), 0), MAX(f.date_facture),
+           (SELECT COUNT(*) FROM dylan.agregat_client_article p WHERE p.email_personne = f.email_personne)
+    FROM dylan.facture f
+    WHERE f.email_personne IS NOT NULL
+    GROUP BY f.email_personne;
+
+    INSERT INTO dylan.agregat_article
+        (nom_article, nombre_achats, nombre_prix, somme_prix, quantite_totale, nombre_clients)
+    SELECT a.nom_article, COUNT(*), COUNT(a.prix), COALESCE(SUM(a.prix), 0),
+           COALESCE(SUM(a.quantite), 0), COUNT(DISTINCT f.email_personne)
+    FROM dylan.article a
+    JOIN dylan.facture f ON f.nom_facture = a.nom_facture
+    GROUP BY a.nom_article;
+END $$;
+
+SELECT dylan.recalculer_agregats();
+
+-- Résultats du clustering, auparavant créés à l'import de clustering.py
+CREATE TABLE IF NOT EXISTS dylan.customer_clusters (
+    id SERIAL PRIMARY KEY,
+    customer_id VARCHAR(255) REFERENCES dylan.utilisateur(email_personne) ON DELETE CASCADE,
+    cluster_id INTEGER,
+    cluster_name VARCHAR(255),
+    cluster_description TEXT,
+    features JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS customer_clusters_customer_id_idx ON dylan.customer_clusters (customer_id);
+
+CREATE TABLE IF NOT EXISTS dylan.product_clusters (
+    id SERIAL PRIMARY KEY,
+    product_name VARCHAR(255),
+    cluster_id INTEGER,
+    cluster_name VARCHAR(255),
+    cluster_description TEXT,
+    features JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS product_clusters_product_name_idx ON dylan.product_clusters (product_name);
@@ -0,0 +1,12 @@
+-- Factures que la file d'écriture (back_end/classe/write_queue_bdd.py) n'a pas pu
+-- enregistrer : données complètes conservées pour correction et nouvel envoi.
+CREATE TABLE IF NOT EXISTS dylan.facture_rejet (
+    id SERIAL PRIMARY KEY,
+    date_rejet TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    nom_facture VARCHAR(255),
+    donnees JSONB NOT NULL,
+    erreur TEXT,
+    tentatives INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE INDEX IF NOT EXISTS facture_rejet_nom_facture_idx ON dylan.facture_rejet (nom_facture);
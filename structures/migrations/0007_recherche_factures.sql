@@ -0,0 +1,15 @@
+-- Recherche de factures par numéro, article ou nom de client (read_data_bdd.RECHERCHE_FACTURES_QUERY).
+-- Sur Azure, pg_trgm doit figurer dans le paramètre serveur azure.extensions.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Sous-chaînes (ILIKE '%...%') et ressemblance (<%) sur les trois champs recherchés
+CREATE INDEX IF NOT EXISTS facture_nom_facture_trgm_idx
+    ON dylan.facture USING gin (nom_facture gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS article_nom_article_trgm_idx
+    ON dylan.article USING gin (nom_article gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS utilisateur_nom_personne_trgm_idx
+    ON dylan.utilisateur USING gin (nom_personne gin_trgm_ops);
+
+-- Mots des noms d'article, dans n'importe quel ordre ("lait entier" trouve "Entier lait")
+CREATE INDEX IF NOT EXISTS article_nom_article_fts_idx
+    ON dylan.article USING gin (to_tsvector('simple', nom_article));
@@ -0,0 +1,172 @@
+-- Partitionnement par année de date_facture de dylan.facture et dylan.article.
+--
+-- Les requêtes filtrées par date (historique, clustering sur une période) ne
+-- lisent plus que les années concernées. Chaque année a sa partition
+-- (facture_2018, article_2018, ...), créée par dylan.creer_partitions_annee ;
+-- les factures sans date, ou d'une année sans partition, vont dans
+-- facture_defaut / article_defaut. Les articles portent la date de leur
+-- facture pour être rangés dans la même année.
+--
+-- Une contrainte d'unicité d'une table partitionnée doit contenir la clé de
+-- partitionnement : nom_facture n'est plus unique à lui seul pour la base.
+-- save_data_bdd._write_invoices prend un verrou consultatif par numéro de
+-- facture avant d'écrire, ce qui garantit l'unicité du numéro entre années.
+-- Pour la même raison, la clé étrangère article -> facture disparaît : les
+-- articles ne sont écrits qu'avec l'id renvoyé par l'écriture de leur facture.
+
+-- Index non uniques des anciennes tables (0002, 0004, 0007...), recréés à l'identique
+CREATE TEMP TABLE index_a_recreer ON COMMIT DROP AS
+SELECT pg_get_indexdef(x.indexrelid) AS definition
+FROM pg_index x
+JOIN pg_class t ON t.oid = x.indrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+WHERE n.nspname = 'dylan'
+  AND t.relname IN ('facture', 'article')
+  AND NOT x.indisunique;
+
+-- Triggers d'agrégats de 0005 : recréés sur les nouvelles tables une fois les données copiées
+DROP TRIGGER IF EXISTS agregats_facture_insert ON dylan.facture;
+DROP TRIGGER IF EXISTS agregats_facture_update ON dylan.facture;
+DROP TRIGGER IF EXISTS agregats_facture_delete ON dylan.facture;
+DROP TRIGGER IF EXISTS agregats_article_insert ON dylan.article;
+DROP TRIGGER IF EXISTS agregats_article_update ON dylan.article;
+DROP TRIGGER IF EXISTS agregats_article_delete ON dylan.article;
+
+ALTER TABLE dylan.article RENAME TO article_avant_partitionnement;
+ALTER TABLE dylan.facture RENAME TO facture_avant_partitionnement;
+
+CREATE TABLE dylan.facture (
+    id BIGINT NOT NULL,
+    nom_facture VARCHAR(255) NOT NULL,
+    date_facture DATE,
+    total_facture float,
+    email_personne VARCHAR(255) REFERENCES dylan.utilisateur(email_personne),
+    CONSTRAINT facture_numero_date_key UNIQUE (nom_facture, date_facture),
+    CONSTRAINT facture_id_date_key UNIQUE (id, date_facture)
+) PARTITION BY RANGE (date_facture);
+
+CREATE TABLE dylan.article (
+    id BIGINT NOT NULL,
+    nom_facture VARCHAR(255) NOT NULL,
+    nom_article VARCHAR(255) NOT NULL,
+    quantite float,
+    prix float,
+    facture_id BIGINT,
+    date_facture DATE,
+    CONSTRAINT article_ligne_date_key UNIQUE (nom_facture, nom_article, date_facture),
+    CONSTRAINT article_id_date_key UNIQUE (id, date_facture)
+) PARTITION BY RANGE (date_facture);
+
+CREATE TABLE dylan.facture_defaut PARTITION OF dylan.facture DEFAULT;
+CREATE TABLE dylan.article_defaut PARTITION OF dylan.article DEFAULT;
+
+-- Les ids continuent avec les séquences existantes
+DO $$
+DECLARE
+    sequence_facture TEXT := pg_get_serial_sequence('dylan.facture_avant_partitionnement', 'id');
+    sequence_article TEXT := pg_get_serial_sequence('dylan.article_avant_partitionnement', 'id');
+BEGIN
+    EXECUTE format('ALTER TABLE dylan.facture ALTER COLUMN id SET DEFAULT nextval(%L::regclass)', sequence_facture);
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY dylan.facture.id', sequence_facture);
+    EXECUTE format('ALTER TABLE dylan.article ALTER COLUMN id SET DEFAULT nextval(%L::regclass)', sequence_article);
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY dylan.article.id', sequence_article);
+END $$;
+
+-- Créer les partitions d'une année (appelée par save_data_bdd avant d'écrire
+-- une facture d'une nouvelle année). Sans effet si elles existent déjà, ou
+-- pour une année improbable (date mal lue par l'OCR), qui reste dans la
+-- partition par défaut. Les lignes de l'année déjà rangées dans la partition
+-- par défaut sont déplacées dans la nouvelle partition. Renvoie vrai si
+-- l'année a ses partitions.
+CREATE OR REPLACE FUNCTION dylan.creer_partitions_annee(p_annee INTEGER)
+RETURNS BOOLEAN AS $$
+DECLARE
+    debut DATE;
+    fin DATE;
+    nom_table TEXT;
+BEGIN
+    IF p_annee < 2000 OR p_annee > extract(year FROM current_date)::INTEGER + 1 THEN
+        RETURN FALSE;
+    END IF;
+
+    -- Deux créations simultanées de la même année s'attendent
+    PERFORM pg_advisory_xact_lock(727002, p_annee);
+
+    debut := make_date(p_annee, 1, 1);
+    fin := make_date(p_annee + 1, 1, 1);
+    FOREACH nom_table IN ARRAY ARRAY['facture', 'article'] LOOP
+        IF to_regclass(format('dylan.%s_%s', nom_table, p_annee)) IS NULL THEN
+            EXECUTE format('CREATE TABLE dylan.%1$s_%2$s (LIKE dylan.%1$s INCLUDING DEFAULTS)', nom_table, p_annee);
+            EXECUTE format(
+                'WITH deplacees AS (
+                     DELETE FROM dylan.%1$s_defaut WHERE date_facture >= %2$L AND date_facture < %3$L RETURNING *
+                 )
+                 INSERT INTO dylan.%1$s_%4$s SELECT * FROM deplacees',
+                nom_table, debut, fin, p_annee
+            );
+            EXECUTE format(
+                'ALTER TABLE dylan.%1$s ATTACH PARTITION dylan.%1$s_%2$s FOR VALUES FROM (%3$L) TO (%4$L)',
+                nom_table, p_annee, debut, fin
+            );
+        END IF;
+    END LOOP;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Une partition par année présente dans les données, plus l'année en cours et la suivante
+SELECT dylan.creer_partitions_annee(annee)
+FROM (
+    SELECT DISTINCT extract(year FROM date_facture)::INTEGER AS annee
+    FROM dylan.facture_avant_partitionnement
+    WHERE date_facture IS NOT NULL
+    UNION
+    SELECT extract(year FROM current_date)::INTEGER
+    UNION
+    SELECT extract(year FROM current_date)::INTEGER + 1
+) annees
+ORDER BY annee;
+
+INSERT INTO dylan.facture (id, nom_facture, date_facture, total_facture, email_personne)
+SELECT id, nom_facture, date_facture, total_facture, email_personne
+FROM dylan.facture_avant_partitionnement;
+
+INSERT INTO dylan.article (id, nom_facture, nom_article, quantite, prix, facture_id, date_facture)
+SELECT a.id, a.nom_facture, a.nom_article, a.quantite, a.prix, f.id, f.date_facture
+FROM dylan.article_avant_partitionnement a
+JOIN dylan.facture_avant_partitionnement f ON f.nom_facture = a.nom_facture;
+
+DROP TABLE dylan.article_avant_partitionnement;
+DROP TABLE dylan.facture_avant_partitionnement;
+
+DO $$
+DECLARE
+    definition TEXT;
+BEGIN
+    FOR definition IN SELECT i.definition FROM index_a_recreer i LOOP
+        EXECUTE definition;
+    END LOOP;
+END $$;
+
+CREATE TRIGGER agregats_facture_insert AFTER INSERT ON dylan.facture
+    REFERENCING NEW TABLE AS nouvelles
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_facture_trigger();
+CREATE TRIGGER agregats_facture_update AFTER UPDATE ON dylan.facture
+    REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_facture_trigger();
+CREATE TRIGGER agregats_facture_delete AFTER DELETE ON dylan.facture
+    REFERENCING OLD TABLE AS anciennes
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_facture_trigger();
+
+CREATE TRIGGER agregats_article_insert AFTER INSERT ON dylan.article
+    REFERENCING NEW TABLE AS nouvelles
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_article_trigger();
+CREATE TRIGGER agregats_article_update AFTER UPDATE ON dylan.article
+    REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_article_trigger();
+CREATE TRIGGER agregats_article_delete AFTER DELETE ON dylan.article
+    REFERENCING OLD TABLE AS anciennes
+    FOR EACH STATEMENT EXECUTE FUNCTION dylan.agregats_article_trigger();
+
+ANALYZE dylan.facture;
+ANALYZE dylan.article;
@@ -1,3 +1,5 @@
+-- Schéma historique. Les évolutions du schéma sont désormais des migrations versionnées :
+-- voir structures/migrations/ et python -m back_end.utils.migrations
 -- Création du schéma dylan (visible dans votre diagramme)
 CREATE SCHEMA IF NOT EXISTS dylan;
 
@@ -0,0 +1,82 @@
+"""
+Benchmark des lectures d'historique concurrentes.
+
+Compare deux façons d'appeler get_factures_page depuis un handler async :
+- "bloquant" : appel direct de psycopg2 dans la boucle d'événements (ancien code)
+- "run_db"   : appel déporté dans l'exécuteur borné de back_end.utils.database
+
+Le cache de lecture (back_end.utils.cache) est désactivé : chaque appel lit la base.
+
+Usage (depuis la racine du projet, variables DB_* renseignées) :
+    PYTHONPATH=. python test/DB/benchmark_async_db.py --email client@example.com --requetes 50
+
+--latence ajoute un délai réseau simulé (en secondes) à chaque requête, pour
+reproduire l'aller-retour vers la base Azure depuis un poste local.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from back_end.classe import read_data_bdd
+from back_end.utils import cache
+from back_end.utils.database import run_db, close_pool, DB_EXECUTOR_WORKERS
+
+# Mesurer les lectures en base, pas les succès du cache d'historique
+cache.CACHE_CONFIG["backend"] = "none"
+
+
+def make_lookup(latence):
+    def lookup(email):
+        if latence:
+            time.sleep(latence)
+        return read_data_bdd.get_factures_page(email)
+    return lookup
+
+async def handler_bloquant(lookup, email):
+    return lookup(email)
+
+async def handler_run_db(lookup, email):
+    return await run_db(lookup, email)
+
+async def run_concurrent(handler, lookup, email, nb_requetes):
+    latencies = []
+    # Toutes les requêtes arrivent en même temps : la latence est mesurée depuis ce départ commun
+    start = time.perf_counter()
+
+    async def one_request():
+        await handler(lookup, email)
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one_request() for _ in range(nb_requetes)))
+    return time.perf_counter() - start, latencies
+
+def print_result(name, total, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+    print(
+        f"{name:<10} total={total:.3f}s  débit={len(latencies) / total:.1f} req/s  "
+        f"médiane={statistics.median(latencies) * 1000:.1f}ms  p95={p95 * 1000:.1f}ms"
+    )
+
+async def main(args):
+    lookup = make_lookup(args.latence)
+
+    # Préchauffer le pool pour ne pas mesurer l'ouverture des connexions
+    await run_concurrent(handler_run_db, lookup, args.email, DB_EXECUTOR_WORKERS)
+
+    print(f"{args.requetes} lectures concurrentes, {DB_EXECUTOR_WORKERS} threads base de données")
+    total, latencies = await run_concurrent(handler_bloquant, lookup, args.email, args.requetes)
+    print_result("bloquant", total, latencies)
+    total, latencies = await run_concurrent(handler_run_db, lookup, args.email, args.requetes)
+    print_result("run_db", total, latencies)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", required=True, help="Email dont on lit l'historique")
+    parser.add_argument("--requetes", type=int, default=50, help="Nombre de lectures concurrentes")
+    parser.add_argument("--latence", type=float, default=0.0, help="Latence réseau simulée par requête (s)")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        close_pool()
@@ -0,0 +1,100 @@
+"""
+Benchmark des instructions préparées sur les requêtes fréquentes.
+
+Pour chaque requête, compare sur une même connexion :
+- "ad hoc"  : cursor.execute, analysée et planifiée par Postgres à chaque appel
+- "préparée" : execute_prepared, préparée une fois puis exécutée par son nom
+
+Affiche le temps moyen par appel vu du client et le temps de planification
+mesuré par Postgres (EXPLAIN ANALYZE).
+
+Usage (depuis la racine du projet, variables DB_* renseignées) :
+    PYTHONPATH=. python test/DB/benchmark_prepared_statements.py --email client@example.com --iterations 500
+"""
+import json
+import time
+import argparse
+import statistics
+
+from back_end.classe.read_data_bdd import (
+    build_factures_page_query,
+    build_factures_conditions,
+    NOMBRE_FACTURES_QUERY,
+    DETAILS_FACTURE_QUERY,
+    CONNEXION_UTILISATEUR_QUERY,
+)
+from back_end.utils.database import get_db_connection, execute_prepared, close_pool, _statement
+
+
+def hot_queries(email, facture_id):
+    """Requêtes mesurées : nom -> (requête, paramètres)"""
+    conditions, count_params = build_factures_conditions(email)
+    return {
+        "historique": build_factures_page_query(email, 50),
+        "nombre_factures": (NOMBRE_FACTURES_QUERY.format(conditions=" AND ".join(conditions)), count_params),
+        "details_facture": (DETAILS_FACTURE_QUERY, (facture_id,)),
+        "utilisateur_existe": (
+            "SELECT email_personne FROM dylan.utilisateur WHERE email_personne = %s",
+            (email,)
+        ),
+        "connexion": (CONNEXION_UTILISATEUR_QUERY, (email,)),
+    }
+
+def time_calls(cur, run, iterations):
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run()
+        cur.fetchall()
+        durations.append(time.perf_counter() - start)
+    return statistics.mean(durations)
+
+def planning_time(cur, query, params, prepared):
+    """Temps de planification (ms) mesuré par Postgres pour un appel"""
+    if prepared:
+        name, _, nb_params = _statement(query)
+        args = f" ({', '.join(['%s'] * nb_params)})" if nb_params else ""
+        cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) EXECUTE {name}{args}", params)
+    else:
+        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Planning Time"]
+
+def main(args):
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    facture_id = args.facture_id
+    if facture_id is None:
+        cur.execute("SELECT id FROM dylan.facture WHERE email_personne = %s LIMIT 1", (args.email,))
+        row = cur.fetchone()
+        facture_id = row[0] if row else 1
+
+    print(f"{args.iterations} appels par requête")
+    print(f"{'requête':<20} {'ad hoc':>10} {'préparée':>10} {'gain':>7}   planification ad hoc / préparée")
+    try:
+        for name, (query, params) in hot_queries(args.email, facture_id).items():
+            adhoc = time_calls(cur, lambda: cur.execute(query, params), args.iterations)
+            prepared = time_calls(cur, lambda: execute_prepared(cur, query, params), args.iterations)
+            plan_adhoc = planning_time(cur, query, params, prepared=False)
+            plan_prepared = planning_time(cur, query, params, prepared=True)
+            print(
+                f"{name:<20} {adhoc * 1e6:>8.0f}µs {prepared * 1e6:>8.0f}µs {(1 - prepared / adhoc) * 100:>6.1f}%"
+                f"   {plan_adhoc:.3f}ms / {plan_prepared:.3f}ms"
+            )
+        conn.rollback()
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", required=True, help="Email dont on lit l'historique")
+    parser.add_argument("--facture-id", type=int, default=None, help="Facture à détailler (par défaut : une facture de l'email)")
+    parser.add_argument("--iterations", type=int, default=500, help="Nombre d'appels par requête")
+    try:
+        main(parser.parse_args())
+    finally:
+        close_pool()
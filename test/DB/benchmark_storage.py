@@ -0,0 +1,122 @@
+"""
+Benchmark de l'enregistrement des factures selon le stockage.
+
+Envoie des lots de factures générées (même forme que les factures envoyées
+par le scanner) à save_invoices_batch, relit l'historique page par page et
+mesure quelques recherches (numéro partiel, article, client), puis affiche le
+débit et les temps de réponse pour chaque stockage demandé. Avec --stockages sqlite,
+aucune base distante n'est nécessaire : le pipeline est mesuré sans réseau.
+
+Usage (depuis la racine du projet) :
+    PYTHONPATH=. python test/DB/benchmark_storage.py --stockages sqlite --factures 5000
+    PYTHONPATH=. python test/DB/benchmark_storage.py --stockages sqlite postgres --lot 100
+
+Sur Postgres, les factures sont écrites sous le préfixe BENCH- et supprimées
+à la fin.
+"""
+import time
+import random
+import argparse
+import datetime
+import statistics
+
+from back_end.utils.storage import create_storage
+
+EMAIL = "benchmark@example.com"
+
+# (terme, email) : numéro partiel, article, client, puis article chez un seul client
+RECHERCHES = [("000123", None), ("Article 12", None), ("Benchmark", None), ("Article 7", EMAIL)]
+
+
+def make_invoices(nb_factures, nb_articles):
+    start = datetime.date(2018, 1, 1)
+    invoices = []
+    for i in range(nb_factures):
+        items = [
+            {"name": f"Article {random.randint(1, 200)}", "quantity": random.randint(1, 5),
+             "unit_price": round(random.uniform(1, 100), 2)}
+            for _ in range(nb_articles)
+        ]
+        invoices.append({
+            "filename": f"BENCH-{i:06d}.png",
+            "data": {
+                "invoice_number": f"BENCH-{i:06d}",
+                "issue_date": (start + datetime.timedelta(days=i % 2500)).isoformat(),
+                "client": "Client Benchmark",
+                "email": EMAIL,
+                "address": "1 rue du Test",
+                "total": round(sum(item["quantity"] * item["unit_price"] for item in items), 2),
+                "items": items,
+            },
+        })
+    return invoices
+
+def cleanup_postgres():
+    from back_end.utils.database import get_db_connection
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM dylan.article WHERE nom_facture LIKE 'BENCH-%%'")
+        cur.execute("DELETE FROM dylan.facture WHERE nom_facture LIKE 'BENCH-%%'")
+        cur.execute("DELETE FROM dylan.utilisateur WHERE email_personne = %s", (EMAIL,))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def run(backend, invoices, batch_size, page_size):
+    storage = create_storage(backend, path=":memory:") if backend == "sqlite" else create_storage(backend)
+    try:
+        start = time.perf_counter()
+        for i in range(0, len(invoices), batch_size):
+            results = storage.save_invoices_batch(invoices[i:i + batch_size])
+            failed = [r for r in results if not r["success"]]
+            if failed:
+                raise RuntimeError(f"{len(failed)} facture(s) en échec : {failed[0]['error']}")
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        nb_lues, cursor = 0, None
+        while True:
+            page = storage.get_factures_page(EMAIL, limit=page_size, cursor=cursor)
+            nb_lues += len(page["factures"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        read_time = time.perf_counter() - start
+
+        print(
+            f"{backend:<10} écriture {len(invoices) / write_time:>8.0f} factures/s"
+            f"   lecture {nb_lues / read_time:>8.0f} factures/s ({nb_lues} lues)"
+        )
+
+        for terme, email in RECHERCHES:
+            durations = []
+            for _ in range(5):
+                start = time.perf_counter()
+                resultats = storage.search_factures(terme, email=email)
+                durations.append(time.perf_counter() - start)
+            print(
+                f"{'':<10} recherche {terme!r:<14} {'(email)' if email else '':<8}"
+                f" {statistics.median(durations) * 1000:>7.1f}ms, {len(resultats['factures'])} résultat(s)"
+            )
+    finally:
+        if backend == "postgres":
+            cleanup_postgres()
+        storage.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stockages", nargs="+", default=["sqlite"], choices=["sqlite", "postgres"],
+                        help="Stockages mesurés (sqlite : base en mémoire)")
+    parser.add_argument("--factures", type=int, default=2000, help="Nombre de factures écrites")
+    parser.add_argument("--articles", type=int, default=5, help="Nombre d'articles par facture")
+    parser.add_argument("--lot", type=int, default=50, help="Nombre de factures par appel à save_invoices_batch")
+    parser.add_argument("--page", type=int, default=50, help="Taille des pages d'historique relues")
+    args = parser.parse_args()
+
+    random.seed(0)
+    invoices = make_invoices(args.factures, args.articles)
+    print(f"{args.factures} factures de {args.articles} articles, lots de {args.lot}")
+    for backend in args.stockages:
+        run(backend, invoices, args.lot, args.page)